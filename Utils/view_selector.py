@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+"""标定视图筛选：从大量相似的棋盘格视图中挑选信息量大的子集"""
+class ViewSelector:
+    def __init__(self, image_size=(640, 480), grid=(8, 6), coverage_weight=1.0):
+        self.image_size = image_size
+        self.grid = grid
+        self.coverage_weight = coverage_weight
+
+    def pose_features(self, objpoints, imgpoints):
+        """由棋盘平面到图像的单应性提取位姿特征：位置、尺度、平面内旋转和倾斜"""
+        width, height = self.image_size
+        features = []
+        for obj, img in zip(objpoints, imgpoints):
+            obj = np.asarray(obj, dtype=np.float64).reshape(-1, 3)[:, :2]
+            img = np.asarray(img, dtype=np.float64).reshape(-1, 2)
+            span = np.ptp(obj, axis=0).max()
+            H, _ = cv2.findHomography(obj / span, img / max(width, height))
+            if H is None:
+                H = np.eye(3)
+            H = H / H[2, 2]
+            center = img.mean(axis=0)
+            area = cv2.contourArea(cv2.convexHull(img.astype(np.float32)))
+            angle = np.arctan2(H[1, 0], H[0, 0])
+            features.append([
+                center[0] / width, center[1] / height,
+                np.log(max(area, 1.0) / (width * height)),
+                np.cos(2 * angle), np.sin(2 * angle),
+                H[2, 0], H[2, 1],  # 透视项反映棋盘倾斜方向和程度
+            ])
+        features = np.asarray(features)
+        std = features.std(axis=0)
+        return (features - features.mean(axis=0)) / np.where(std > 1e-9, std, 1.0)
+
+    def coverage_cells(self, imgpoints):
+        """每个视图的角点覆盖的图像网格单元（布尔矩阵 N x 单元数）"""
+        width, height = self.image_size
+        gx, gy = self.grid
+        cells = np.zeros((len(imgpoints), gx * gy), dtype=bool)
+        for i, img in enumerate(imgpoints):
+            img = np.asarray(img, dtype=np.float64).reshape(-1, 2)
+            cx = np.clip((img[:, 0] / width * gx).astype(int), 0, gx - 1)
+            cy = np.clip((img[:, 1] / height * gy).astype(int), 0, gy - 1)
+            cells[i, cy * gx + cx] = True
+        return cells
+
+    def select(self, objpoints, left_imgpoints, right_imgpoints, max_views):
+        """贪心选择最多max_views个视图，返回排序后的视图下标
+
+        每一步选取与已选视图位姿差异最大、且能覆盖最多新图像区域的视图
+        """
+        n = len(objpoints)
+        if n <= max_views:
+            return list(range(n))
+
+        features = np.hstack([self.pose_features(objpoints, left_imgpoints),
+                              self.pose_features(objpoints, right_imgpoints)])
+        cells = np.hstack([self.coverage_cells(left_imgpoints), self.coverage_cells(right_imgpoints)])
+        total_cells = cells.shape[1]
+
+        # 从覆盖面积最大的视图开始
+        first = int(np.argmax(cells.sum(axis=1)))
+        selected = [first]
+        covered = cells[first].copy()
+        min_dist = np.linalg.norm(features - features[first], axis=1)
+        available = np.ones(n, dtype=bool)
+        available[first] = False
+
+        while len(selected) < max_views:
+            new_cells = (cells & ~covered).sum(axis=1) / total_cells
+            diversity = min_dist / max(min_dist.max(), 1e-9)
+            score = diversity + self.coverage_weight * new_cells
+            score[~available] = -np.inf
+            best = int(np.argmax(score))
+            selected.append(best)
+            available[best] = False
+            covered |= cells[best]
+            min_dist = np.minimum(min_dist, np.linalg.norm(features - features[best], axis=1))
+        return sorted(selected)
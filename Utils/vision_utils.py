@@ -1,47 +1,105 @@
 import cv2
 import numpy as np
 import os
-import glob
 import re
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 """工具类"""
 class VisionUtils:
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
     @staticmethod
-    def get_image_paths(directory):
-        """获取目录中所有支持的图像文件（兼容中文路径和多种命名格式）"""
-        extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-        files = []
-        directory = os.path.normpath(directory)
+    def extract_number(filename):
+        """提取文件名中的最后一段数字作为帧号，没有数字时返回0"""
+        numbers = re.findall(r'\d+', os.path.basename(filename))
+        return int(numbers[-1]) if numbers else 0
 
-        if not os.path.exists(directory):
+    @staticmethod
+    def index_image_dir(directory):
+        """单次扫描目录，返回 {帧号: 图像路径}（兼容中文路径和多种命名格式）"""
+        directory = os.path.normpath(directory)
+        if not os.path.isdir(directory):
             print(f"目录不存在: {directory}")
-            return []
+            return {}
 
-        for ext in extensions:
-            try:
-                files.extend(glob.glob(os.path.join(directory, ext), recursive=True))
-            except Exception as e:
-                print(f"搜索图像时出错: {str(e)}")
-                continue
+        index = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(VisionUtils.IMAGE_EXTENSIONS) or not entry.is_file():
+                        continue
+                    number = VisionUtils.extract_number(entry.name)
+                    if number in index:
+                        print(f"帧号 {number} 重复，忽略: {entry.path}")
+                        continue
+                    index[number] = entry.path
+        except OSError as e:
+            print(f"搜索图像时出错: {str(e)}")
+        return index
 
-        def extract_number(filename):
-            base = os.path.basename(filename)
-            numbers = re.findall(r'\d+', base)
-            return int(numbers[-1]) if numbers else 0
+    @staticmethod
+    def get_image_paths(directory):
+        """获取目录中所有支持的图像文件，按帧号排序"""
+        index = VisionUtils.index_image_dir(directory)
+        return [index[number] for number in sorted(index)]
 
-        return sorted(files, key=extract_number)
+    @staticmethod
+    def pair_image_paths(left_dir, right_dir):
+        """按帧号配对左右图像，缺失的文件不会导致后续配对错位
+
+        返回 (配对列表[(帧号, 左路径, 右路径)], 只有左图的帧号, 只有右图的帧号)
+        """
+        left_index = VisionUtils.index_image_dir(left_dir)
+        right_index = VisionUtils.index_image_dir(right_dir)
+        common = sorted(left_index.keys() & right_index.keys())
+        pairs = [(number, left_index[number], right_index[number]) for number in common]
+        left_only = sorted(left_index.keys() - right_index.keys())
+        right_only = sorted(right_index.keys() - left_index.keys())
+        return pairs, left_only, right_only
 
     @staticmethod
-    def read_image_safe(path):
-        """安全读取图像（解决中文路径问题）"""
+    def read_image_safe(path, flags=cv2.IMREAD_COLOR):
+        """安全读取图像（解决中文路径问题），flags可直接解码为灰度图"""
         try:
             with open(path, 'rb') as f:
                 img_data = np.frombuffer(f.read(), dtype=np.uint8)
-                img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
+                img = cv2.imdecode(img_data, flags)
                 return img if img is not None else None
         except Exception as e:
             print(f"读取图像错误 {path}: {str(e)}")
             return None
 
+    @staticmethod
+    def iter_gray_pairs(pairs, prefetch=4, workers=2):
+        """后台线程预取并直接解码为灰度图的生成器
+
+        按输入顺序产出 (帧号, 左路径, 右路径, 左灰度图, 右灰度图)，读取失败的图像为None；
+        同时在途的图像对不超过prefetch，内存占用与图像总数无关
+        """
+        def load(pair):
+            number, left_path, right_path = pair
+            return (number, left_path, right_path,
+                    VisionUtils.read_image_safe(left_path, cv2.IMREAD_GRAYSCALE),
+                    VisionUtils.read_image_safe(right_path, cv2.IMREAD_GRAYSCALE))
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        pairs = iter(pairs)
+        try:
+            for pair in islice(pairs, prefetch):
+                pending.append(pool.submit(load, pair))
+            while pending:
+                result = pending.popleft().result()
+                pair = next(pairs, None)
+                if pair is not None:
+                    pending.append(pool.submit(load, pair))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
     @staticmethod
     def prepare_chessboard_points(chessboard_size=(9, 6), square_size=25.0):
         """准备棋盘格角点"""
@@ -4,7 +4,7 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QSpinBox,
                              QDoubleSpinBox, QLabel, QPushButton, QLineEdit,
                              QHBoxLayout, QFileDialog, QTabWidget, QWidget,
                              QGroupBox, QPlainTextEdit, QFrame, QDialogButtonBox,
-                             QScrollArea)
+                             QScrollArea, QCheckBox)
 from PyQt5.QtCore import Qt
 import numpy as np
 import ast
@@ -170,6 +170,10 @@ class CalibrationDialog(QDialog):
         dir_layout.addRow("左相机图像目录:", self.create_browse_row(self.left_dir_edit))
         dir_layout.addRow("右相机图像目录:", self.create_browse_row(self.right_dir_edit))
 
+        self.video_edit = QLineEdit()
+        self.video_edit.setPlaceholderText("可选：左右并排的标定视频，填写后忽略图像目录")
+        dir_layout.addRow("标定视频:", self.create_browse_row(self.video_edit, self.browse_video))
+
         dir_group.setLayout(dir_layout)
         layout.addWidget(dir_group)
 
@@ -199,6 +203,20 @@ class CalibrationDialog(QDialog):
         chess_layout.addRow("棋盘格列数(内角点):", self.cols_spin)
         chess_layout.addRow("方格实际尺寸:", self.square_size)
 
+        self.max_views_spin = QSpinBox()
+        self.max_views_spin.setRange(0, 1000)
+        self.max_views_spin.setValue(0)
+        self.max_views_spin.setSpecialValueText("不限制")
+        self.max_views_spin.setToolTip("图像很多且相似时，只挑选位姿和覆盖范围差异最大的部分视图参与求解")
+        chess_layout.addRow("最多使用视图数:", self.max_views_spin)
+
+        self.compare_full_check = QCheckBox("同时用全部视图标定以对比精度（耗时）")
+        chess_layout.addRow("", self.compare_full_check)
+
+        self.incremental_check = QCheckBox("增量标定（保留已检测的视图，以当前内参为初值）")
+        self.incremental_check.setToolTip("适合在已有标定基础上追加少量新图像，离群视图会被自动剔除")
+        chess_layout.addRow("", self.incremental_check)
+
         chess_group.setLayout(chess_layout)
         layout.addWidget(chess_group)
         layout.addStretch(1)
@@ -338,7 +356,7 @@ class CalibrationDialog(QDialog):
         tab_layout = QVBoxLayout(tab)
         tab_layout.addWidget(scroll)
 
-    def create_browse_row(self, line_edit):
+    def create_browse_row(self, line_edit, browse=None):
         row = QHBoxLayout()
         row.setSpacing(10)
 
@@ -361,7 +379,8 @@ class CalibrationDialog(QDialog):
                 background-color: #d0d0d0;
             }
         """)
-        btn.clicked.connect(lambda: self.browse_directory(line_edit))
+        browse = browse or self.browse_directory
+        btn.clicked.connect(lambda: browse(line_edit))
 
         row.addWidget(line_edit, stretch=1)
         row.addWidget(btn)
@@ -374,6 +393,12 @@ class CalibrationDialog(QDialog):
             count = len([f for f in os.listdir(path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))])
             self.status_label.setText(f"找到 {count} 张图像在: {os.path.basename(path)}")
 
+    def browse_video(self, line_edit):
+        path, _ = QFileDialog.getOpenFileName(self, "选择标定视频", "", "视频文件 (*.mp4 *.avi *.mov *.mkv)")
+        if path:
+            line_edit.setText(path)
+            self.status_label.setText(f"将从视频中筛选标定视图: {os.path.basename(path)}")
+
     def safe_parse(self, text):
         """安全解析Python字面量"""
         try:
@@ -496,8 +521,14 @@ class CalibrationDialog(QDialog):
         if self.tab_widget.currentIndex() == 0:  # 自动标定模式
             left_dir = self.left_dir_edit.text()
             right_dir = self.right_dir_edit.text()
-
-            if not left_dir or not right_dir or not os.path.exists(left_dir) or not os.path.exists(right_dir):
+            video_path = self.video_edit.text().strip()
+
+            if video_path:
+                if not os.path.isfile(video_path):
+                    self.status_label.setStyleSheet("color: red;")
+                    self.status_label.setText("标定视频不存在")
+                    return
+            elif not left_dir or not right_dir or not os.path.exists(left_dir) or not os.path.exists(right_dir):
                 self.status_label.setStyleSheet("color: red;")
                 self.status_label.setText("图像目录无效或不存在")
                 return
@@ -506,7 +537,11 @@ class CalibrationDialog(QDialog):
                 left_dir,
                 right_dir,
                 (self.rows_spin.value(), self.cols_spin.value()),
-                self.square_size.value()
+                self.square_size.value(),
+                incremental=self.incremental_check.isChecked(),
+                max_views=self.max_views_spin.value() or None,
+                compare_full=self.compare_full_check.isChecked(),
+                video_path=video_path or None
             )
             self.close()
         else:  # 手动输入
@@ -0,0 +1,59 @@
+import threading
+import traceback
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from stereo_core.camera_calibrator import CalibrationCancelled
+
+"""后台标定任务：在独立线程中检测角点和求解，不阻塞界面"""
+
+
+class CalibrationWorker(QObject):
+    # 阶段名称, 当前进度, 总数（总数为0表示该阶段无法细分进度）
+    progress = pyqtSignal(str, int, int)
+    # (RMS误差, 新标定器, 视图筛选报告)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, processor, calibrator, left_dir, right_dir, chessboard_size, square_size,
+                 incremental=False, max_views=None, compare_full=False, video_path=None):
+        super().__init__()
+        self.processor = processor
+        # 在新标定器上求解，处理器当前使用的标定器在成功前保持不变
+        self.calibrator = calibrator
+        self.args = (left_dir, right_dir, chessboard_size, square_size, incremental, max_views, compare_full)
+        # 指定标定视频时从视频中筛选视图，忽略图像目录
+        self.video_path = video_path
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消，将在下一个检测步骤或求解阶段之间生效"""
+        self._cancel_event.set()
+
+    def _on_progress(self, phase, current, total):
+        if self._cancel_event.is_set():
+            raise CalibrationCancelled()
+        self.progress.emit(phase, current, total)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            if self.video_path:
+                ret, report = self.processor.run_video_calibration(self.calibrator, self.video_path, *self.args[2:],
+                                                                   progress_callback=self._on_progress)
+            else:
+                ret, report = self.processor.run_calibration(self.calibrator, *self.args,
+                                                             progress_callback=self._on_progress)
+            if self._cancel_event.is_set():
+                self.cancelled.emit()
+            else:
+                self.succeeded.emit((ret, self.calibrator, report))
+        except CalibrationCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+        finally:
+            self.finished.emit()
@@ -1,10 +1,72 @@
 # main.py
+import time
+
+# 进程启动时刻，用于统计首个窗口出现的耗时
+_START_TIME = time.perf_counter()
+
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication
-from main_window import MainWindow
+from PyQt5.QtWidgets import QApplication, QSplashScreen
+from PyQt5.QtGui import QPixmap, QColor
+from PyQt5.QtCore import Qt, QTimer
 """启动类，程序启动"""
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="双目视觉测距系统")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="主窗口显示后输出启动耗时并退出")
+    parser.add_argument("--startup-budget", type=float, default=None,
+                        help="主窗口显示耗时上限（毫秒），超出时以非零状态退出")
+    parser.add_argument("--depth-server", metavar="ADDRESS", default=None,
+                        help="启动本机深度查询服务，如 127.0.0.1:8765 或 unix:/tmp/depth.sock")
+    # 其余参数交给Qt处理
+    return parser.parse_known_args(argv[1:])
+
+
+def elapsed_ms():
+    return (time.perf_counter() - _START_TIME) * 1000
+
+
+def main(argv):
+    args, qt_args = parse_args(argv)
+    app = QApplication(argv[:1] + qt_args)
+
+    # 只依赖Qt的启动画面先显示出来，再加载cv2/numpy和主窗口
+    pixmap = QPixmap(360, 120)
+    pixmap.fill(QColor("#f8f9fa"))
+    splash = QSplashScreen(pixmap)
+    splash.showMessage("双目视觉测距系统\n正在加载...", Qt.AlignCenter, QColor("#3498db"))
+    splash.show()
+    app.processEvents()
+    splash_ms = elapsed_ms()
+
+    from main_window import MainWindow
     window = MainWindow()
+    if args.depth_server:
+        try:
+            window.start_depth_server(args.depth_server)
+        except OSError as e:
+            print(f"深度查询服务启动失败: {str(e)}")
     window.show()
-    sys.exit(app.exec_())
+    splash.finish(window)
+
+    timings = {}
+
+    def on_first_event_loop():
+        # 事件循环开始处理时主窗口已完成首次绘制
+        timings['window_ms'] = elapsed_ms()
+        print(f"启动耗时: 启动画面 {splash_ms:.0f} ms, 主窗口 {timings['window_ms']:.0f} ms")
+        if args.measure_startup:
+            app.quit()
+
+    QTimer.singleShot(0, on_first_event_loop)
+    status = app.exec_()
+    if args.startup_budget is not None and timings.get('window_ms', float('inf')) > args.startup_budget:
+        print(f"启动耗时超出上限 {args.startup_budget:.0f} ms")
+        return 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
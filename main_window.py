@@ -5,11 +5,13 @@ import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QComboBox, QPushButton,
                              QTextEdit, QFileDialog, QDialog, QFormLayout,
-                             QSpinBox, QDoubleSpinBox, QMessageBox, QLineEdit, QStackedLayout, QGridLayout)
-from PyQt5.QtCore import QTimer, Qt, QPoint
+                             QSpinBox, QDoubleSpinBox, QMessageBox, QLineEdit, QStackedLayout, QGridLayout,
+                             QCheckBox, QProgressDialog, QInputDialog)
+from PyQt5.QtCore import QTimer, Qt, QPoint, QThread
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen
-from stereo_vision_processor import StereoVisionProcessor
-from calibration_dialog import CalibrationDialog
+from stereo_core.stereo_vision_processor import (StereoVisionProcessor, OUTPUT_GRAY, OUTPUT_DEPTH_IMAGE,
+                                                  OUTPUT_DEPTH, OUTPUT_DISPARITY)
+from stereo_core.calibration_profiles import CalibrationProfileStore
 
 """整体窗口的布局"""
 
@@ -22,7 +24,23 @@ class MainWindow(QMainWindow):
 
         # 初始化处理器
         self.processor = StereoVisionProcessor()
-        self.threeD = None
+        self.profile_store = CalibrationProfileStore()
+        # 跟踪器在第一次添加目标时创建
+        self.tracker = None
+        # 后台标定任务
+        self.calibration_thread = None
+        self.calibration_worker = None
+        self.calibration_progress = None
+        # 进程分离模式下的采集/处理管线
+        self.pipeline = None
+        self.pipeline_key = None
+        # 本机深度查询服务（可选），每处理一帧发布一次深度快照
+        self.depth_server = None
+        self.frame_seq = 0
+        # 自适应质量控制（启用时创建）
+        self.quality_controller = None
+        # 地面平面估计（启用时创建）
+        self.ground = None
         self.current_video_path = None
         self.is_playing = False
 
@@ -32,10 +50,21 @@ class MainWindow(QMainWindow):
         # 视频捕获
         self.capture = None
         self.timer = QTimer()
+        # 只连接一次，重新加载视频时只重启定时器
+        self.timer.timeout.connect(self.update_frame)
 
         # 显示模式
         self.current_mode = "灰度图"
-        self.threeD = None
+        self.depth_map = None
+        # 稀疏测距模式下当前帧的特征点及其三维坐标
+        self.sparse_pixels = None
+        self.sparse_points = None
+        # ROI框选状态（在原始视频上拖动鼠标）
+        self.roi_selecting = False
+        # 正在框选障碍区域
+        self.zone_selecting = False
+        self._roi_drag_start = None
+        self._roi_drag_rect = None
 
     def setup_ui(self):
         """初始化用户界面"""
@@ -63,6 +92,9 @@ class MainWindow(QMainWindow):
             }
         """)
         self.original_label.setFixedSize(640, 480)
+        self.original_label.mousePressEvent = self.roi_mouse_press
+        self.original_label.mouseMoveEvent = self.roi_mouse_move
+        self.original_label.mouseReleaseEvent = self.roi_mouse_release
 
         left_layout.addWidget(self.original_label)
         left_layout.addStretch()
@@ -73,7 +105,7 @@ class MainWindow(QMainWindow):
 
         # 显示模式选择 - 美化样式
         self.mode_combo = QComboBox()
-        self.mode_combo.addItems(["灰度图", "深度图", "点云"])
+        self.mode_combo.addItems(["灰度图", "深度图", "点云", "稀疏测距"])
         self.mode_combo.setStyleSheet("""
             QComboBox {
                 min-height: 30px;
@@ -136,6 +168,87 @@ class MainWindow(QMainWindow):
         """)
         right_layout.addWidget(self.distance_text)
 
+        # 连续跟踪测距
+        track_layout = QHBoxLayout()
+        self.track_check = QCheckBox("连续跟踪（点击添加跟踪目标）")
+        self.clear_track_btn = QPushButton("清除跟踪")
+        self.clear_track_btn.clicked.connect(self.clear_tracking)
+        track_layout.addWidget(self.track_check)
+        track_layout.addStretch()
+        track_layout.addWidget(self.clear_track_btn)
+        right_layout.addLayout(track_layout)
+
+        # 障碍区域报警
+        zone_layout = QHBoxLayout()
+        self.add_zone_btn = QPushButton("添加障碍区域")
+        self.add_zone_btn.clicked.connect(self.start_zone_selection)
+        self.clear_zone_btn = QPushButton("清除障碍区域")
+        self.clear_zone_btn.clicked.connect(self.clear_zones)
+        zone_layout.addWidget(self.add_zone_btn)
+        zone_layout.addStretch()
+        zone_layout.addWidget(self.clear_zone_btn)
+        right_layout.addLayout(zone_layout)
+
+        # 自适应质量：按每帧耗时自动调整匹配分辨率、视差参数和跳帧
+        quality_layout = QHBoxLayout()
+        self.quality_check = QCheckBox("自适应质量")
+        self.quality_check.toggled.connect(self.toggle_quality_control)
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(5, 1000)
+        self.budget_spin.setValue(30)
+        self.budget_spin.setSuffix(" ms")
+        self.budget_spin.setToolTip("每帧处理耗时预算")
+        self.budget_spin.valueChanged.connect(self.set_latency_budget)
+        self.quality_label = QLabel("")
+        quality_layout.addWidget(self.quality_check)
+        quality_layout.addWidget(self.budget_spin)
+        quality_layout.addWidget(self.quality_label, stretch=1)
+        right_layout.addLayout(quality_layout)
+
+        # 工作深度范围：由标定参数推算最小视差和视差数，只搜索该深度范围对应的视差
+        range_layout = QHBoxLayout()
+        self.depth_range_check = QCheckBox("工作深度")
+        self.depth_range_check.toggled.connect(self.update_depth_range)
+        self.near_spin = QDoubleSpinBox()
+        self.near_spin.setRange(0.1, 100.0)
+        self.near_spin.setValue(0.5)
+        self.near_spin.setSuffix(" m")
+        self.far_spin = QDoubleSpinBox()
+        self.far_spin.setRange(0.2, 1000.0)
+        self.far_spin.setValue(8.0)
+        self.far_spin.setSuffix(" m")
+        self.near_spin.valueChanged.connect(self.update_depth_range)
+        self.far_spin.valueChanged.connect(self.update_depth_range)
+        self.depth_range_label = QLabel("")
+        range_layout.addWidget(self.depth_range_check)
+        range_layout.addWidget(self.near_spin)
+        range_layout.addWidget(QLabel("-"))
+        range_layout.addWidget(self.far_spin)
+        range_layout.addWidget(self.depth_range_label, stretch=1)
+        right_layout.addLayout(range_layout)
+
+        # 地面估计：点击测距时显示离地高度，高于障碍高度的像素在结果图中标出
+        ground_layout = QHBoxLayout()
+        self.ground_check = QCheckBox("地面高度")
+        self.ground_check.toggled.connect(self.toggle_ground_plane)
+        self.obstacle_height_spin = QDoubleSpinBox()
+        self.obstacle_height_spin.setRange(0.01, 5.0)
+        self.obstacle_height_spin.setSingleStep(0.05)
+        self.obstacle_height_spin.setValue(0.10)
+        self.obstacle_height_spin.setSuffix(" m")
+        self.obstacle_height_spin.setToolTip("离地高度超过该值的像素标记为障碍")
+        self.ground_label = QLabel("")
+        ground_layout.addWidget(self.ground_check)
+        ground_layout.addWidget(self.obstacle_height_spin)
+        ground_layout.addWidget(self.ground_label, stretch=1)
+        right_layout.addLayout(ground_layout)
+
+        self.track_plot_label = QLabel()
+        self.track_plot_label.setFixedHeight(160)
+        self.track_plot_label.setAlignment(Qt.AlignCenter)
+        self.track_plot_label.hide()
+        right_layout.addWidget(self.track_plot_label)
+
         # 状态和按钮区域
         control_panel = QWidget()
         control_layout = QVBoxLayout(control_panel)
@@ -171,6 +284,7 @@ class MainWindow(QMainWindow):
         self.calibrate_btn = QPushButton("标定相机")
         self.select_video_btn = QPushButton("选择视频")
         self.play_btn = QPushButton("播放")
+        self.roi_btn = QPushButton("设置ROI")
 
         # 统一按钮样式
         button_style = """
@@ -197,17 +311,43 @@ class MainWindow(QMainWindow):
         self.calibrate_btn.setStyleSheet(button_style)
         self.select_video_btn.setStyleSheet(button_style)
         self.play_btn.setStyleSheet(button_style)
+        self.roi_btn.setStyleSheet(button_style)
 
         self.calibrate_btn.clicked.connect(self.show_calibration_dialog)
         self.select_video_btn.clicked.connect(self.select_video_file)
         self.play_btn.clicked.connect(self.toggle_playback)
         self.play_btn.setEnabled(False)
+        self.roi_btn.clicked.connect(self.toggle_roi)
 
         btn_layout.addWidget(self.calibrate_btn)
         btn_layout.addWidget(self.select_video_btn)
         btn_layout.addWidget(self.play_btn)
+        btn_layout.addWidget(self.roi_btn)
+
+        # 进程分离模式：解码和视差计算在独立进程中进行，结果经共享内存读取
+        self.split_check = QCheckBox("多进程处理")
+        self.split_check.setToolTip("解码和视差计算在独立进程中进行（处理整帧，不支持ROI和稀疏测距）")
+        self.split_check.toggled.connect(self.toggle_process_split)
+        btn_layout.addWidget(self.split_check)
 
         control_layout.addWidget(self.calib_status)
+
+        # 标定配置切换
+        profile_layout = QHBoxLayout()
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(self.profile_store.names())
+        self.profile_combo.setCurrentIndex(-1)
+        self.profile_combo.setPlaceholderText("选择已保存的标定配置")
+        self.profile_combo.activated[str].connect(self.switch_profile)
+        self.save_profile_btn = QPushButton("保存配置")
+        self.save_profile_btn.clicked.connect(self.save_profile)
+        self.delete_profile_btn = QPushButton("删除配置")
+        self.delete_profile_btn.clicked.connect(self.delete_profile)
+        profile_layout.addWidget(QLabel("标定配置:"))
+        profile_layout.addWidget(self.profile_combo, stretch=1)
+        profile_layout.addWidget(self.save_profile_btn)
+        profile_layout.addWidget(self.delete_profile_btn)
+        control_layout.addLayout(profile_layout)
         control_layout.addWidget(QLabel("当前视频:"))
         control_layout.addWidget(self.video_path_label)
         control_layout.addLayout(btn_layout)
@@ -241,6 +381,14 @@ class MainWindow(QMainWindow):
         """加载视频文件"""
         if self.capture is not None:
             self.capture.release()
+            self.capture = None
+        self.stop_pipeline()
+
+        if self.split_check.isChecked():
+            if not self.start_pipeline(video_path):
+                return False
+            self.timer.start(30)
+            return True
 
         self.capture = cv2.VideoCapture(video_path)
 
@@ -249,13 +397,12 @@ class MainWindow(QMainWindow):
             return False
 
         # 设置定时器
-        self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)  # 30ms更新一帧
         return True
 
     def toggle_playback(self):
         """切换播放/暂停状态"""
-        if self.capture is None:
+        if self.capture is None and self.pipeline is None:
             return
 
         if self.is_playing:
@@ -267,20 +414,121 @@ class MainWindow(QMainWindow):
 
         self.is_playing = not self.is_playing
 
+    def start_pipeline(self, video_path):
+        """以当前标定启动进程分离管线"""
+        from stereo_core.process_split import ProcessSplitPipeline
+        try:
+            params = {'min_disparity': self.processor.min_disparity,
+                      'num_disparities': self.processor.num_disparities,
+                      'block_size': self.processor.block_size,
+                      'matcher_mode': self.processor.matcher_mode,
+                      'process_scale': self.processor.process_scale,
+                      'depth_range': self.processor.depth_range}
+            self.pipeline = ProcessSplitPipeline(video_path, self.processor.calibrator, params)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"无法启动多进程处理: {str(e)}")
+            return False
+        self.pipeline_key = self.current_pipeline_key()
+        return True
+
+    def current_pipeline_key(self):
+        """处理进程所用参数的标识：标定版本、匹配器参数（含工作深度范围推算出的视差范围）和匹配分辨率"""
+        return (self.processor.calibrator.version, self.processor.matcher_params(),
+                self.processor.process_scale, self.processor.depth_range)
+
+    def start_depth_server(self, address):
+        """启动本机深度查询服务，address为 "主机:端口" 或 "unix:/路径"（Unix套接字）"""
+        from stereo_core.depth_server import DepthQueryServer
+        server = DepthQueryServer(address)
+        server.start()
+        self.depth_server = server
+        print(f"深度查询服务已启动: {server.address}")
+        return server
+
+    def toggle_quality_control(self, checked):
+        """启用或关闭自适应质量，关闭时恢复最高质量参数"""
+        if checked:
+            from stereo_core.quality_controller import QualityController
+            self.quality_controller = QualityController(self.processor, self.budget_spin.value())
+            self.quality_label.setText(self.quality_controller.describe())
+        elif self.quality_controller is not None:
+            self.quality_controller.reset()
+            self.quality_controller = None
+            self.quality_label.setText("")
+
+    def update_depth_range(self, *_):
+        """启用工作深度范围时按标定参数收紧视差搜索范围，关闭时恢复固定范围"""
+        if not self.depth_range_check.isChecked():
+            self.processor.set_depth_range(None, None)
+            self.depth_range_label.setText("")
+            return
+        try:
+            self.processor.set_depth_range(self.near_spin.value(), self.far_spin.value())
+        except ValueError as e:
+            self.depth_range_label.setText(str(e))
+            return
+        if self.processor.calibrator.is_calibrated:
+            self.processor.update_disparity_range()
+            low = self.processor.min_disparity
+            self.depth_range_label.setText(f"视差 {low}-{low + self.processor.num_disparities - 1}")
+        else:
+            self.depth_range_label.setText("标定后生效")
+
+    def toggle_ground_plane(self, checked):
+        """启用时逐帧估计地面平面（需要深度图，稀疏测距模式下不可用）"""
+        if checked:
+            from stereo_core.ground_plane import GroundPlaneEstimator
+            self.ground = GroundPlaneEstimator(self.processor)
+        else:
+            self.ground = None
+            self.ground_label.setText("")
+
+    def set_latency_budget(self, value):
+        if self.quality_controller is not None:
+            self.quality_controller.budget_ms = value
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def toggle_process_split(self, checked):
+        """切换进程分离模式，已加载视频时重新加载
+
+        处理进程只计算整帧稠密视差，进程分离模式下禁用稀疏测距，正在使用时切换到灰度图
+        """
+        sparse_index = self.mode_combo.findText("稀疏测距")
+        self.mode_combo.model().item(sparse_index).setEnabled(not checked)
+        if checked and self.mode_combo.currentIndex() == sparse_index:
+            self.mode_combo.setCurrentText("灰度图")
+        if self.current_video_path is None:
+            return
+        was_playing = self.is_playing
+        self.timer.stop()
+        self.load_video(self.current_video_path)
+        if not was_playing:
+            self.timer.stop()
+
     def show_calibration_dialog(self):
         """显示标定对话框"""
+        # 对话框只在使用时加载，不影响程序启动速度
+        from calibration_dialog import CalibrationDialog
         dialog = CalibrationDialog(self)
         dialog.exec_()
 
     def set_manual_calibration(self, left_matrix, left_dist, right_matrix, right_dist, R, T):
         """设置手动输入的标定参数"""
         try:
-            # 传递给处理器
-            self.processor.calibrator.set_manual_parameters(
+            # 在新的标定器上设置参数，成功后再切换，避免修改已保存配置中的标定器
+            calibrator = self.processor.new_calibration_target()
+            calibrator.set_manual_parameters(
                 left_matrix, left_dist,
                 right_matrix, right_dist,
                 R, T
             )
+            self.processor.apply_calibration(calibrator)
+            self.update_depth_range()
+            self.profile_combo.setCurrentIndex(-1)
 
             self.calib_status.setText("状态: 已标定 (手动参数)")
             self.calib_status.setStyleSheet("color: green;")
@@ -291,31 +539,189 @@ class MainWindow(QMainWindow):
             self.calib_status.setStyleSheet("color: red;")
             QMessageBox.critical(self, "标定错误", str(e))
 
-    def start_calibration(self, left_dir, right_dir, chessboard_size, square_size):
-        """执行相机标定"""
+    def switch_profile(self, name):
+        """切换到已保存的标定配置，最近使用过的配置无需重建校正映射表"""
         try:
-            # 保存获取的标定相机的参数
-            ret = self.processor.calibrate_cameras(
-                left_dir, right_dir,
-                chessboard_size, square_size
-            )
+            calibrator = self.profile_store.get(name)
+            self.processor.apply_calibration(calibrator)
+            self.update_depth_range()
+            self.calib_status.setText(f"状态: 已标定 (配置: {name})")
+            self.calib_status.setStyleSheet("color: green;")
+        except Exception as e:
+            QMessageBox.critical(self, "切换配置失败", str(e))
 
-            if ret:
-                self.calib_status.setText(f"状态: 已标定 (误差: {ret:.2f})")
-                self.calib_status.setStyleSheet("color: green;")
-                QMessageBox.information(self, "标定成功", f"标定完成，RMS误差: {ret:.2f}")
-            else:
-                self.calib_status.setText("状态: 标定失败")
-                self.calib_status.setStyleSheet("color: red;")
-                QMessageBox.warning(self, "标定失败", "请检查图像和参数设置")
+    def save_profile(self):
+        """将当前标定参数保存为命名配置"""
+        if not self.processor.calibrator.is_calibrated:
+            QMessageBox.warning(self, "无法保存", "请先完成相机标定")
+            return
+        name, ok = QInputDialog.getText(self, "保存标定配置", "配置名称:")
+        if not ok or not name.strip():
+            return
+        try:
+            self.profile_store.save(name, self.processor.calibrator)
         except Exception as e:
-            self.calib_status.setText("状态: 标定错误")
+            QMessageBox.critical(self, "保存配置失败", str(e))
+            return
+        self.profile_combo.clear()
+        self.profile_combo.addItems(self.profile_store.names())
+        self.profile_combo.setCurrentText(name.strip())
+        self.calib_status.setText(f"状态: 已标定 (配置: {name.strip()})")
+
+    def delete_profile(self):
+        """删除当前选中的标定配置（不影响正在使用的参数）"""
+        name = self.profile_combo.currentText()
+        if not name:
+            return
+        self.profile_store.delete(name)
+        self.profile_combo.removeItem(self.profile_combo.currentIndex())
+        self.profile_combo.setCurrentIndex(-1)
+
+    def start_calibration(self, left_dir, right_dir, chessboard_size, square_size, incremental=False,
+                          max_views=None, compare_full=False, video_path=None):
+        """在后台线程执行相机标定，标定期间界面和视频播放不受影响"""
+        if self.calibration_thread is not None:
+            QMessageBox.warning(self, "标定进行中", "已有标定任务正在运行，请等待完成或取消")
+            return
+
+        # 在新的标定器上求解，成功后才替换处理器当前使用的标定器
+        from calibration_worker import CalibrationWorker
+        calibrator = self.processor.new_calibration_target(incremental)
+        self.calibration_thread = QThread(self)
+        self.calibration_worker = CalibrationWorker(
+            self.processor, calibrator,
+            left_dir, right_dir,
+            chessboard_size, square_size,
+            incremental=incremental,
+            max_views=max_views,
+            compare_full=compare_full,
+            video_path=video_path
+        )
+        self.calibration_worker.moveToThread(self.calibration_thread)
+        self.calibration_thread.started.connect(self.calibration_worker.run)
+        self.calibration_worker.progress.connect(self.on_calibration_progress)
+        self.calibration_worker.succeeded.connect(self.on_calibration_succeeded)
+        self.calibration_worker.failed.connect(self.on_calibration_failed)
+        self.calibration_worker.cancelled.connect(self.on_calibration_cancelled)
+        self.calibration_worker.finished.connect(self.calibration_thread.quit)
+        self.calibration_thread.finished.connect(self.on_calibration_thread_finished)
+
+        self.calibration_progress = QProgressDialog("准备标定...", "取消", 0, 0, self)
+        self.calibration_progress.setWindowTitle("相机标定")
+        self.calibration_progress.setWindowModality(Qt.NonModal)
+        self.calibration_progress.setAutoClose(False)
+        self.calibration_progress.setAutoReset(False)
+        self.calibration_progress.setMinimumDuration(0)
+        self.calibration_progress.canceled.connect(self.cancel_calibration)
+        self.calibration_progress.show()
+
+        self.calibrate_btn.setEnabled(False)
+        self.calib_status.setText("状态: 标定中...")
+        self.calibration_thread.start()
+
+    def cancel_calibration(self):
+        """取消正在进行的后台标定"""
+        if self.calibration_worker is not None:
+            self.calibration_worker.cancel()
+            self.calibration_progress.setLabelText("正在取消...")
+
+    def on_calibration_progress(self, phase, current, total):
+        """显示标定进度：角点检测按图像对计数，求解阶段显示当前阶段"""
+        if self.calibration_progress is None:
+            return
+        if total:
+            self.calibration_progress.setRange(0, total)
+            self.calibration_progress.setValue(current)
+            self.calibration_progress.setLabelText(f"{phase}: {current}/{total}")
+        else:
+            self.calibration_progress.setRange(0, 0)
+            self.calibration_progress.setLabelText(f"{phase}...")
+
+    def on_calibration_succeeded(self, result):
+        """标定成功：原子地切换到新的标定结果"""
+        ret, calibrator, report = result
+        self._close_calibration_progress()
+        if ret:
+            self.processor.apply_calibration(calibrator, report)
+            self.update_depth_range()
+            self.profile_combo.setCurrentIndex(-1)
+            used = len(calibrator.objpoints) - len(calibrator.rejected_views)
+            self.calib_status.setText(f"状态: 已标定 (误差: {ret:.2f})")
+            self.calib_status.setStyleSheet("color: green;")
+            QMessageBox.information(
+                self, "标定成功",
+                f"标定完成，RMS误差: {ret:.2f}\n"
+                f"使用视图: {used}/{len(calibrator.objpoints)}，剔除离群视图: {len(calibrator.rejected_views)}"
+                + self.format_selection_report(report))
+        else:
+            self.calib_status.setText("状态: 标定失败")
             self.calib_status.setStyleSheet("color: red;")
-            QMessageBox.critical(self, "标定错误", str(e))
+            QMessageBox.warning(self, "标定失败", "请检查图像和参数设置")
+
+    def on_calibration_failed(self, message):
+        self._close_calibration_progress()
+        self.calib_status.setText("状态: 标定错误")
+        self.calib_status.setStyleSheet("color: red;")
+        QMessageBox.critical(self, "标定错误", message)
+
+    def on_calibration_cancelled(self):
+        self._close_calibration_progress()
+        self.calib_status.setText("状态: 标定已取消" if not self.processor.calibrator.is_calibrated
+                                  else "状态: 标定已取消（沿用原标定参数）")
+        self.calib_status.setStyleSheet("color: orange;")
+
+    def _close_calibration_progress(self):
+        if self.calibration_progress is not None:
+            self.calibration_progress.canceled.disconnect(self.cancel_calibration)
+            self.calibration_progress.close()
+            self.calibration_progress = None
+
+    def on_calibration_thread_finished(self):
+        """后台标定线程结束后清理"""
+        self.calibration_worker.deleteLater()
+        self.calibration_thread.deleteLater()
+        self.calibration_worker = None
+        self.calibration_thread = None
+        self.calibrate_btn.setEnabled(True)
+
+    def format_selection_report(self, report):
+        """格式化视图筛选的耗时和精度对比"""
+        if not report:
+            return ""
+        lines = [""]
+        video = report.get('video')
+        if video is not None:
+            lines.append(f"标定视频: 读取 {video['frames']} 帧，检测到棋盘格 {video['detected']} 帧，"
+                         f"模糊 {video['blurred']}，重复位姿 {video['duplicates']}，"
+                         f"保留 {video['accepted']} 帧（{video['elapsed']:.1f}s）")
+        if 'selected_views' not in report:
+            return "\n".join(lines)
+        if 'full_solve_time' in report:
+            saved = report['full_solve_time'] - report['solve_time']
+            timing = (f"求解耗时: {report['solve_time']:.2f}s，全部视图实测: "
+                      f"{report['full_solve_time']:.2f}s，节省 {saved:.2f}s")
+        else:
+            timing = (f"求解耗时: {report['solve_time']:.2f}s"
+                      f"（全部视图估计约 {report['full_solve_time_estimate']:.1f}s，未实测）")
+        lines += [
+            f"视图筛选: {report['selected_views']}/{report['total_views']}",
+            timing,
+            "子集结果在全部视图上的误差: 左 {:.3f}px / 右 {:.3f}px".format(*report['all_views_error']),
+        ]
+        if 'full_all_views_error' in report:
+            lost = np.subtract(report['all_views_error'], report['full_all_views_error'])
+            lines.append("全部视图标定的误差: 左 {:.3f}px / 右 {:.3f}px".format(*report['full_all_views_error']))
+            lines.append(f"精度损失: 左 {lost[0]:+.3f}px / 右 {lost[1]:+.3f}px")
+        return "\n".join(lines)
 
     def update_frame(self):
         """更新视频帧"""
-        if self.capture is None or not self.is_playing:
+        if not self.is_playing:
+            return
+        if self.pipeline is not None:
+            self.update_frame_from_pipeline()
+            return
+        if self.capture is None:
             return
 
         ret, frame = self.capture.read()
@@ -324,38 +730,158 @@ class MainWindow(QMainWindow):
             self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
             return
 
+        # 自适应质量只作用于稠密模式，跳过的帧只读取不处理
+        controller = self.quality_controller if self.current_mode != "稀疏测距" else None
+        if controller is not None and not controller.should_process():
+            return
+        start = controller.begin() if controller is not None else None
+
         try:
-            original, gray_img, depth_img, threeD = self.processor.process_frame(frame)
-            self.threeD = threeD  # 保存当前帧的三维数据
-            # 显示原始视频
-            original = cv2.cvtColor(original, cv2.COLOR_BGR2RGB)
-            height, width, channel = original.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(original.data, width, height, bytes_per_line, QImage.Format_RGB888)
-            self.original_label.setPixmap(QPixmap.fromImage(q_img))
-
-            # 根据模式显示结果
-            if self.current_mode == "灰度图":
-                display_img = gray_img
-            elif self.current_mode == "深度图":
-                display_img = depth_img
-            else:  # 点云模式
-                point_cloud_img = self.processor.generate_point_cloud(threeD)
-                display_img = point_cloud_img
-
-            # 更新当前显示的视图
-            current_view = self.result_layout.currentWidget()
-            height, width, channel = display_img.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(display_img.data, width, height, bytes_per_line, QImage.Format_RGB888)
-            current_view.setPixmap(QPixmap.fromImage(q_img))
+            pixels = depth_img = None
+            if self.current_mode == "稀疏测距":
+                # 稀疏模式只匹配特征点，不计算稠密视差
+                original, gray_img, pixels, points = self.processor.process_frame_sparse(frame)
+                self.sparse_pixels = pixels
+                self.sparse_points = points
+                self.depth_map = None
+            else:
+                original, gray_img, depth_img, depth_map = self.processor.process_frame(
+                    frame, self.required_outputs())
+                self.depth_map = depth_map  # 保存当前帧的深度图（uint16毫米）
+            self.display_results(original, gray_img, depth_img, pixels)
+        except Exception as e:
+            print(f"处理帧时出错: {str(e)}")
+        if controller is not None:
+            controller.record(start)
+            self.quality_label.setText(controller.describe())
+
+    def update_frame_from_pipeline(self):
+        """进程分离模式：从共享内存读取最新的视差结果并显示"""
+        if self.pipeline_key != self.current_pipeline_key():
+            # 标定或匹配参数（工作深度范围、质量等级）已改变，按新参数重启管线，
+            # 否则处理进程的视差与界面侧的深度查找表（min_disparity）不一致
+            self.stop_pipeline()
+            self.start_pipeline(self.current_video_path)
+            return
+        result = self.pipeline.latest_result()
+        if result is None:
+            return
+        _, input_seq, left, disparity = result
+        try:
+            # 原始帧直接从共享内存转换为显示用的RGB图像，转换后确认期间未被采集进程覆盖
+            original_rgb = None
+            frame = self.pipeline.frame_view(input_seq)
+            if frame is not None:
+                original_rgb = cv2.cvtColor(frame[0:480, 0:640], cv2.COLOR_BGR2RGB)
+                if not self.pipeline.frame_is_current(input_seq):
+                    original_rgb = None
+            # 结果缓冲区交替复用，本帧和上一帧的结果不会被覆盖，跟踪和测距可直接引用；
+            # 查询服务在其他线程中读取快照，时间不受控制，需要独立的视差副本
+            if self.depth_server is not None:
+                disparity = disparity.copy()
+            gray_img, depth_img, depth_map = self.processor.outputs_from_disparity(
+                left, disparity, self.required_outputs())
+            self.depth_map = depth_map
+            self.sparse_pixels = self.sparse_points = None
+            if original_rgb is not None:
+                self.show_original(original_rgb)
+            self.display_results(None, gray_img, depth_img, None)
         except Exception as e:
             print(f"处理帧时出错: {str(e)}")
 
+    def required_outputs(self):
+        """按当前显示模式和正在使用深度的功能（跟踪、障碍区域、查询服务）确定需要计算的结果"""
+        outputs = {"灰度图": {OUTPUT_GRAY},
+                   "深度图": {OUTPUT_DEPTH_IMAGE, OUTPUT_DEPTH},  # 深度值供点击测距使用
+                   "点云": {OUTPUT_DEPTH}}.get(self.current_mode, set())
+        tracking = self.track_check.isChecked() or (self.tracker is not None and self.tracker.targets)
+        if tracking or self.processor.zones or self.depth_server is not None:
+            outputs.add(OUTPUT_DISPARITY)
+        if self.ground is not None:
+            outputs.add(OUTPUT_DEPTH)
+        return outputs
+
+    def show_original(self, original_rgb):
+        """显示原始视频帧（RGB，会在其上绘制ROI）
+
+        正在拖动的框是原始图像坐标；已设置的ROI是校正后坐标，按校正映射画出其在原始图像上的轮廓
+        """
+        if self._roi_drag_rect is not None:
+            rx, ry, rw, rh = self._roi_drag_rect
+            cv2.rectangle(original_rgb, (rx, ry), (rx + rw - 1, ry + rh - 1), (255, 255, 0), 2)
+        elif self.processor.roi is not None:
+            outline = self.processor.rect_outline_in_original(self.processor.roi)
+            cv2.polylines(original_rgb, [outline], True, (255, 255, 0), 2)
+        height, width, channel = original_rgb.shape
+        bytes_per_line = 3 * width
+        q_img = QImage(original_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
+        self.original_label.setPixmap(QPixmap.fromImage(q_img))
+
+    def display_results(self, original, gray_img, depth_img, pixels):
+        """显示原始视频和当前模式下的处理结果"""
+        self.frame_seq += 1
+        # 显示原始视频（为None时保留上一帧，例如进程分离模式下已单独显示）
+        if original is not None:
+            self.show_original(cv2.cvtColor(original, cv2.COLOR_BGR2RGB))
+
+        # 根据模式显示结果
+        if self.current_mode == "灰度图":
+            display_img = gray_img
+        elif self.current_mode == "深度图":
+            display_img = depth_img
+        elif self.current_mode == "稀疏测距":
+            display_img = gray_img
+            for px, py in (pixels if pixels is not None else []):
+                cv2.circle(display_img, (int(px), int(py)), 2, (0, 255, 0), -1)
+        else:  # 点云模式
+            point_cloud_img = self.processor.generate_point_cloud(self.depth_map)
+            display_img = point_cloud_img
+
+        # 更新跟踪目标并绘制
+        if self.tracker is not None and self.tracker.targets:
+            self.tracker.update(self.processor.last_rectified_left, self.processor.last_disparity)
+            if self.current_mode != "点云":
+                self.tracker.draw_targets(display_img)
+            self.update_tracking_view()
+
+        # 障碍区域：绘制区域框并提示报警状态变化
+        if self.processor.zones and pixels is None:
+            if self.current_mode in ("灰度图", "深度图"):
+                from stereo_core.obstacle_zones import draw_zones
+                draw_zones(display_img, self.processor.zones)
+            if self.processor.zone_events:
+                self.show_zone_events(self.processor.zone_events)
+
+        # 地面估计：在结果图中标出离地高度超过障碍高度的像素
+        if self.ground is not None and pixels is None and self.depth_map is not None:
+            self.ground.update(self.depth_map)
+            self.ground_label.setText(self.ground.describe())
+            if self.ground.plane is not None and self.current_mode in ("灰度图", "深度图"):
+                mask = self.ground.obstacle_mask(self.depth_map, self.obstacle_height_spin.value() * 1000)
+                display_img[mask] = display_img[mask] // 2 + np.array([127, 0, 127], dtype=np.uint8)
+
+        # 稠密模式下向查询服务发布本帧深度
+        if self.depth_server is not None and pixels is None and self.processor.last_disparity is not None:
+            from stereo_core.depth_server import DepthSnapshot
+            self.depth_server.publish(DepthSnapshot.from_processor(self.processor, self.frame_seq, self.tracker))
+
+        # 更新当前显示的视图
+        current_view = self.result_layout.currentWidget()
+        height, width, channel = display_img.shape
+        bytes_per_line = 3 * width
+        q_img = QImage(display_img.data, width, height, bytes_per_line, QImage.Format_RGB888)
+        current_view.setPixmap(QPixmap.fromImage(q_img))
+
     def show_distance(self, event):
         """显示点击位置的深度信息（优化版，解决闪烁和内存问题）"""
+        if self.track_check.isChecked():
+            self.add_tracked_target(event)
+            return
         try:
-            if self.current_mode != "深度图" or not hasattr(self, 'threeD') or self.threeD is None:
+            if self.current_mode == "稀疏测距":
+                if self.sparse_pixels is None or len(self.sparse_pixels) == 0:
+                    return
+            elif self.current_mode != "深度图" or not hasattr(self, 'depth_map') or self.depth_map is None:
                 return
 
             # 获取当前显示的pixmap
@@ -376,18 +902,48 @@ class MainWindow(QMainWindow):
             if not (0 <= x < img_size.width() and 0 <= y < img_size.height()):
                 return
 
+            if not self.processor.in_roi(x, y):
+                self.distance_text.clear()
+                self.distance_text.setAlignment(Qt.AlignCenter)
+                self.distance_text.append("=== 点击位置信息 ===")
+                self.distance_text.append(f"像素坐标: (x={x}, y={y})")
+                self.distance_text.append("该位置在ROI或校正有效区域之外，未计算深度")
+                return
+
             # 获取3D坐标信息
-            point_3d = self.threeD[y][x]
+            if self.current_mode == "稀疏测距":
+                # 吸附到距离点击位置最近的稀疏特征点
+                offsets = self.sparse_pixels - np.array([x, y])
+                nearest = int(np.argmin(np.einsum('ij,ij->i', offsets, offsets)))
+                x, y = (int(v) for v in self.sparse_pixels[nearest])
+                point_3d = self.sparse_points[nearest]
+                marker_pos = QPoint(int(x / scale_x), int(y / scale_y))
+            else:
+                point_3d = self.processor.depth_point(x, y, self.depth_map)
+                if point_3d is None:
+                    self.distance_text.clear()
+                    self.distance_text.setAlignment(Qt.AlignCenter)
+                    self.distance_text.append("=== 点击位置信息 ===")
+                    self.distance_text.append(f"像素坐标: (x={x}, y={y})")
+                    self.distance_text.append("该位置没有有效视差")
+                    return
+                marker_pos = QPoint(int(event.pos().x()), int(event.pos().y()))
             distance = np.linalg.norm(point_3d) / 1000  # 转换为米
 
             # 更新信息显示（居中）
             self.distance_text.clear()
             self.distance_text.setAlignment(Qt.AlignCenter)  # 设置文字居中
             self.distance_text.append("=== 点击位置信息 ===")
+            if self.current_mode == "稀疏测距":
+                self.distance_text.append("(已吸附到最近的稀疏特征点)")
             self.distance_text.append(f"像素坐标: (x={x}, y={y})")
             self.distance_text.append(
                 f"世界坐标: (X={point_3d[0] / 1000:.3f}m, Y={point_3d[1] / 1000:.3f}m, Z={point_3d[2] / 1000:.3f}m)")
             self.distance_text.append(f"距离相机距离: {distance:.3f} 米")
+            if self.ground is not None:
+                height = self.ground.height_of(point_3d)
+                self.distance_text.append(f"离地高度: {height / 1000:.3f} 米" if height is not None
+                                          else "离地高度: 未找到地面")
 
             # 创建带标记的新图像（使用原始图像副本）
             marked_pixmap = current_pixmap.copy()
@@ -397,7 +953,7 @@ class MainWindow(QMainWindow):
             try:
                 painter.setRenderHint(QPainter.Antialiasing)
                 painter.setPen(QPen(Qt.red, 3))
-                painter.drawEllipse(QPoint(int(event.pos().x()), int(event.pos().y())), 5, 5)
+                painter.drawEllipse(marker_pos, 5, 5)
             finally:
                 painter.end()
 
@@ -413,6 +969,145 @@ class MainWindow(QMainWindow):
             if hasattr(self, '_last_valid_pixmap'):
                 self.result_label.setPixmap(self._last_valid_pixmap)
 
+    def add_tracked_target(self, event):
+        """在点击位置添加连续跟踪目标"""
+        if self.current_mode not in ("灰度图", "深度图") or self.processor.last_disparity is None:
+            self.distance_text.setPlainText("连续跟踪需要在灰度图或深度图模式下使用")
+            return
+        pos = self._label_to_image(self.result_label, event.pos())
+        if pos is None:
+            return
+        x, y = pos
+        if not self.processor.in_roi(x, y):
+            self.distance_text.setPlainText("该位置在ROI之外，无法跟踪测距")
+            return
+        if self.tracker is None:
+            from stereo_core.point_tracker import PointTracker
+            self.tracker = PointTracker(self.processor)
+        target = self.tracker.add_target(x, y, self.processor.last_rectified_left,
+                                         self.processor.last_disparity)
+        self.distance_text.setPlainText(f"已添加跟踪目标 T{target.target_id}: (x={x}, y={y})")
+        self.update_tracking_view()
+
+    def clear_tracking(self):
+        """清除所有跟踪目标"""
+        if self.tracker is not None:
+            self.tracker.clear()
+        self.track_plot_label.clear()
+        self.track_plot_label.hide()
+
+    def update_tracking_view(self):
+        """刷新跟踪目标的距离文字和实时曲线"""
+        lines = ["=== 跟踪目标距离 ==="]
+        for target in self.tracker.targets:
+            if target.lost:
+                lines.append(f"T{target.target_id}: 目标丢失")
+            elif target.distance is None:
+                lines.append(f"T{target.target_id}: 无有效视差")
+            else:
+                lines.append(f"T{target.target_id}: {target.distance:.3f} 米")
+        self.distance_text.setPlainText("\n".join(lines))
+
+        plot = self.tracker.render_plot(self.track_plot_label.width(), self.track_plot_label.height())
+        plot = cv2.cvtColor(plot, cv2.COLOR_BGR2RGB)
+        height, width, _ = plot.shape
+        q_img = QImage(plot.data, width, height, 3 * width, QImage.Format_RGB888)
+        self.track_plot_label.setPixmap(QPixmap.fromImage(q_img))
+        self.track_plot_label.show()
+
+    def toggle_roi(self):
+        """设置或清除感兴趣区域"""
+        if self.processor.roi is not None or self.roi_selecting:
+            self.processor.set_roi(None)
+            self.roi_selecting = False
+            self._roi_drag_rect = None
+            self.roi_btn.setText("设置ROI")
+            return
+        self.roi_selecting = True
+        self.zone_selecting = False
+        self.roi_btn.setText("清除ROI")
+        self.distance_text.setPlainText("请在左侧原始视频上拖动鼠标框选ROI区域")
+
+    def start_zone_selection(self):
+        """开始在原始视频上框选障碍区域"""
+        self.roi_selecting = False
+        self.zone_selecting = True
+        self.distance_text.setPlainText("请在左侧原始视频上拖动鼠标框选障碍区域")
+
+    def add_zone(self, rect):
+        threshold, ok = QInputDialog.getDouble(self, "障碍区域", "报警距离（米）:", 1.0, 0.1, 100.0, 2)
+        if not ok:
+            return
+        zone = self.processor.add_zone(rect, threshold)
+        x, y, w, h = zone.rect
+        self.distance_text.setPlainText(f"已添加障碍区域 {zone.name}: x={x}, y={y}, 宽={w}, 高={h}, "
+                                        f"报警距离 {threshold:.2f} 米")
+
+    def clear_zones(self):
+        self.processor.clear_zones()
+        self.zone_selecting = False
+
+    def show_zone_events(self, events):
+        """显示障碍区域报警状态的变化"""
+        lines = ["=== 障碍区域报警 ==="]
+        for zone, event in events:
+            if event == 'enter':
+                lines.append(f"{zone.name}: 障碍距离 {zone.distance:.2f} 米，低于 {zone.threshold:.2f} 米")
+            else:
+                lines.append(f"{zone.name}: 报警解除（{zone.distance:.2f} 米）")
+        print("\n".join(lines[1:]))
+        if any(event == 'enter' for _, event in events):
+            QApplication.beep()
+        self.distance_text.setPlainText("\n".join(lines))
+
+    def _label_to_image(self, label, pos):
+        """将标签上的鼠标位置换算为图像像素坐标"""
+        pixmap = label.pixmap()
+        if not pixmap:
+            return None
+        scale_x = pixmap.width() / label.width()
+        scale_y = pixmap.height() / label.height()
+        x = min(max(int(pos.x() * scale_x), 0), pixmap.width() - 1)
+        y = min(max(int(pos.y() * scale_y), 0), pixmap.height() - 1)
+        return x, y
+
+    def roi_mouse_press(self, event):
+        if not (self.roi_selecting or self.zone_selecting):
+            return
+        self._roi_drag_start = self._label_to_image(self.original_label, event.pos())
+
+    def roi_mouse_move(self, event):
+        if not (self.roi_selecting or self.zone_selecting) or self._roi_drag_start is None:
+            return
+        end = self._label_to_image(self.original_label, event.pos())
+        if end is None:
+            return
+        x0, y0 = self._roi_drag_start
+        self._roi_drag_rect = (min(x0, end[0]), min(y0, end[1]), abs(end[0] - x0) + 1, abs(end[1] - y0) + 1)
+
+    def roi_mouse_release(self, event):
+        if not (self.roi_selecting or self.zone_selecting) or self._roi_drag_start is None:
+            return
+        self.roi_mouse_move(event)
+        rect = self._roi_drag_rect
+        self._roi_drag_start = None
+        self._roi_drag_rect = None
+        if rect is None:
+            return
+        # 框选在原始（未校正）图像上进行，ROI和障碍区域都使用校正后坐标
+        rect = self.processor.rect_from_original(rect)
+        if self.zone_selecting:
+            self.zone_selecting = False
+            self.add_zone(rect)
+            return
+        try:
+            self.processor.set_roi(rect)
+            self.roi_selecting = False
+            x, y, w, h = self.processor.roi
+            self.distance_text.setPlainText(f"ROI已设置: x={x}, y={y}, 宽={w}, 高={h}（ROI外不计算深度）")
+        except ValueError as e:
+            self.distance_text.setPlainText(f"ROI设置失败: {str(e)}，请重新框选")
+
     def update_display_mode(self, mode):
         """更新显示模式"""
         self.current_mode = mode
@@ -423,7 +1118,14 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """关闭窗口时释放资源"""
+        if self.calibration_thread is not None:
+            self.calibration_worker.cancel()
+            self.calibration_thread.quit()
+            self.calibration_thread.wait()
         if self.capture is not None:
             self.capture.release()
+        self.stop_pipeline()
+        if self.depth_server is not None:
+            self.depth_server.stop()
         self.timer.stop()
         event.accept()
\ No newline at end of file
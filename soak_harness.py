@@ -0,0 +1,224 @@
+# soak_harness.py
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+"""长时间运行测试：循环播放本地视频，统计每帧延迟分位数和内存随时间的增长
+
+    python soak_harness.py video.avi --profile 配置A --frames 20000
+    python soak_harness.py video.avi --profile 配置A --frames 5000 --gui --mode 深度图
+
+延迟或内存的增长斜率超过设定上限时以非零状态退出；预热后的采样点少于 --min-samples 时不检查斜率。
+"""
+
+
+def read_rss_mb():
+    """当前进程的常驻内存（MB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        import resource
+        # 不支持时退化为峰值内存（Linux单位为KB）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="双目测距长时间运行测试")
+    parser.add_argument("video", help="左右并排的本地视频文件，播放结束后循环")
+    parser.add_argument("--profile", required=True, help="使用的标定配置名称")
+    parser.add_argument("--profiles", default=None, help="标定配置文件，默认为用户配置目录下的配置文件")
+    parser.add_argument("--frames", type=int, default=10000, help="运行的总帧数")
+    parser.add_argument("--warmup", type=int, default=200, help="不计入增长斜率的预热帧数")
+    parser.add_argument("--sample-every", type=int, default=500, help="每隔多少帧采样一次内存和延迟分位数")
+    parser.add_argument("--gui", action="store_true", help="通过离屏Qt驱动 MainWindow.update_frame（含显示）")
+    parser.add_argument("--mode", default="深度图", help="GUI模式下的显示模式")
+    parser.add_argument("--tracemalloc", action="store_true", help="记录Python内存分配快照，报告增长最多的位置")
+    parser.add_argument("--max-latency-slope", type=float, default=1.0,
+                        help="p50延迟增长上限（ms/千帧）")
+    parser.add_argument("--max-rss-slope", type=float, default=5.0, help="RSS增长上限（MB/千帧）")
+    parser.add_argument("--min-samples", type=int, default=5,
+                        help="检查增长斜率所需的预热后最少采样点数，不足时只报告不判定")
+    parser.add_argument("--report", default=None, help="把完整报告写入JSON文件")
+    return parser.parse_args(argv)
+
+
+def load_calibrator(args):
+    from stereo_core.calibration_profiles import CalibrationProfileStore, DEFAULT_PROFILE_PATH
+    return CalibrationProfileStore(args.profiles or DEFAULT_PROFILE_PATH).get(args.profile)
+
+
+def make_processor_step(args, calibrator):
+    """直接驱动处理器：每次调用读取（必要时循环）并处理一帧"""
+    import cv2
+    from stereo_core.stereo_vision_processor import StereoVisionProcessor
+
+    processor = StereoVisionProcessor()
+    processor.apply_calibration(calibrator)
+    capture = cv2.VideoCapture(args.video)
+    if not capture.isOpened():
+        raise RuntimeError(f"无法打开视频文件: {args.video}")
+
+    def step():
+        ret, frame = capture.read()
+        if not ret:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = capture.read()
+            if not ret:
+                raise RuntimeError("视频无法读取")
+        start = time.perf_counter()
+        processor.process_frame(frame)
+        return time.perf_counter() - start
+
+    return step, capture.release
+
+
+def make_gui_step(args, calibrator):
+    """通过离屏Qt驱动主窗口的显示路径（视频读取也计入延迟）"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    from main_window import MainWindow
+
+    window = MainWindow()
+    window.processor.apply_calibration(calibrator)
+    window.mode_combo.setCurrentText(args.mode)
+    if not window.load_video(args.video):
+        raise RuntimeError(f"无法打开视频文件: {args.video}")
+    # 由本程序逐帧驱动，不使用窗口的定时器
+    window.timer.stop()
+    window.is_playing = True
+
+    def step():
+        """返回本次的耗时；视频循环回开头等没有显示新帧的调用返回None，不计入延迟"""
+        shown = window.frame_seq
+        start = time.perf_counter()
+        window.update_frame()
+        app.processEvents()
+        elapsed = time.perf_counter() - start
+        return elapsed if window.frame_seq != shown else None
+
+    def close():
+        window.close()
+        app.processEvents()
+
+    return step, close
+
+
+def slope_per_thousand(frames, values):
+    """线性拟合的斜率（每千帧的增量）"""
+    if len(frames) < 2:
+        return 0.0
+    return float(np.polyfit(np.asarray(frames, dtype=np.float64), np.asarray(values, dtype=np.float64), 1)[0] * 1000)
+
+
+def run(args):
+    calibrator = load_calibrator(args)
+    step, close = (make_gui_step if args.gui else make_processor_step)(args, calibrator)
+    if args.tracemalloc:
+        tracemalloc.start(10)
+
+    latencies = np.empty(args.frames, dtype=np.float64)
+    samples = []
+    baseline_snapshot = None
+    started = time.perf_counter()
+    done = idle = 0
+    try:
+        while done < args.frames:
+            elapsed = step()
+            if elapsed is None:
+                idle += 1
+                if idle > 100:
+                    raise RuntimeError("连续多次没有处理新帧，请检查视频和标定")
+                continue
+            idle = 0
+            latencies[done] = elapsed * 1000
+            done += 1
+            if done == args.warmup and args.tracemalloc:
+                gc.collect()
+                baseline_snapshot = tracemalloc.take_snapshot()
+            if done % args.sample_every == 0 or done == args.frames:
+                window = latencies[max(0, done - args.sample_every):done]
+                sample = {
+                    'frame': done,
+                    'elapsed': time.perf_counter() - started,
+                    'p50': float(np.percentile(window, 50)),
+                    'p95': float(np.percentile(window, 95)),
+                    'p99': float(np.percentile(window, 99)),
+                    'rss_mb': read_rss_mb(),
+                }
+                if args.tracemalloc:
+                    current, peak = tracemalloc.get_traced_memory()
+                    sample['traced_mb'] = current / 1e6
+                    sample['traced_peak_mb'] = peak / 1e6
+                samples.append(sample)
+                print(f"[{done}/{args.frames}] p50 {sample['p50']:.1f} ms, p95 {sample['p95']:.1f} ms, "
+                      f"p99 {sample['p99']:.1f} ms, RSS {sample['rss_mb']:.1f} MB", flush=True)
+    finally:
+        close()
+
+    report = {
+        'video': args.video,
+        'gui': args.gui,
+        'frames': args.frames,
+        'latency_ms': {q: float(np.percentile(latencies, int(q[1:]))) for q in ('p50', 'p95', 'p99')},
+        'samples': samples,
+    }
+    steady = [s for s in samples if s['frame'] > args.warmup]
+    report['latency_slope'] = slope_per_thousand([s['frame'] for s in steady], [s['p50'] for s in steady])
+    report['rss_slope'] = slope_per_thousand([s['frame'] for s in steady], [s['rss_mb'] for s in steady])
+
+    if args.tracemalloc and baseline_snapshot is not None:
+        gc.collect()
+        stats = tracemalloc.take_snapshot().compare_to(baseline_snapshot, 'lineno')
+        report['tracemalloc_top'] = [str(stat) for stat in stats[:10]]
+        tracemalloc.stop()
+
+    failures = []
+    report['notes'] = []
+    if len(steady) < max(2, args.min_samples):
+        # 采样点太少时拟合的斜率没有意义，不作为失败
+        report['notes'].append(f"预热后只有 {len(steady)} 个采样点（需要 {max(2, args.min_samples)} 个），"
+                               f"未检查增长斜率，请增加帧数或减小采样间隔")
+    else:
+        if report['latency_slope'] > args.max_latency_slope:
+            failures.append(f"延迟增长 {report['latency_slope']:.2f} ms/千帧 超过上限 {args.max_latency_slope}")
+        if report['rss_slope'] > args.max_rss_slope:
+            failures.append(f"内存增长 {report['rss_slope']:.2f} MB/千帧 超过上限 {args.max_rss_slope}")
+    report['failures'] = failures
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    lat = report['latency_ms']
+    print(f"延迟: p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, p99 {lat['p99']:.1f} ms")
+    print(f"增长斜率: 延迟 {report['latency_slope']:.3f} ms/千帧, RSS {report['rss_slope']:.3f} MB/千帧")
+    for line in report.get('tracemalloc_top', []):
+        print("  " + line)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for note in report['notes']:
+        print(f"注意: {note}")
+    for failure in report['failures']:
+        print(f"失败: {failure}")
+    return 1 if report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
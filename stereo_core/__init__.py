@@ -0,0 +1,42 @@
+import importlib
+
+"""双目测距处理核心：不依赖Qt，可在界面之外单独使用
+
+导入本包不会加载cv2/numpy，首次访问下列名称时才导入对应模块，例如：
+    from stereo_core import StereoVisionProcessor
+"""
+
+# 对外名称 -> 所在模块
+_LAZY_EXPORTS = {
+    'StereoVisionProcessor': 'stereo_core.stereo_vision_processor',
+    'RectificationState': 'stereo_core.stereo_vision_processor',
+    'CameraCalibrator': 'stereo_core.camera_calibrator',
+    'CalibrationCancelled': 'stereo_core.camera_calibrator',
+    'PointTracker': 'stereo_core.point_tracker',
+    'CalibrationProfileStore': 'stereo_core.calibration_profiles',
+    'MultiStreamRunner': 'stereo_core.multi_stream',
+    'ObstacleZone': 'stereo_core.obstacle_zones',
+    'DepthEngine': 'stereo_core.depth_engine',
+    'QualityController': 'stereo_core.quality_controller',
+    'VideoViewCollector': 'stereo_core.video_calibration',
+    'FrameResult': 'stereo_core.stream',
+    'DualVideoSource': 'stereo_core.stream',
+    'GroundPlaneEstimator': 'stereo_core.ground_plane',
+    'VisionUtils': 'Utils.vision_utils',
+    'ViewSelector': 'Utils.view_selector',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
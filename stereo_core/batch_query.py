@@ -0,0 +1,346 @@
+import argparse
+import csv
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from stereo_core.depth_engine import INVALID_DEPTH
+from stereo_core.stereo_vision_processor import StereoVisionProcessor
+
+"""离线批量测距：按CSV中的 (帧号, x, y) 查询录像中各像素的距离和三维坐标
+
+    python -m stereo_core.batch_query video.avi queries.csv --profile 配置A --output result.csv
+
+查询按帧分组，只解码需要的帧（间隔较大时直接跳转），各帧的匹配在线程池中并行。
+坐标为校正后左图的像素坐标（与界面中点击测距的坐标一致）。默认按界面相同的区域（整帧或校正有效区域）匹配，
+结果与界面点击测距一致；SGBM的多方向代价聚合和斑点过滤都跨越整幅图像，只匹配查询点附近的区域
+（--band-padding）更快，但结果只是近似，可用 --check 抽查与整帧匹配的差异
+"""
+
+STATUS_OK = 'ok'
+STATUS_NO_DISPARITY = 'no_disparity'
+STATUS_OUT_OF_IMAGE = 'out_of_image'
+STATUS_MISSING_FRAME = 'missing_frame'
+
+RESULT_FIELDS = ['disparity', 'distance_m', 'X_mm', 'Y_mm', 'Z_mm', 'status']
+
+
+def read_queries(path):
+    """读取查询文件，返回 (原始行, 原始列名, 帧号数组, x数组, y数组)
+
+    需要 frame、x、y 三列（其他列原样保留到输出）；没有表头时按前三列解释
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        has_header = any(c.isalpha() for c in sample.splitlines()[0]) if sample else False
+        if has_header:
+            reader = csv.DictReader(f)
+            fieldnames = list(reader.fieldnames)
+            missing = {'frame', 'x', 'y'} - set(fieldnames)
+            if missing:
+                raise ValueError(f"查询文件缺少列: {', '.join(sorted(missing))}")
+            rows = list(reader)
+        else:
+            fieldnames = ['frame', 'x', 'y']
+            rows = [dict(zip(fieldnames, values)) for values in csv.reader(f) if values]
+    frames = np.array([int(row['frame']) for row in rows], dtype=np.int64)
+    xs = np.array([int(round(float(row['x']))) for row in rows], dtype=np.int64)
+    ys = np.array([int(round(float(row['y']))) for row in rows], dtype=np.int64)
+    return rows, fieldnames, frames, xs, ys
+
+
+def write_results(path, rows, fieldnames, results):
+    """按输入顺序写出查询结果"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames + [n for n in RESULT_FIELDS if n not in fieldnames])
+        writer.writeheader()
+        for row, result in zip(rows, results):
+            writer.writerow({**row, **result})
+
+
+class BatchDepthQuery:
+    """对录像批量计算指定像素的距离
+
+    radius: 取查询像素邻域内有效视差的中值，抑制单个像素的错误匹配（0为只取该像素）；
+    seek_gap: 与下一个需要的帧相隔超过该帧数时直接跳转，否则顺序grab跳过；
+    band_padding: 为None时按界面相同的区域匹配（结果一致），否则只匹配查询点上下左右各扩展该像素数的区域（近似）
+    """
+
+    def __init__(self, calibrator, workers=4, radius=2, prefetch=8, seek_gap=30, band_padding=None):
+        if not calibrator.is_calibrated:
+            raise RuntimeError("请先完成相机标定！")
+        self.processor = StereoVisionProcessor()
+        self.processor.apply_calibration(calibrator)
+        self.size = tuple(calibrator.size)
+        self.rectified_size = calibrator.rectified_size
+        self.maps = self.processor.get_rectify_maps()
+        self.engine = self.processor.get_depth_engine()
+        self.workers = workers
+        self.radius = radius
+        self.prefetch = prefetch
+        self.seek_gap = seek_gap
+        self.band_padding = band_padding
+        # SGBM匹配器每个线程一个
+        self._local = threading.local()
+        self.stats = {'frames': 0, 'bands': 0, 'rows': 0, 'decode_time': 0.0, 'elapsed': 0.0}
+
+    def _matcher(self):
+        matcher = getattr(self._local, 'matcher', None)
+        if matcher is None:
+            matcher = self._local.matcher = self.processor.create_stereo_matcher()
+        return matcher
+
+    def bands(self, xs, ys):
+        """把一帧内的查询点合并为需要计算的区域 [(x0, y0, x1, y1, 查询下标)]
+
+        band_padding为None时只有一个区域，即界面处理整帧时实际校正和匹配的区域；
+        否则每个查询点上下左右各扩展band_padding（加聚合窗口），左侧另加整个视差搜索范围，行范围重叠的查询点合并
+        """
+        width, height = self.rectified_size
+        p = self.processor
+        if self.band_padding is None:
+            rect = p.get_processing_region()
+            x0, y0, x1, y1 = (0, 0, width, height) if rect is None else p.get_compute_region(rect)
+            return [(x0, y0, x1, y1, list(range(len(xs))))] if len(xs) else []
+        pad = self.band_padding + p.block_size // 2 + self.radius
+        margin = p.min_disparity + p.num_disparities + pad
+        order = np.argsort(ys, kind='stable')
+        bands = []
+        for i in order:
+            y0, y1 = max(0, ys[i] - pad), min(height, ys[i] + pad + 1)
+            if bands and y0 <= bands[-1][3]:
+                band = bands[-1]
+                band[3] = max(band[3], y1)
+                band[4].append(i)
+            else:
+                bands.append([None, y0, None, y1, [i]])
+        for band in bands:
+            band_xs = xs[band[4]]
+            band[0] = max(0, int(band_xs.min()) - margin)
+            band[2] = min(width, int(band_xs.max()) + pad + 1)
+        return [tuple(band) for band in bands]
+
+    def split_gray(self, frame):
+        """左右并排的帧 -> (左灰度图, 右灰度图)"""
+        width, height = self.size
+        if frame.shape[0] != height or frame.shape[1] != width * 2:
+            frame = cv2.resize(frame, (width * 2, height))
+        return cv2.cvtColor(frame[:, :width], cv2.COLOR_BGR2GRAY), cv2.cvtColor(frame[:, width:], cv2.COLOR_BGR2GRAY)
+
+    def measure_frame(self, frame, xs, ys):
+        """一帧内的全部查询点，返回 (视差 (N,), 三维点 (N, 3) mm, 状态列表, 匹配的区域数, 匹配的行数)"""
+        gray_left, gray_right = self.split_gray(frame)
+        left_map, right_map = self.maps
+        width, height = self.rectified_size
+
+        n = len(xs)
+        raw = np.full(n, -1, dtype=np.int32)
+        status = [STATUS_OUT_OF_IMAGE] * n
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        idx = np.nonzero(inside)[0]
+        matcher = self._matcher()
+        # 界面中处理区域（校正有效区域）之外的像素不计算深度
+        rect = self.processor.get_processing_region() if self.band_padding is None else None
+        bands = rows = 0
+        for x0, y0, x1, y1, members in self.bands(xs[idx], ys[idx]):
+            # 只重映射并匹配该区域（映射表切片给出区域内像素在原图中的坐标）
+            img_left = cv2.remap(gray_left, left_map[0][y0:y1, x0:x1], left_map[1][y0:y1, x0:x1],
+                                 cv2.INTER_LINEAR)
+            img_right = cv2.remap(gray_right, right_map[0][y0:y1, x0:x1], right_map[1][y0:y1, x0:x1],
+                                  cv2.INTER_LINEAR)
+            disparity = matcher.compute(img_left, img_right)
+            bands += 1
+            rows += y1 - y0
+            valid_min = self.processor.min_disparity * 16
+            for member in members:
+                i = idx[member]
+                status[i] = STATUS_NO_DISPARITY
+                if rect is not None and not (rect[0] <= xs[i] < rect[0] + rect[2]
+                                             and rect[1] <= ys[i] < rect[1] + rect[3]):
+                    continue
+                x, y = xs[i] - x0, ys[i] - y0
+                r = self.radius
+                patch = disparity[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1]
+                valid = patch[patch >= valid_min]
+                if valid.size:
+                    raw[i] = int(np.median(valid))
+                status[i] = STATUS_OK if valid.size else STATUS_NO_DISPARITY
+
+        depths = np.where(raw >= 0, self.engine.lut[np.clip(raw, 0, None).astype(np.uint16)], INVALID_DEPTH)
+        points = self.engine.points(xs, ys, depths)
+        for i in np.nonzero((depths == INVALID_DEPTH) & (raw >= 0))[0]:
+            status[i] = STATUS_NO_DISPARITY
+        return raw / 16.0, points, status, bands, rows
+
+    def compare_full_frame(self, frame, xs, ys):
+        """把一帧的查询结果与整帧匹配（compute_disparity）在同一像素上的结果对比
+
+        返回 {'agree', 'only_batch', 'only_full', 'differ', 'invalid'} 各类查询点的个数，differ为两者都有效但相差超过1像素
+        """
+        disparity, _, status, _, _ = self.measure_frame(frame, xs, ys)
+        p = self.processor
+        p.init_stereo_matcher()
+        gray_left, gray_right = self.split_gray(frame)
+        left_map, right_map = self.maps
+        full = p.compute_disparity(cv2.remap(gray_left, left_map[0], left_map[1], cv2.INTER_LINEAR),
+                                   cv2.remap(gray_right, right_map[0], right_map[1], cv2.INTER_LINEAR))
+        width, height = self.rectified_size
+        counts = dict.fromkeys(['agree', 'only_batch', 'only_full', 'differ', 'invalid'], 0)
+        r = self.radius
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            patch = full[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1]
+            valid = patch[patch >= p.min_disparity * 16]
+            batch_ok = status[i] == STATUS_OK
+            if valid.size and batch_ok:
+                counts['agree' if abs(np.median(valid) / 16.0 - disparity[i]) <= 1.0 else 'differ'] += 1
+            elif batch_ok:
+                counts['only_batch'] += 1
+            elif valid.size:
+                counts['only_full'] += 1
+            else:
+                counts['invalid'] += 1
+        return counts
+
+    def check(self, video_path, frames, xs, ys, count=5):
+        """抽查查询最多的count帧，统计批量结果与整帧匹配的差异（见 compare_full_frame）"""
+        needed, sizes = np.unique(frames[frames >= 0], return_counts=True)
+        chosen = sorted(needed[np.argsort(-sizes, kind='stable')[:count]].tolist())
+        capture = cv2.VideoCapture(video_path)
+        totals = dict.fromkeys(['agree', 'only_batch', 'only_full', 'differ', 'invalid'], 0)
+        try:
+            for number, frame in self._frames(capture, chosen):
+                members = frames == number
+                for key, value in self.compare_full_frame(frame, xs[members], ys[members]).items():
+                    totals[key] += value
+        finally:
+            capture.release()
+        return totals
+
+    def _frames(self, capture, needed):
+        """按升序读取需要的帧，间隔大时跳转，否则grab跳过中间帧"""
+        position = 0
+        for number in needed:
+            if number - position > self.seek_gap:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, number)
+                position = number
+            while position < number:
+                if not capture.grab():
+                    return
+                position += 1
+            ret, frame = capture.read()
+            if not ret:
+                return
+            position += 1
+            yield number, frame
+
+    def run(self, video_path, frames, xs, ys, progress=None):
+        """执行全部查询，返回与输入顺序一致的结果字典列表"""
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+        start = time.perf_counter()
+        order = np.argsort(frames, kind='stable')
+        needed, first = np.unique(frames[order], return_index=True)
+        groups = dict(zip(needed.tolist(), np.split(order, first[1:])))
+        results = [None] * len(frames)
+
+        def store(number, measured):
+            disparity, points, status, bands, rows = measured
+            self.stats['bands'] += bands
+            self.stats['rows'] += rows
+            for j, i in enumerate(groups[number]):
+                ok = status[j] == STATUS_OK
+                X, Y, Z = points[j]
+                results[i] = {
+                    'disparity': f"{disparity[j]:.2f}" if disparity[j] >= 0 else '',
+                    'distance_m': f"{np.linalg.norm(points[j]) / 1000:.4f}" if ok else '',
+                    'X_mm': f"{X:.1f}" if ok else '', 'Y_mm': f"{Y:.1f}" if ok else '',
+                    'Z_mm': f"{Z:.1f}" if ok else '', 'status': status[j],
+                }
+            self.stats['frames'] += 1
+            if progress is not None:
+                progress(self.stats['frames'], len(needed))
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            decode_start = time.perf_counter()
+            for number, frame in self._frames(capture, [n for n in needed.tolist() if n >= 0]):
+                self.stats['decode_time'] += time.perf_counter() - decode_start
+                members = groups[number]
+                pending.append((number, pool.submit(self.measure_frame, frame, xs[members], ys[members])))
+                # 同时在途的帧数不超过prefetch，内存占用与查询的帧数无关
+                while len(pending) >= self.prefetch:
+                    number, future = pending.popleft()
+                    store(number, future.result())
+                decode_start = time.perf_counter()
+            while pending:
+                number, future = pending.popleft()
+                store(number, future.result())
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            capture.release()
+
+        # 视频中不存在的帧
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = dict.fromkeys(RESULT_FIELDS, '')
+                results[i]['status'] = STATUS_MISSING_FRAME
+        self.stats['elapsed'] = time.perf_counter() - start
+        return results
+
+
+def main(argv=None):
+    from stereo_core.calibration_profiles import CalibrationProfileStore, DEFAULT_PROFILE_PATH
+
+    parser = argparse.ArgumentParser(description="按CSV批量查询录像中像素的距离")
+    parser.add_argument("video", help="左右并排的录像文件")
+    parser.add_argument("queries", help="查询文件，包含 frame, x, y 列")
+    parser.add_argument("--profile", required=True, help="标定配置名称")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE_PATH, help="标定配置文件")
+    parser.add_argument("--output", default=None, help="结果文件，默认为查询文件名加 _result")
+    parser.add_argument("--workers", type=int, default=4, help="并行处理的帧数")
+    parser.add_argument("--radius", type=int, default=2, help="取邻域内有效视差中值的半径，0为只取该像素")
+    parser.add_argument("--band-padding", type=int, default=None,
+                        help="只匹配查询点周围扩展该像素数的区域（更快，结果与整帧匹配不完全一致），默认按整帧匹配")
+    parser.add_argument("--check", type=int, default=0, help="抽查的帧数：与整帧匹配对比查询结果")
+    args = parser.parse_args(argv)
+
+    rows, fieldnames, frames, xs, ys = read_queries(args.queries)
+    calibrator = CalibrationProfileStore(args.profiles).get(args.profile)
+    query = BatchDepthQuery(calibrator, workers=args.workers, radius=args.radius, band_padding=args.band_padding)
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f"[{done}/{total}] 帧", flush=True)
+
+    results = query.run(args.video, frames, xs, ys, progress)
+    output = args.output or args.queries.rsplit('.', 1)[0] + '_result.csv'
+    write_results(output, rows, fieldnames, results)
+
+    stats = query.stats
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(f"{len(rows)} 个查询，{stats['frames']} 帧，匹配 {stats['bands']} 个区域共 {stats['rows']} 行，"
+          f"耗时 {stats['elapsed']:.1f}s（解码 {stats['decode_time']:.1f}s）")
+    print("结果: " + "，".join(f"{k} {v}" for k, v in sorted(counts.items())) + f"，已写入 {output}")
+    if args.check > 0:
+        diff = query.check(args.video, frames, xs, ys, args.check)
+        print(f"与整帧匹配对比（{args.check} 帧）: 一致 {diff['agree']}，相差超过1像素 {diff['differ']}，"
+              f"仅批量有效 {diff['only_batch']}，仅整帧有效 {diff['only_full']}，均无效 {diff['invalid']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import json
+import os
+
+from stereo_core.camera_calibrator import CameraCalibrator
+
+"""命名标定配置：保存多套相机参数，运行时快速切换"""
+
+
+def _user_config_dir():
+    """当前用户的配置目录（Windows为APPDATA，其他系统为XDG_CONFIG_HOME或~/.config）"""
+    if os.name == 'nt' and os.environ.get('APPDATA'):
+        base = os.environ['APPDATA']
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'binocular_ranging')
+
+
+# 配置文件保存在用户配置目录，相机参数不会写入源码目录被提交
+DEFAULT_PROFILE_PATH = os.path.join(_user_config_dir(), "calibration_profiles.json")
+
+
+class CalibrationProfileStore:
+    """标定配置存储，参数持久化到JSON文件，已加载的标定器保存在内存中复用"""
+
+    def __init__(self, path=DEFAULT_PROFILE_PATH):
+        self.path = path
+        self._params = {}
+        # 同一配置始终返回同一个标定器实例，处理器可按其版本号命中校正状态缓存
+        self._calibrators = {}
+        self.load()
+
+    def load(self):
+        """从文件读取全部配置，文件不存在时为空"""
+        self._params = {}
+        self._calibrators = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._params = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取标定配置失败 {self.path}: {str(e)}")
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._params, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        return sorted(self._params)
+
+    def save(self, name, calibrator):
+        """保存标定器参数为命名配置（同名覆盖）"""
+        name = name.strip()
+        if not name:
+            raise ValueError("配置名称不能为空")
+        self._params[name] = calibrator.to_dict()
+        self._calibrators[name] = calibrator
+        self._write()
+
+    def delete(self, name):
+        self._params.pop(name, None)
+        self._calibrators.pop(name, None)
+        self._write()
+
+    def get(self, name):
+        """获取配置对应的标定器"""
+        if name not in self._params:
+            raise KeyError(f"标定配置不存在: {name}")
+        if name not in self._calibrators:
+            self._calibrators[name] = CameraCalibrator.from_dict(self._params[name])
+        return self._calibrators[name]
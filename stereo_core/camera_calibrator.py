@@ -0,0 +1,284 @@
+import cv2
+import numpy as np
+import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# 全局递增的标定版本号，保证不同标定器实例的版本也不会重复
+_version_counter = itertools.count(1)
+
+
+class CalibrationCancelled(Exception):
+    """标定被用户取消"""
+
+
+def report_progress(progress_callback, phase, current=0, total=0):
+    """向进度回调报告当前阶段；回调可抛出 CalibrationCancelled 以中止标定"""
+    if progress_callback is not None:
+        progress_callback(phase, current, total)
+
+
+"""相机标定"""
+class CameraCalibrator:
+    def __init__(self):
+        self.left_camera_matrix = None
+        self.right_camera_matrix = None
+        self.left_distortion = None
+        self.right_distortion = None
+        self.R = None
+        self.T = None
+        self.size = (640, 480)
+        # 立体校正的缩放参数：alpha为-1时由OpenCV自动选择，0只保留有效像素，1保留全部原图像素；
+        # new_size为校正后图像尺寸，None表示与原图相同
+        self.rectify_alpha = -1
+        self.new_size = None
+        # 校正后左右图中全部为有效像素的矩形 (x, y, w, h)
+        self.valid_roi1 = None
+        self.valid_roi2 = None
+        self.is_calibrated = False
+        # 标定参数版本号，每次标定后更新为全局唯一的新值，供处理器判断缓存是否失效
+        self.version = 0
+        # 已检测到的标定视图（增量标定时保留）
+        self.objpoints = []
+        self.left_imgpoints = []
+        self.right_imgpoints = []
+        # 每个视图的左右重投影误差 (N, 2)，以及被判为离群而剔除的视图下标
+        self.per_view_errors = None
+        self.rejected_views = []
+        # 离群视图判定：误差超过 中值 + k*MAD 且大于最小阈值（像素）
+        self.outlier_mad_factor = 3.0
+        self.outlier_min_error = 0.5
+        self.outlier_max_rounds = 2
+
+    #标定函数
+    def calibrate(self, objpoints, left_imgpoints, right_imgpoints, incremental=False, progress_callback=None):
+        """执行双目相机标定
+
+        incremental为True时在已保留的视图基础上追加新视图，并以上一次的内参作为初值热启动；
+        每轮求解后计算各视图重投影误差，自动剔除离群视图后重新求解
+        """
+        if incremental and self.objpoints:
+            if len(objpoints) and np.shape(objpoints[0]) != np.shape(self.objpoints[0]):
+                raise ValueError("增量标定的棋盘格规格必须与已有视图一致")
+            all_obj = self.objpoints + list(objpoints)
+            all_left = self.left_imgpoints + list(left_imgpoints)
+            all_right = self.right_imgpoints + list(right_imgpoints)
+            warm_start = self.left_camera_matrix is not None and self.right_camera_matrix is not None
+            # 之前已判为离群的视图不再参与求解
+            previously_rejected = set(self.rejected_views)
+        else:
+            all_obj, all_left, all_right = list(objpoints), list(left_imgpoints), list(right_imgpoints)
+            warm_start = False
+            previously_rejected = set()
+        if len(all_obj) < 4:
+            raise RuntimeError(f"有效图像对不足4对，当前: {len(all_obj)}")
+
+        if warm_start:
+            left_guess = (self.left_camera_matrix.copy(), self.left_distortion.copy())
+            right_guess = (self.right_camera_matrix.copy(), self.right_distortion.copy())
+        else:
+            left_guess = right_guess = None
+
+        # 单目标定，剔除离群视图后重新求解
+        keep = np.array([i for i in range(len(all_obj)) if i not in previously_rejected])
+        for round_index in range(self.outlier_max_rounds + 1):
+            report_progress(progress_callback, "单目标定", round_index + 1, self.outlier_max_rounds + 1)
+            obj = [all_obj[i] for i in keep]
+            left_result, right_result = self._calibrate_pair(
+                obj, [all_left[i] for i in keep], [all_right[i] for i in keep], left_guess, right_guess)
+            errors = np.column_stack([
+                self.compute_per_view_errors(obj, [all_left[i] for i in keep], *left_result[1:]),
+                self.compute_per_view_errors(obj, [all_right[i] for i in keep], *right_result[1:]),
+            ])
+            if round_index == self.outlier_max_rounds:
+                break
+            outliers = self.find_outlier_views(errors.max(axis=1))
+            if len(outliers) == 0 or len(keep) - len(outliers) < 4:
+                break
+            keep = np.delete(keep, outliers)
+            # 下一轮以本轮结果作为初值
+            left_guess = (left_result[1], left_result[2])
+            right_guess = (right_result[1], right_result[2])
+
+        # 双目标定
+        report_progress(progress_callback, "双目标定")
+        flags = cv2.CALIB_FIX_INTRINSIC
+        ret, _, _, _, _, R, T, _, _ = cv2.stereoCalibrate(
+            [all_obj[i] for i in keep], [all_left[i] for i in keep], [all_right[i] for i in keep],
+            left_result[1], left_result[2],
+            right_result[1], right_result[2],
+            self.size, flags=flags)
+
+        # 立体校正
+        report_progress(progress_callback, "立体校正")
+        rectify = self._stereo_rectify(left_result[1], left_result[2], right_result[1], right_result[2], R, T)
+
+        # 全部求解完成后才写入结果，中途取消或出错不会留下不一致的参数
+        self.left_camera_matrix, self.left_distortion = left_result[1], left_result[2]
+        self.right_camera_matrix, self.right_distortion = right_result[1], right_result[2]
+        self.R, self.T = R, T
+        self.R1, self.R2, self.P1, self.P2, self.Q, self.valid_roi1, self.valid_roi2 = rectify
+        self.objpoints, self.left_imgpoints, self.right_imgpoints = all_obj, all_left, all_right
+        self.per_view_errors = np.full((len(all_obj), 2), np.nan)
+        self.per_view_errors[keep] = errors
+        self.rejected_views = sorted(set(range(len(all_obj))) - set(keep.tolist()))
+
+        self.is_calibrated = True
+        self.version = next(_version_counter)
+        return ret
+
+    @property
+    def rectified_size(self):
+        """校正后图像的尺寸 (宽, 高)"""
+        return tuple(self.new_size) if self.new_size else tuple(self.size)
+
+    def _stereo_rectify(self, left_matrix, left_dist, right_matrix, right_dist, R, T):
+        """按当前的alpha和校正后尺寸做立体校正，返回 (R1, R2, P1, P2, Q, 左有效区域, 右有效区域)"""
+        R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
+            left_matrix, left_dist, right_matrix, right_dist, self.size, R, T,
+            alpha=self.rectify_alpha, newImageSize=self.rectified_size)
+        return R1, R2, P1, P2, Q, tuple(int(v) for v in roi1), tuple(int(v) for v in roi2)
+
+    def set_rectification(self, alpha=None, new_size=None):
+        """修改校正的alpha和校正后尺寸并重新计算校正参数（new_size传入原图尺寸即恢复默认）"""
+        if alpha is not None:
+            self.rectify_alpha = alpha
+        if new_size is not None:
+            self.new_size = None if tuple(new_size) == tuple(self.size) else tuple(int(v) for v in new_size)
+        if self.is_calibrated:
+            (self.R1, self.R2, self.P1, self.P2, self.Q,
+             self.valid_roi1, self.valid_roi2) = self._stereo_rectify(
+                self.left_camera_matrix, self.left_distortion, self.right_camera_matrix, self.right_distortion,
+                self.R, self.T)
+            self.version = next(_version_counter)
+
+    def _calibrate_pair(self, objpoints, left_imgpoints, right_imgpoints, left_guess, right_guess):
+        """并行执行左右相机的单目标定（OpenCV求解期间会释放GIL）"""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            left_future = pool.submit(self._calibrate_single, objpoints, left_imgpoints, left_guess)
+            right_future = pool.submit(self._calibrate_single, objpoints, right_imgpoints, right_guess)
+            return left_future.result(), right_future.result()
+
+    def _calibrate_single(self, objpoints, imgpoints, guess):
+        """单目标定，guess为 (内参, 畸变) 时以其为初值"""
+        if guess is None:
+            return cv2.calibrateCamera(objpoints, imgpoints, self.size, None, None)
+        return cv2.calibrateCamera(objpoints, imgpoints, self.size, guess[0].copy(), guess[1].copy(),
+                                   flags=cv2.CALIB_USE_INTRINSIC_GUESS)
+
+    @staticmethod
+    def compute_per_view_errors(objpoints, imgpoints, camera_matrix, distortion, rvecs, tvecs):
+        """向量化计算每个视图的RMS重投影误差（所有视图一次性投影，不逐视图调用projectPoints）"""
+        n = len(objpoints)
+        obj = np.asarray(objpoints, dtype=np.float64).reshape(n, -1, 3)
+        img = np.asarray(imgpoints, dtype=np.float64).reshape(n, -1, 2)
+        rvecs = np.asarray(rvecs, dtype=np.float64).reshape(n, 3)
+        tvecs = np.asarray(tvecs, dtype=np.float64).reshape(n, 1, 3)
+
+        # 批量Rodrigues公式：R = I + sin(θ)K + (1-cos(θ))K²
+        theta = np.linalg.norm(rvecs, axis=1)
+        axis = rvecs / np.where(theta > 1e-12, theta, 1.0)[:, None]
+        K = np.zeros((n, 3, 3))
+        K[:, 0, 1], K[:, 0, 2] = -axis[:, 2], axis[:, 1]
+        K[:, 1, 0], K[:, 1, 2] = axis[:, 2], -axis[:, 0]
+        K[:, 2, 0], K[:, 2, 1] = -axis[:, 1], axis[:, 0]
+        rot = (np.eye(3)[None] + np.sin(theta)[:, None, None] * K
+               + (1 - np.cos(theta))[:, None, None] * (K @ K))
+
+        cam = np.einsum('nij,nmj->nmi', rot, obj) + tvecs
+        x = cam[..., 0] / cam[..., 2]
+        y = cam[..., 1] / cam[..., 2]
+
+        # 畸变模型 (k1, k2, p1, p2, k3)
+        dist = np.zeros(5)
+        d = np.asarray(distortion, dtype=np.float64).ravel()[:5]
+        dist[:len(d)] = d
+        k1, k2, p1, p2, k3 = dist
+        r2 = x * x + y * y
+        radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+        xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+        yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+
+        u = camera_matrix[0, 0] * xd + camera_matrix[0, 1] * yd + camera_matrix[0, 2]
+        v = camera_matrix[1, 1] * yd + camera_matrix[1, 2]
+        sq = (u - img[..., 0]) ** 2 + (v - img[..., 1]) ** 2
+        return np.sqrt(sq.mean(axis=1))
+
+    def evaluate_views(self, objpoints, imgpoints, camera_matrix, distortion):
+        """用给定内参对任意视图求位姿并计算各视图重投影误差（用于评估未参与求解的视图）"""
+        rvecs, tvecs = [], []
+        for obj, img in zip(objpoints, imgpoints):
+            _, rvec, tvec = cv2.solvePnP(obj, img, camera_matrix, distortion)
+            rvecs.append(rvec)
+            tvecs.append(tvec)
+        return self.compute_per_view_errors(objpoints, imgpoints, camera_matrix, distortion, rvecs, tvecs)
+
+    def find_outlier_views(self, errors):
+        """按 中值 + k*MAD 的稳健阈值找出离群视图的下标"""
+        errors = np.asarray(errors)
+        median = np.median(errors)
+        mad = 1.4826 * np.median(np.abs(errors - median))
+        threshold = max(median + self.outlier_mad_factor * mad, self.outlier_min_error)
+        return np.nonzero(errors > threshold)[0]
+
+    def set_manual_parameters(self, left_matrix, left_dist, right_matrix, right_dist, R, T):
+        """设置手动输入的标定参数"""
+        # 参数验证
+        if left_matrix.shape != (3, 3) or right_matrix.shape != (3, 3):
+            raise ValueError("相机矩阵必须是3x3的矩阵")
+        if left_dist.shape != (5,) or right_dist.shape != (5,):
+            raise ValueError("畸变系数必须包含5个元素")
+        if R.shape != (3, 3):
+            raise ValueError("旋转矩阵必须是3x3")
+        if T.shape != (3,):
+            raise ValueError("平移向量必须是3维")
+
+        # 设置参数
+        self.left_camera_matrix = left_matrix
+        self.left_distortion = left_dist
+        self.right_camera_matrix = right_matrix
+        self.right_distortion = right_dist
+        self.R = R
+        self.T = T
+
+        # 计算立体校正参数
+        (self.R1, self.R2, self.P1, self.P2, self.Q,
+         self.valid_roi1, self.valid_roi2) = self._stereo_rectify(
+            self.left_camera_matrix, self.left_distortion,
+            self.right_camera_matrix, self.right_distortion,
+            self.R, self.T
+        )
+        self.is_calibrated = True
+        self.version = next(_version_counter)
+
+    def to_dict(self):
+        """导出标定参数为可JSON序列化的字典"""
+        if not self.is_calibrated:
+            raise RuntimeError("尚未标定，无法导出参数")
+        return {
+            'size': list(self.size),
+            'left_camera_matrix': np.asarray(self.left_camera_matrix).tolist(),
+            'left_distortion': np.asarray(self.left_distortion).ravel().tolist(),
+            'right_camera_matrix': np.asarray(self.right_camera_matrix).tolist(),
+            'right_distortion': np.asarray(self.right_distortion).ravel().tolist(),
+            'R': np.asarray(self.R).tolist(),
+            'T': np.asarray(self.T).ravel().tolist(),
+            'rectify_alpha': self.rectify_alpha,
+            'new_size': list(self.new_size) if self.new_size else None,
+        }
+
+    @classmethod
+    def from_dict(cls, params):
+        """由 to_dict 导出的参数重建标定器"""
+        calibrator = cls()
+        calibrator.size = tuple(params['size'])
+        calibrator.rectify_alpha = params.get('rectify_alpha', -1)
+        calibrator.new_size = tuple(params['new_size']) if params.get('new_size') else None
+        calibrator.set_manual_parameters(
+            np.array(params['left_camera_matrix'], dtype=np.float64),
+            np.array(params['left_distortion'], dtype=np.float64),
+            np.array(params['right_camera_matrix'], dtype=np.float64),
+            np.array(params['right_distortion'], dtype=np.float64),
+            np.array(params['R'], dtype=np.float64),
+            np.array(params['T'], dtype=np.float64))
+        return calibrator
\ No newline at end of file
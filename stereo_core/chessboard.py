@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+"""由粗到精的棋盘格角点检测
+
+先在缩小的金字塔层上用快速检测标志找到棋盘格，再把角点放大回原分辨率，用 cornerSubPix
+只在各角点附近的小窗口内精化，耗时取决于棋盘格大小而不是图像大小；
+最粗一层中方格太小而检测失败时逐层换到更精细的一层（已知方格大小时直接选择合适的层），
+所有层都失败时才退回到 findChessboardCornersSB
+"""
+
+COARSE_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK
+SB_FLAGS = cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_ACCURACY
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def square_size_px(corners, chessboard_size):
+    """棋盘格相邻角点间距的最小值（像素），即图像中最小的方格边长"""
+    grid = corners.reshape(chessboard_size[1], chessboard_size[0], 2)
+    along_rows = np.linalg.norm(np.diff(grid, axis=1), axis=2)
+    along_cols = np.linalg.norm(np.diff(grid, axis=0), axis=2)
+    return float(min(along_rows.min(), along_cols.min()))
+
+
+def orient_corners(corners):
+    """统一角点顺序为首个角点在末尾角点的左上方
+
+    棋盘格旋转180度时检测结果的顺序整体反向，两种检测方法的起点也可能不同，统一后左右图和不同方法的角点一一对应
+    """
+    diagonal = corners[-1, 0] - corners[0, 0]
+    return corners[::-1].copy() if diagonal[0] + diagonal[1] < 0 else corners
+
+
+def find_coarse(gray, chessboard_size, scale):
+    """在按scale缩小的图像上快速检测棋盘格，返回原分辨率坐标的粗角点，未检测到时返回None"""
+    small = gray if scale >= 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    found, corners = cv2.findChessboardCorners(small, chessboard_size, None, COARSE_FLAGS)
+    if not found:
+        return None
+    return corners / scale if scale < 1.0 else corners
+
+
+def refine_corners(gray, corners, chessboard_size):
+    """在原分辨率上用cornerSubPix精化角点
+
+    窗口半径取最小方格边长的0.4倍（3~15像素），既能覆盖放大后粗角点的误差，又不会跨到相邻角点
+    """
+    half = int(np.clip(square_size_px(corners, chessboard_size) * 0.4, 3, 15))
+    return cv2.cornerSubPix(gray, corners.astype(np.float32), (half, half), (-1, -1), SUBPIX_CRITERIA)
+
+
+def coarse_scale(gray, max_coarse_width=640):
+    """粗检测层的缩放比例：按2的幂缩小到宽度不超过max_coarse_width"""
+    scale = 1.0
+    width = gray.shape[1]
+    while width * scale > max_coarse_width:
+        scale /= 2
+    return scale
+
+
+def coarse_scales(gray, max_coarse_width=640, square_px=None, min_square_px=16.0):
+    """依次尝试的粗检测缩放比例
+
+    从宽度不超过max_coarse_width的一层开始，每次放大2倍直到原分辨率；给出图像中方格的大致边长square_px时，
+    先尝试使方格约为min_square_px像素的那一层（FAST_CHECK在方格太小时会漏检）
+    """
+    scale = coarse_scale(gray, max_coarse_width)
+    scales = []
+    while scale < 1.0:
+        scales.append(scale)
+        scale *= 2
+    scales.append(1.0)
+    if square_px:
+        preferred = min((s for s in scales if square_px * s >= min_square_px), default=1.0)
+        scales.remove(preferred)
+        scales.insert(0, preferred)
+    return scales
+
+
+def detect_chessboard(gray, chessboard_size, max_coarse_width=640, use_sb_fallback=True, square_px=None):
+    """检测并精化棋盘格角点，返回 (角点, 方法)，未检测到时角点为None
+
+    方法为 'coarse'（粗检测+亚像素精化）或 'sb'（findChessboardCornersSB）；
+    square_px为图像中方格的大致边长（例如上一张标定图像的检测结果），用于直接选择粗检测层
+    """
+    chessboard_size = tuple(chessboard_size)
+    for scale in coarse_scales(gray, max_coarse_width, square_px):
+        corners = find_coarse(gray, chessboard_size, scale)
+        if corners is not None:
+            return orient_corners(refine_corners(gray, corners, chessboard_size)), 'coarse'
+    if use_sb_fallback:
+        found, corners = cv2.findChessboardCornersSB(gray, chessboard_size, SB_FLAGS)
+        if found:
+            return orient_corners(corners), 'sb'
+    return None, None
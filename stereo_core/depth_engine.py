@@ -0,0 +1,59 @@
+import numpy as np
+
+"""视差到深度的查找表：每套标定预先计算一次，每帧只做一次查表得到uint16毫米深度图"""
+
+# 深度图中0表示无效（无视差或未计算），超出uint16范围的远处点记为最大值
+INVALID_DEPTH = 0
+MAX_DEPTH = 65535
+
+
+class DepthEngine:
+    """由Q矩阵预计算 原始视差(int16, ×16) -> 深度Z(mm) 的查找表
+
+    表按int16的全部65536个取值建立，以uint16视图直接索引，负视差和小于最小视差的值映射为0；
+    X/Y只在需要时对选定像素计算
+    """
+
+    def __init__(self, Q, min_disparity):
+        self.Q = np.asarray(Q, dtype=np.float64)
+        self.min_disparity = min_disparity
+        raw = np.arange(65536, dtype=np.int64)
+        raw[raw >= 32768] -= 65536  # uint16索引对应的int16视差
+        d = raw / 16.0
+        w = self.Q[3, 2] * d + self.Q[3, 3]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = self.Q[2, 3] / w
+        valid = (raw >= min_disparity * 16) & np.isfinite(z) & (z > 0)
+        lut = np.where(valid, np.rint(np.minimum(np.where(valid, z, 0), MAX_DEPTH)), INVALID_DEPTH)
+        self.lut = lut.astype(np.uint16)
+
+    def depth_map(self, disparity, out=None):
+        """原始视差图 -> uint16毫米深度图（每像素一次查表）"""
+        return np.take(self.lut, disparity.view(np.uint16), out=out)
+
+    def points(self, xs, ys, depths):
+        """由像素坐标和深度(mm)计算三维点 (N, 3)，单位mm；深度无效的点为NaN
+
+        Z = Q[2,3] / W，X = (x + Q[0,3]) / W，Y = (y + Q[1,3]) / W
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        z = np.asarray(depths, dtype=np.float64)
+        z = np.where(z == INVALID_DEPTH, np.nan, z)
+        scale = z / self.Q[2, 3]
+        return np.column_stack([(xs + self.Q[0, 3]) * scale, (ys + self.Q[1, 3]) * scale, z])
+
+    def point_at(self, depth_map, x, y):
+        """深度图中单个像素的三维点，无效时返回None"""
+        depth = depth_map[y, x]
+        if depth == INVALID_DEPTH:
+            return None
+        return self.points([x], [y], [depth])[0]
+
+    def valid_points(self, depth_map, max_depth=None):
+        """深度图中全部有效像素（可限制最大深度）的三维点"""
+        mask = depth_map != INVALID_DEPTH
+        if max_depth is not None:
+            mask &= depth_map <= max_depth
+        ys, xs = np.nonzero(mask)
+        return self.points(xs, ys, depth_map[ys, xs])
@@ -0,0 +1,306 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+"""本机深度查询服务：其他进程通过Unix套接字或本机TCP端口查询最新一帧的深度
+
+协议为每行一个JSON对象。请求带可选的id，应答原样带回：
+    {"id": 1, "cmd": "point", "x": 320, "y": 240}            像素处的距离（邻域视差中值）
+    {"id": 2, "cmd": "region", "x": 0, "y": 0, "w": 100, "h": 80}  区域内最近点和中值距离
+    {"id": 3, "cmd": "targets"}                             连续跟踪目标的距离
+    {"id": 4, "cmd": "nearest"}                             整帧（或ROI内）最近障碍
+    {"id": 5, "cmd": "subscribe"} / {"cmd": "unsubscribe"}  订阅/取消每帧最近障碍推送
+应答为 {"id": .., "ok": true, "frame": 帧序号, ...} 或 {"id": .., "ok": false, "error": ..}；
+推送为 {"event": "nearest", "frame": 帧序号, ...}。距离单位为米，坐标单位为毫米。
+"""
+
+
+class DepthSnapshot:
+    """某一帧的只读深度快照，发布后其中的数组不再被修改"""
+
+    def __init__(self, frame_seq, disparity, Q, min_disparity, roi=None, targets=None, timestamp=None):
+        self.frame_seq = frame_seq
+        self.disparity = disparity  # 原始视差（×16），整帧坐标
+        self.Q = Q
+        self.min_disparity = min_disparity
+        self.roi = roi
+        self.targets = targets or []  # [(目标编号, x, y, 距离m或None)]
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._nearest = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_processor(cls, processor, frame_seq, tracker=None):
+        """从处理器最近一帧的视差创建快照（处理器每帧生成新的视差数组，快照直接引用无需复制）"""
+        targets = []
+        if tracker is not None:
+            targets = [(t.target_id, float(t.point[0]), float(t.point[1]), None if t.lost else t.distance)
+                       for t in tracker.targets]
+        return cls(frame_seq, processor.last_disparity, processor.calibrator.Q.copy(),
+                   processor.min_disparity, processor.roi, targets)
+
+    def _to_point(self, x, y, d):
+        X, Y, Z, W = np.array([x, y, d, 1.0]) @ self.Q.T
+        point = [X / W, Y / W, Z / W]
+        return {'x': int(x), 'y': int(y), 'disparity': float(d),
+                'point': [round(float(v), 1) for v in point],
+                'distance': round(float(np.linalg.norm(point)) / 1000, 4)}
+
+    def point(self, x, y, radius=2):
+        """像素邻域内有效视差的中值对应的三维点，无有效视差时返回None"""
+        height, width = self.disparity.shape[:2]
+        if not (0 <= x < width and 0 <= y < height):
+            raise ValueError(f"像素坐标超出图像范围: ({x}, {y})")
+        patch = self.disparity[max(0, y - radius):y + radius + 1, max(0, x - radius):x + radius + 1]
+        valid = patch[patch >= self.min_disparity * 16]
+        if valid.size == 0:
+            return None
+        return self._to_point(x, y, np.median(valid) / 16.0)
+
+    def region(self, x, y, w, h, percentile=99.0):
+        """区域内最近点（视差的高分位数，抑制孤立噪声）、中值距离和有效像素比例"""
+        height, width = self.disparity.shape[:2]
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(width, int(x + w)), min(height, int(y + h))
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("区域为空")
+        patch = self.disparity[y0:y1, x0:x1]
+        mask = patch >= self.min_disparity * 16
+        valid = patch[mask]
+        result = {'region': [x0, y0, x1 - x0, y1 - y0], 'valid_fraction': round(float(mask.mean()), 4)}
+        if valid.size == 0:
+            result.update(nearest=None, median_distance=None)
+            return result
+        d_near = np.percentile(valid, percentile)
+        # 取不超过该分位数的最大视差所在像素作为最近点
+        iy, ix = np.unravel_index(int(np.argmax(np.where(mask & (patch <= d_near), patch, -1))), patch.shape)
+        result['nearest'] = self._to_point(x0 + ix, y0 + iy, patch[iy, ix] / 16.0)
+        # 中值距离按区域中心像素计算
+        center = self._to_point((x0 + x1) // 2, (y0 + y1) // 2, np.median(valid) / 16.0)
+        result['median_distance'] = center['distance']
+        return result
+
+    def nearest(self):
+        """整帧（设置了ROI时为ROI内）的最近障碍，每个快照只计算一次"""
+        with self._lock:
+            if self._nearest is None:
+                height, width = self.disparity.shape[:2]
+                self._nearest = self.region(*(self.roi or (0, 0, width, height)))
+            return self._nearest
+
+    def targets_info(self):
+        return [{'id': tid, 'x': round(x, 1), 'y': round(y, 1),
+                 'distance': None if d is None or np.isnan(d) else round(d, 4)}
+                for tid, x, y, d in self.targets]
+
+
+class _Client:
+    """一个客户端连接：请求按顺序处理，发送经有界队列，推送在队列满时丢弃最旧的一条"""
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.subscribed = False
+        self.dropped = 0
+
+    def push_event(self, message):
+        """推送订阅消息：客户端读取过慢时只保留最新的消息，不阻塞广播"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+
+class DepthQueryServer:
+    """在后台线程的asyncio事件循环中提供深度查询，处理循环只需调用 publish 发布快照"""
+
+    def __init__(self, address="127.0.0.1:8765", max_clients=64, queue_size=16):
+        # address为 "主机:端口" 或 "unix:/路径"
+        self.address = address
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self._snapshot = None
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._frame_event = None
+        self._ready = threading.Event()
+        self._start_error = None
+
+    def start(self):
+        """启动服务线程，监听成功后返回"""
+        self._thread = threading.Thread(target=self._run, name="DepthQueryServer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            raise self._start_error
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2)
+        self._loop = None
+
+    def publish(self, snapshot):
+        """发布新一帧的快照（可在任意线程调用，只替换引用并唤醒推送任务，不等待客户端）"""
+        self._snapshot = snapshot
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._frame_event.set)
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._frame_event = asyncio.Event()
+            if self.address.startswith("unix:"):
+                path = self.address[len("unix:"):]
+                if os.path.exists(path):
+                    os.unlink(path)
+                self._server = loop.run_until_complete(asyncio.start_unix_server(self._handle_client, path))
+            else:
+                host, _, port = self.address.rpartition(":")
+                self._server = loop.run_until_complete(
+                    asyncio.start_server(self._handle_client, host or "127.0.0.1", int(port)))
+                # 端口为0时记录实际分配的端口
+                self.address = "%s:%d" % self._server.sockets[0].getsockname()[:2]
+            broadcaster = loop.create_task(self._broadcast_nearest())
+        except Exception as e:
+            self._start_error = e
+            self._ready.set()
+            loop.close()
+            return
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+            if self.address.startswith("unix:") and os.path.exists(self.address[len("unix:"):]):
+                os.unlink(self.address[len("unix:"):])
+
+    async def _broadcast_nearest(self):
+        """每帧向订阅者推送最近障碍；计算跟不上帧率时跳过中间帧"""
+        loop = asyncio.get_running_loop()
+        last_seq = None
+        while True:
+            await self._frame_event.wait()
+            self._frame_event.clear()
+            snapshot = self._snapshot
+            subscribers = [c for c in self._clients if c.subscribed]
+            if snapshot is None or not subscribers or snapshot.frame_seq == last_seq:
+                continue
+            last_seq = snapshot.frame_seq
+            try:
+                nearest = await loop.run_in_executor(None, snapshot.nearest)
+            except Exception as e:
+                print(f"计算最近障碍时出错: {str(e)}")
+                continue
+            message = {'event': 'nearest', 'frame': snapshot.frame_seq, 'timestamp': snapshot.timestamp}
+            message.update(nearest)
+            for client in subscribers:
+                client.push_event(message)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            await self._serve_client(reader, writer)
+        except asyncio.CancelledError:
+            # 服务停止时连接任务被取消，正常结束即可
+            writer.close()
+
+    async def _serve_client(self, reader, writer):
+        if len(self._clients) >= self.max_clients:
+            writer.write(b'{"ok": false, "error": "too many clients"}\n')
+            await writer.drain()
+            writer.close()
+            return
+        client = _Client(writer, self.queue_size)
+        self._clients.add(client)
+        sender = asyncio.get_running_loop().create_task(self._send_loop(client))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await client.queue.put({'ok': False, 'error': 'request too long'})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # 发送队列满时在此等待，客户端不读取应答就不会继续处理其请求
+                await client.queue.put(await self._answer(client, line))
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(client)
+            # 发完已排队的应答再断开，客户端不再读取时直接放弃
+            try:
+                client.queue.put_nowait(None)
+                await asyncio.wait_for(sender, timeout=1.0)
+            except (asyncio.QueueFull, asyncio.TimeoutError, ConnectionError):
+                sender.cancel()
+            writer.close()
+
+    async def _send_loop(self, client):
+        while True:
+            message = await client.queue.get()
+            if message is None:
+                return
+            if message.get('event') and client.dropped:
+                message = dict(message, dropped=client.dropped)
+            client.writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+            await client.writer.drain()
+
+    async def _answer(self, client, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            cmd = request.get('cmd')
+            if cmd == 'subscribe':
+                client.subscribed = True
+                return {'id': request_id, 'ok': True}
+            if cmd == 'unsubscribe':
+                client.subscribed = False
+                return {'id': request_id, 'ok': True}
+
+            snapshot = self._snapshot
+            if snapshot is None:
+                raise RuntimeError("尚无深度数据")
+            response = {'id': request_id, 'ok': True, 'frame': snapshot.frame_seq, 'timestamp': snapshot.timestamp}
+            if cmd == 'point':
+                response['result'] = snapshot.point(int(request['x']), int(request['y']),
+                                                    int(request.get('radius', 2)))
+            elif cmd == 'region':
+                response['result'] = await asyncio.get_running_loop().run_in_executor(
+                    None, snapshot.region, request['x'], request['y'], request['w'], request['h'])
+            elif cmd == 'nearest':
+                response['result'] = await asyncio.get_running_loop().run_in_executor(None, snapshot.nearest)
+            elif cmd == 'targets':
+                response['result'] = snapshot.targets_info()
+            else:
+                raise ValueError(f"未知命令: {cmd}")
+            return response
+        except (KeyError, TypeError) as e:
+            return {'id': request_id, 'ok': False, 'error': f"请求参数错误: {str(e)}"}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
@@ -0,0 +1,145 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+"""多进程共享内存帧环形缓冲区：单个写进程，任意多个读进程，写满时覆盖最旧的帧
+
+每个槽位保存一组同尺寸的数组（字段）以及序号、标签和时间戳。序号从1开始递增，
+写入时先把槽位序号置为负数，写完再置为新序号；读取前后各检查一次序号，
+期间被覆盖的帧视为已丢失，因此读者不会拿到写了一半的数据。
+"""
+
+_ALIGN = 64
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SharedFrameRing:
+    def __init__(self, fields, slots, shm, owner):
+        # fields: {字段名: (形状, 数据类型)}
+        self.fields = {name: (tuple(shape), np.dtype(dtype).str) for name, (shape, dtype) in fields.items()}
+        self.slots = slots
+        self._shm = shm
+        self._owner = owner
+        buf = shm.buf
+        # 头部：[最新序号, 各槽位序号..., 各槽位标签...]
+        self._header = np.ndarray((1 + 2 * slots,), dtype=np.int64, buffer=buf)
+        self._slot_seq = self._header[1:1 + slots]
+        self._slot_tag = self._header[1 + slots:]
+        offset = _aligned(self._header.nbytes)
+        self._timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset = _aligned(offset + self._timestamps.nbytes)
+        self._arrays = {}
+        for name, (shape, dtype) in self.fields.items():
+            arr = np.ndarray((slots,) + shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+            self._arrays[name] = arr
+            offset = _aligned(offset + arr.nbytes)
+
+    @staticmethod
+    def required_size(fields, slots):
+        size = _aligned(8 * (1 + 2 * slots)) + _aligned(8 * slots)
+        for shape, dtype in fields.values():
+            size += _aligned(int(np.prod(shape)) * np.dtype(dtype).itemsize * slots)
+        return size
+
+    @classmethod
+    def create(cls, fields, slots=4):
+        """新建缓冲区（由负责释放的进程调用）"""
+        if slots < 2:
+            raise ValueError("环形缓冲区至少需要2个槽位")
+        shm = shared_memory.SharedMemory(create=True, size=cls.required_size(fields, slots))
+        ring = cls(fields, slots, shm, owner=True)
+        ring._header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, descriptor):
+        """在其他进程中连接已有的缓冲区"""
+        shm = shared_memory.SharedMemory(name=descriptor['name'])
+        return cls(descriptor['fields'], descriptor['slots'], shm, owner=False)
+
+    def descriptor(self):
+        """可跨进程传递的描述"""
+        return {'name': self._shm.name, 'fields': self.fields, 'slots': self.slots}
+
+    def latest_seq(self):
+        """最近写完的帧序号，尚未写入时为0"""
+        return int(self._header[0])
+
+    def begin_write(self):
+        """占用下一个槽位，返回 (序号, {字段名: 槽位数组视图})，可直接写入视图避免额外复制"""
+        seq = self.latest_seq() + 1
+        slot = seq % self.slots
+        self._slot_seq[slot] = -seq
+        return seq, {name: arr[slot] for name, arr in self._arrays.items()}
+
+    def commit(self, seq, tag=0, timestamp=None):
+        """完成写入，使该帧对读者可见"""
+        slot = seq % self.slots
+        self._slot_tag[slot] = tag
+        self._timestamps[slot] = time.time() if timestamp is None else timestamp
+        self._slot_seq[slot] = seq
+        self._header[0] = seq
+
+    def write(self, tag=0, timestamp=None, **arrays):
+        """复制写入一帧，返回序号（缓冲区满时覆盖最旧的帧）"""
+        seq, views = self.begin_write()
+        for name, value in arrays.items():
+            views[name][...] = value
+        self.commit(seq, tag, timestamp)
+        return seq
+
+    def is_current(self, seq):
+        """序号为seq的帧是否仍完整保存在缓冲区中"""
+        return seq > 0 and self._slot_seq[seq % self.slots] == seq
+
+    def view(self, seq):
+        """不复制地访问一帧，返回 {字段名: 视图}；使用完毕后应以 is_current 确认期间未被覆盖"""
+        if not self.is_current(seq):
+            return None
+        slot = seq % self.slots
+        return {name: arr[slot] for name, arr in self._arrays.items()}
+
+    def read(self, seq=None, out=None):
+        """复制读取一帧（seq为None时读取最新帧）
+
+        out为 {字段名: 数组} 时复制到这些可复用的数组中；
+        返回 (序号, 标签, 时间戳, 数组字典)，帧不存在或读取期间被覆盖时返回None
+        """
+        if seq is None:
+            seq = self.latest_seq()
+        if not self.is_current(seq):
+            return None
+        slot = seq % self.slots
+        tag = int(self._slot_tag[slot])
+        timestamp = float(self._timestamps[slot])
+        if out is None:
+            out = {name: arr[slot].copy() for name, arr in self._arrays.items()}
+        else:
+            for name, arr in self._arrays.items():
+                np.copyto(out[name], arr[slot])
+        if not self.is_current(seq):
+            return None
+        return seq, tag, timestamp, out
+
+    def wait_for_new(self, last_seq, timeout=None, poll_interval=0.001):
+        """等待序号大于last_seq的帧，返回最新序号，超时返回None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seq = self.latest_seq()
+            if seq > last_seq:
+                return seq
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        """断开连接；创建者同时释放共享内存"""
+        self._header = self._slot_seq = self._slot_tag = self._timestamps = None
+        self._arrays = {}
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
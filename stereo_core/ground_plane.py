@@ -0,0 +1,169 @@
+import time
+
+import numpy as np
+
+from stereo_core.depth_engine import INVALID_DEPTH
+
+"""地面平面估计：由深度图估计地面，得到每个像素离地高度和障碍掩码
+
+在按step抽样的三维点上做向量化RANSAC（一次生成全部假设，一次矩阵运算给所有假设计数内点），
+上一帧的平面有效时只在其附近的点中采样少量假设（warm start），失败时才退回完整搜索。
+相机坐标系中Y轴向下，平面法向朝上，高度 = n·P + d（mm），地面以上为正
+"""
+
+UP = np.array([0.0, -1.0, 0.0])
+
+
+class GroundPlaneEstimator:
+    """逐帧估计地面平面
+
+    step: 抽样间隔（像素）；max_depth: 只使用该深度（mm）以内的点；inlier_threshold: 内点到平面的距离（mm）；
+    iterations/warm_iterations: 完整搜索和warm start时的假设数；max_tilt: 法向与竖直方向的最大夹角（度），
+    排除墙面等竖直平面；min_inlier_ratio: 内点比例低于该值时认为没有找到地面
+    """
+
+    def __init__(self, processor, step=8, max_depth=15000, inlier_threshold=40.0, iterations=200,
+                 warm_iterations=16, max_tilt=40.0, min_inlier_ratio=0.2, seed=None):
+        self.processor = processor
+        self.step = step
+        self.max_depth = max_depth
+        self.inlier_threshold = inlier_threshold
+        self.iterations = iterations
+        self.warm_iterations = warm_iterations
+        self.min_cos = np.cos(np.radians(max_tilt))
+        self.min_inlier_ratio = min_inlier_ratio
+        self.rng = np.random.default_rng(seed)
+        self.plane = None  # (单位法向 n, d)
+        self.inlier_ratio = 0.0
+        self.warm = False
+        self.elapsed_ms = 0.0
+
+    def reset(self):
+        self.plane = None
+        self.inlier_ratio = 0.0
+
+    def sample_points(self, depth_map):
+        """按step抽样深度图中的有效像素，返回三维点 (N, 3) mm"""
+        engine = self.processor.get_depth_engine()
+        sub = depth_map[::self.step, ::self.step]
+        mask = (sub != INVALID_DEPTH) & (sub <= self.max_depth)
+        ys, xs = np.nonzero(mask)
+        return engine.points(xs * self.step, ys * self.step, sub[ys, xs])
+
+    def _hypotheses(self, points, count):
+        """由随机三点组生成count个候选平面，返回满足倾角约束的 (法向 (K, 3), d (K,))"""
+        idx = self.rng.integers(0, len(points), size=(count, 3))
+        a, b, c = points[idx[:, 0]], points[idx[:, 1]], points[idx[:, 2]]
+        normals = np.cross(b - a, c - a)
+        norms = np.linalg.norm(normals, axis=1)
+        keep = norms > 1e-6
+        normals = normals[keep] / norms[keep, None]
+        # 法向统一朝上
+        normals *= np.where(normals @ UP < 0, -1.0, 1.0)[:, None]
+        d = -np.einsum('ij,ij->i', normals, a[keep])
+        # 接近水平且相机在平面上方
+        keep = (normals @ UP >= self.min_cos) & (d > 0)
+        return normals[keep], d[keep]
+
+    def _best(self, points, normals, d):
+        """内点最多的候选平面及其内点掩码"""
+        counts = (np.abs(points @ normals.T + d) < self.inlier_threshold).sum(axis=0)
+        best = int(np.argmax(counts))
+        return normals[best], d[best], np.abs(points @ normals[best] + d[best]) < self.inlier_threshold
+
+    @staticmethod
+    def fit(points):
+        """最小二乘拟合平面（SVD），法向朝上"""
+        centroid = points.mean(axis=0)
+        normal = np.linalg.svd(points - centroid, full_matrices=False)[2][-1]
+        if normal @ UP < 0:
+            normal = -normal
+        return normal, -float(normal @ centroid)
+
+    def update(self, depth_map):
+        """用当前帧深度图更新地面平面，返回 (n, d)，没有找到地面时返回None"""
+        start = time.perf_counter()
+        points = self.sample_points(depth_map)
+        self.warm = False
+        result = None
+        if len(points) >= 3:
+            if self.plane is not None:
+                result = self._search(points, self.plane, self.warm_iterations)
+                self.warm = result is not None
+            if result is None:
+                result = self._search(points, None, self.iterations)
+        if result is None:
+            self.plane = None
+            self.inlier_ratio = 0.0
+        else:
+            self.plane, self.inlier_ratio = result
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+        return self.plane
+
+    def _search(self, points, previous, iterations):
+        """RANSAC搜索；previous不为None时只在其附近的点中采样，并把它本身作为一个候选"""
+        pool = points
+        if previous is not None:
+            near = np.abs(points @ previous[0] + previous[1]) < self.inlier_threshold * 3
+            if near.sum() < max(3, self.min_inlier_ratio * len(points)):
+                return None
+            pool = points[near]
+        normals, d = self._hypotheses(pool, iterations)
+        if previous is not None:
+            normals = np.vstack([normals, previous[0]])
+            d = np.append(d, previous[1])
+        if len(normals) == 0:
+            return None
+        normal, offset, inliers = self._best(points, normals, d)
+        if inliers.sum() < max(3, self.min_inlier_ratio * len(points)):
+            return None
+        # 用全部内点精化，再按精化后的平面统计内点比例
+        normal, offset = self.fit(points[inliers])
+        if normal @ UP < self.min_cos or offset <= 0:
+            return None
+        ratio = float(np.mean(np.abs(points @ normal + offset) < self.inlier_threshold))
+        return (normal, offset), ratio
+
+    def height_map(self, depth_map):
+        """每个像素离地高度（mm，float32），无效像素或没有地面时为NaN
+
+        height = Z * (n0 * (x + Q03) / Q23 + n1 * (y + Q13) / Q23 + n2) + d，按行列预先计算系数
+        """
+        height, width = depth_map.shape
+        if self.plane is None:
+            return np.full((height, width), np.nan, dtype=np.float32)
+        (n0, n1, n2), d = self.plane
+        Q = self.processor.get_depth_engine().Q
+        col = (n0 * (np.arange(width) + Q[0, 3]) / Q[2, 3]).astype(np.float32)
+        row = (n1 * (np.arange(height) + Q[1, 3]) / Q[2, 3] + n2).astype(np.float32)
+        heights = depth_map.astype(np.float32)
+        heights *= col[None, :] + row[:, None]
+        heights += np.float32(d)
+        heights[depth_map == INVALID_DEPTH] = np.nan
+        return heights
+
+    def height_of(self, point):
+        """三维点 (mm) 离地高度（mm），没有地面时返回None"""
+        if self.plane is None or point is None:
+            return None
+        return float(np.asarray(point) @ self.plane[0] + self.plane[1])
+
+    def height_at(self, x, y, depth_map):
+        """单个像素离地高度（mm），无效时返回None"""
+        if self.plane is None or depth_map[y, x] == INVALID_DEPTH:
+            return None
+        return self.height_of(self.processor.get_depth_engine().point_at(depth_map, x, y))
+
+    def obstacle_mask(self, depth_map, min_height=100.0, max_height=2500.0, heights=None):
+        """离地高度在 (min_height, max_height) mm 之间的像素，即地面上的障碍物"""
+        if heights is None:
+            heights = self.height_map(depth_map)
+        with np.errstate(invalid='ignore'):
+            return (heights > min_height) & (heights < max_height)
+
+    def describe(self):
+        if self.plane is None:
+            return "未找到地面"
+        tilt = np.degrees(np.arccos(np.clip(self.plane[0] @ UP, -1.0, 1.0)))
+        return (f"相机离地 {self.plane[1] / 1000:.2f} m，倾角 {tilt:.1f}°，内点 {self.inlier_ratio:.0%}，"
+                f"{'跟踪' if self.warm else '搜索'} {self.elapsed_ms:.1f} ms")
@@ -0,0 +1,283 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from stereo_core.camera_calibrator import CameraCalibrator
+from stereo_core.stereo_vision_processor import StereoVisionProcessor
+
+"""多路双目视频并发处理：每套相机的校正映射表只在共享内存中存放一份，由各工作进程只读共享
+
+命令行用法：
+    python -m stereo_core.multi_stream --stream cam1.avi 配置A --stream cam2.avi 配置B --frames 300
+"""
+
+
+class SharedRectification:
+    """一套标定参数及其校正映射表（左map1, 左map2, 右map1, 右map2）"""
+
+    def __init__(self, params, blocks, shms):
+        self.params = params
+        self.blocks = blocks  # [(共享内存名称, 形状, 数据类型)]
+        self._shms = shms
+        self.arrays = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+                       for shm, (_, shape, dtype) in zip(shms, blocks)]
+
+    @classmethod
+    def create(cls, calibrator):
+        """计算映射表并复制到新建的共享内存中（由主进程调用一次）"""
+        left_map, right_map = StereoVisionProcessor._build_rectify_maps(calibrator)
+        shms, blocks = [], []
+        for arr in (left_map[0], left_map[1], right_map[0], right_map[1]):
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            shms.append(shm)
+            blocks.append((shm.name, arr.shape, arr.dtype.str))
+        return cls(calibrator.to_dict(), blocks, shms)
+
+    @classmethod
+    def attach(cls, descriptor):
+        """在工作进程中按描述连接已有的共享内存，不复制数据"""
+        shms = []
+        for name, _, _ in descriptor['blocks']:
+            # 工作进程与主进程共用资源跟踪器，共享内存统一由主进程释放
+            shms.append(shared_memory.SharedMemory(name=name))
+        return cls(descriptor['params'], descriptor['blocks'], shms)
+
+    def descriptor(self):
+        """可跨进程传递的描述（只含名称、形状和参数）"""
+        return {'params': self.params, 'blocks': self.blocks}
+
+    @property
+    def maps(self):
+        left_map1, left_map2, right_map1, right_map2 = self.arrays
+        return (left_map1, left_map2), (right_map1, right_map2)
+
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self.arrays)
+
+    def close(self, unlink=False):
+        self.arrays = []
+        for shm in self._shms:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        self._shms = []
+
+
+class _StreamState:
+    """工作进程中一路视频的处理状态"""
+
+    def __init__(self, stream_id, source, processor, max_frames):
+        self.stream_id = stream_id
+        self.source = source
+        self.processor = processor
+        self.capture = cv2.VideoCapture(source)
+        self.max_frames = max_frames
+        self.frames = 0
+        self.errors = 0
+        self.decode_time = 0.0
+        self.process_time = 0.0
+        self.start = time.perf_counter()
+        self.end = None
+        self.done = not self.capture.isOpened()
+
+    def read(self):
+        """读取下一帧；指定了帧数上限时视频结束后从头循环"""
+        ret, frame = self.capture.read()
+        if not ret and self.max_frames and self.frames > 0:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def finish(self):
+        self.done = True
+        self.end = time.perf_counter()
+        self.capture.release()
+
+    def stats(self):
+        elapsed = (self.end or time.perf_counter()) - self.start
+        return {
+            'stream_id': self.stream_id,
+            'source': self.source,
+            'frames': self.frames,
+            'errors': self.errors,
+            'elapsed': elapsed,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'decode_ms': self.decode_time / max(self.frames, 1) * 1000,
+            'process_ms': self.process_time / max(self.frames, 1) * 1000,
+        }
+
+
+def _run_worker(assignments, rig_descriptors, mode, max_frames, cv_threads, result_queue):
+    """工作进程：轮流从分配到的各路视频读取一帧并处理，结束后回报各路统计"""
+    cv2.setNumThreads(cv_threads)
+    rigs = {name: SharedRectification.attach(desc) for name, desc in rig_descriptors.items()}
+    streams = []
+    try:
+        for stream_id, source, rig_name in assignments:
+            rig = rigs[rig_name]
+            processor = StereoVisionProcessor()
+            processor.calibrator = CameraCalibrator.from_dict(rig.params)
+            processor.install_rectify_maps(processor.calibrator, rig.maps)
+            streams.append(_StreamState(stream_id, source, processor, max_frames))
+
+        process = 'process_frame_sparse' if mode == 'sparse' else 'process_frame'
+        while not all(s.done for s in streams):
+            for s in streams:
+                if s.done:
+                    continue
+                t0 = time.perf_counter()
+                frame = s.read()
+                t1 = time.perf_counter()
+                s.decode_time += t1 - t0
+                if frame is None:
+                    s.finish()
+                    continue
+                try:
+                    getattr(s.processor, process)(frame)
+                except Exception:
+                    s.errors += 1
+                s.process_time += time.perf_counter() - t1
+                s.frames += 1
+                if max_frames and s.frames >= max_frames:
+                    s.finish()
+    finally:
+        for s in streams:
+            if not s.done:
+                s.finish()
+            result_queue.put(s.stats())
+        for rig in rigs.values():
+            rig.close()
+
+
+class MultiStreamRunner:
+    """多路并发处理：工作进程数不超过CPU核数，多于进程数的视频在进程内轮流处理"""
+
+    def __init__(self, workers=None, mode='dense', max_frames=None, cv_threads=1):
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.max_frames = max_frames
+        # 每个进程内OpenCV使用的线程数，多进程并行时设为1避免线程过度竞争
+        self.cv_threads = cv_threads
+        self.streams = []  # (视频源, 相机名称)
+        self._rigs = {}
+
+    def add_rig(self, name, calibrator):
+        """登记一套相机的标定参数，校正映射表放入共享内存"""
+        if not calibrator.is_calibrated:
+            raise ValueError(f"相机 {name} 尚未标定")
+        if name in self._rigs:
+            self._rigs.pop(name).close(unlink=True)
+        self._rigs[name] = SharedRectification.create(calibrator)
+
+    def add_stream(self, source, rig_name):
+        if rig_name not in self._rigs:
+            raise KeyError(f"未登记的相机: {rig_name}")
+        self.streams.append((source, rig_name))
+
+    def run(self, timeout=None):
+        """启动工作进程并等待全部视频处理完成，返回统计报告"""
+        if not self.streams:
+            raise ValueError("没有需要处理的视频")
+        worker_count = min(self.workers, len(self.streams))
+        assignments = [[] for _ in range(worker_count)]
+        for stream_id, (source, rig_name) in enumerate(self.streams):
+            assignments[stream_id % worker_count].append((stream_id, source, rig_name))
+
+        # 使用spawn启动，避免fork继承OpenCV内部线程状态
+        ctx = mp.get_context('spawn')
+        result_queue = ctx.Queue()
+        descriptors = {name: rig.descriptor() for name, rig in self._rigs.items()}
+        start = time.perf_counter()
+        processes = [ctx.Process(target=_run_worker,
+                                 args=(streams, descriptors, self.mode, self.max_frames,
+                                       self.cv_threads, result_queue),
+                                 daemon=True)
+                     for streams in assignments]
+        for p in processes:
+            p.start()
+
+        results = []
+        deadline = None if timeout is None else start + timeout
+        while len(results) < len(self.streams):
+            try:
+                results.append(result_queue.get(timeout=0.5))
+            except queue.Empty:
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                if not any(p.is_alive() for p in processes) and result_queue.empty():
+                    break
+        for p in processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        elapsed = time.perf_counter() - start
+
+        results.sort(key=lambda r: r['stream_id'])
+        total_frames = sum(r['frames'] for r in results)
+        return {
+            'workers': worker_count,
+            'streams': results,
+            'missing_streams': len(self.streams) - len(results),
+            'elapsed': elapsed,
+            'total_frames': total_frames,
+            'aggregate_fps': total_frames / elapsed if elapsed > 0 else 0.0,
+            'shared_map_bytes': sum(rig.nbytes for rig in self._rigs.values()),
+        }
+
+    def close(self):
+        """释放共享内存"""
+        for rig in self._rigs.values():
+            rig.close(unlink=True)
+        self._rigs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def format_report(report):
+    lines = [f"工作进程: {report['workers']}, 共享映射表: {report['shared_map_bytes'] / 1e6:.1f} MB"]
+    for r in report['streams']:
+        lines.append(f"  #{r['stream_id']} {r['source']}: {r['frames']} 帧, {r['fps']:.1f} fps, "
+                     f"解码 {r['decode_ms']:.1f} ms/帧, 处理 {r['process_ms']:.1f} ms/帧, 错误 {r['errors']}")
+    if report['missing_streams']:
+        lines.append(f"  {report['missing_streams']} 路视频未返回结果")
+    lines.append(f"合计: {report['total_frames']} 帧 / {report['elapsed']:.2f} s = {report['aggregate_fps']:.1f} fps")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from stereo_core.calibration_profiles import CalibrationProfileStore, DEFAULT_PROFILE_PATH
+
+    parser = argparse.ArgumentParser(description="多路双目视频并发处理")
+    parser.add_argument("--stream", nargs=2, action="append", required=True, metavar=("VIDEO", "PROFILE"),
+                        help="视频文件（左右并排）及其标定配置名称，可重复指定")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE_PATH, help="标定配置文件")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认等于CPU核数")
+    parser.add_argument("--frames", type=int, default=None, help="每路处理的帧数，视频不足时循环播放")
+    parser.add_argument("--mode", choices=("dense", "sparse"), default="dense")
+    args = parser.parse_args(argv)
+
+    store = CalibrationProfileStore(args.profiles)
+    with MultiStreamRunner(args.workers, args.mode, args.frames) as runner:
+        for profile in sorted({profile for _, profile in args.stream}):
+            runner.add_rig(profile, store.get(profile))
+        for source, profile in args.stream:
+            runner.add_stream(source, profile)
+        print(format_report(runner.run()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+"""障碍区域：图像上的矩形区域，每帧统计区域内最近的有效深度，距离低于阈值时报警"""
+
+
+class ObstacleZone:
+    """单个区域的配置和报警状态
+
+    距离低于threshold进入报警，高于threshold + hysteresis才解除，避免在阈值附近反复切换
+    """
+
+    def __init__(self, name, rect, threshold, hysteresis=0.1, min_pixels=20):
+        self.name = name
+        self.rect = tuple(int(v) for v in rect)  # (x, y, w, h)
+        self.threshold = threshold  # 米
+        self.hysteresis = hysteresis  # 米
+        # 至少有min_pixels个像素不远于该距离才认为是障碍，抑制孤立的错误匹配
+        self.min_pixels = min_pixels
+        self.alert = False
+        self.distance = None  # 最近一帧的最近深度（米），无有效像素时为None
+        self.valid_fraction = 0.0
+
+    def update_state(self):
+        """按最新距离更新报警状态，状态变化时返回 'enter' 或 'leave'，否则返回None"""
+        if self.distance is None:
+            # 没有有效深度时无法判断，保持原状态
+            return None
+        if not self.alert and self.distance < self.threshold:
+            self.alert = True
+            return 'enter'
+        if self.alert and self.distance > self.threshold + self.hysteresis:
+            self.alert = False
+            return 'leave'
+        return None
+
+
+def measure_zones(zones, disparity, Q, min_disparity):
+    """对全部区域统计最近有效深度和有效像素比例
+
+    视差只与有效阈值比较一次得到掩码，各区域在掩码视差的切片上求第min_pixels大的视差，
+    再用Q矩阵把这一个视差值换算为深度，不需要对整幅图做三维重投影
+    """
+    invalid = min_disparity * 16
+    masked = np.where(disparity >= invalid, disparity, -1).astype(np.int16, copy=False)
+    # 有效像素计数用积分图，任意矩形O(1)求和
+    counts = cv2.integral((masked >= 0).view(np.uint8))
+    height, width = disparity.shape[:2]
+    for zone in zones:
+        x, y, w, h = zone.rect
+        x0, y0 = min(max(x, 0), width), min(max(y, 0), height)
+        x1, y1 = min(max(x + w, 0), width), min(max(y + h, 0), height)
+        area = (x1 - x0) * (y1 - y0)
+        if area == 0:
+            zone.distance, zone.valid_fraction = None, 0.0
+            continue
+        valid = int(counts[y1, x1] - counts[y0, x1] - counts[y1, x0] + counts[y0, x0])
+        zone.valid_fraction = valid / area
+        if valid < zone.min_pixels:
+            zone.distance = None
+            continue
+        patch = masked[y0:y1, x0:x1].ravel()
+        d = np.partition(patch, patch.size - zone.min_pixels)[patch.size - zone.min_pixels] / 16.0
+        # 深度 Z = Q[2,3] / (Q[3,2] * d + Q[3,3])
+        zone.distance = float(Q[2, 3] / (Q[3, 2] * d + Q[3, 3])) / 1000
+
+
+def draw_zones(img, zones):
+    """在图像上绘制区域框、距离和报警状态"""
+    for zone in zones:
+        x, y, w, h = zone.rect
+        color = (255, 0, 0) if zone.alert else (0, 255, 0)
+        cv2.rectangle(img, (x, y), (x + w - 1, y + h - 1), color, 3 if zone.alert else 1)
+        text = f"{zone.name}: " + ("--" if zone.distance is None else f"{zone.distance:.2f}m")
+        cv2.putText(img, text, (x + 3, max(y - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+    return img
@@ -0,0 +1,165 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+"""多目标连续测距跟踪"""
+
+# 各跟踪目标在画面和曲线图中的颜色（BGR）
+TRACK_COLORS = [(0, 0, 255), (0, 200, 0), (255, 128, 0), (255, 0, 255),
+                (0, 200, 255), (255, 255, 0), (128, 0, 255), (0, 128, 255)]
+
+
+class TrackedTarget:
+    """单个跟踪目标：当前位置和有界的距离时间序列"""
+
+    def __init__(self, target_id, x, y, history_size):
+        self.target_id = target_id
+        self.point = np.array([x, y], dtype=np.float32)
+        self.history = deque(maxlen=history_size)  # (时间戳, 距离m)
+        self.point_3d = None
+        self.lost = False
+
+    @property
+    def color(self):
+        return TRACK_COLORS[(self.target_id - 1) % len(TRACK_COLORS)]
+
+    @property
+    def distance(self):
+        """最近一次有效的距离（米），没有时返回None"""
+        for _, d in reversed(self.history):
+            if not np.isnan(d):
+                return d
+        return None
+
+
+class PointTracker:
+    """在校正后的左图上用稀疏光流跟踪多个点，并每帧从局部视差读取距离"""
+
+    def __init__(self, processor, history_size=300, window_radius=2):
+        self.processor = processor
+        self.history_size = history_size
+        self.window_radius = window_radius
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.targets = []
+        self._next_id = 1
+        self._prev_gray = None
+
+    def add_target(self, x, y, gray=None, disparity=None, timestamp=None):
+        """添加跟踪目标；gray为当前帧校正左图，给出视差图时立即记录一次距离"""
+        if gray is not None:
+            self._prev_gray = gray
+        target = TrackedTarget(self._next_id, x, y, self.history_size)
+        self._next_id += 1
+        self.targets.append(target)
+        if disparity is not None:
+            self._measure([target], disparity, timestamp)
+        return target
+
+    def clear(self):
+        self.targets = []
+        self._next_id = 1
+
+    def active_targets(self):
+        return [t for t in self.targets if not t.lost]
+
+    def update(self, gray, disparity=None, timestamp=None):
+        """用新一帧的校正左图更新所有目标位置；disparity为None时只跟踪不测距"""
+        prev_gray, self._prev_gray = self._prev_gray, gray
+        active = self.active_targets()
+        if prev_gray is None or not active or prev_gray.shape != gray.shape:
+            return
+
+        # 所有目标一次调用完成光流计算，目标数增加几乎不增加开销
+        prev_pts = np.array([t.point for t in active], dtype=np.float32).reshape(-1, 1, 2)
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, prev_pts, None, **self.lk_params)
+        height, width = gray.shape[:2]
+        for target, pt, ok in zip(active, next_pts.reshape(-1, 2), status.ravel()):
+            if not ok or not (0 <= pt[0] < width and 0 <= pt[1] < height):
+                target.lost = True
+            else:
+                target.point = pt
+
+        if disparity is not None:
+            self._measure(self.active_targets(), disparity, timestamp)
+
+    def _measure(self, targets, disparity, timestamp):
+        """取每个目标邻域内有效视差的中值，转换为三维坐标和距离"""
+        if not targets:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        r = self.window_radius
+        height, width = disparity.shape[:2]
+        invalid = self.processor.min_disparity * 16
+        xs, ys, ds = [], [], []
+        for target in targets:
+            x, y = int(round(target.point[0])), int(round(target.point[1]))
+            patch = disparity[max(0, y - r):min(height, y + r + 1), max(0, x - r):min(width, x + r + 1)]
+            valid = patch[patch >= invalid]
+            xs.append(x)
+            ys.append(y)
+            ds.append(np.median(valid) / 16.0 if valid.size else np.nan)
+
+        points = self.processor.disparity_to_points(xs, ys, ds)
+        for target, point in zip(targets, points):
+            if np.isnan(point[2]):
+                target.point_3d = None
+                target.history.append((timestamp, np.nan))
+            else:
+                target.point_3d = point
+                target.history.append((timestamp, float(np.linalg.norm(point)) / 1000))
+
+    def draw_targets(self, img):
+        """在图像上标出各目标位置和编号"""
+        for target in self.active_targets():
+            x, y = int(target.point[0]), int(target.point[1])
+            cv2.circle(img, (x, y), 6, target.color, 2)
+            cv2.putText(img, f"T{target.target_id}", (x + 8, y - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, target.color, 1, cv2.LINE_AA)
+        return img
+
+    def render_plot(self, width=640, height=160, span=10.0):
+        """绘制最近span秒内各目标的距离曲线（BGR图像）"""
+        img = np.full((height, width, 3), 248, dtype=np.uint8)
+        left, right, top, bottom = 50, 10, 10, 20
+        cv2.rectangle(img, (left, top), (width - right, height - bottom), (180, 180, 180), 1)
+
+        series = []
+        for target in self.targets:
+            if target.history:
+                data = np.array(target.history, dtype=np.float64)
+                series.append((target, data))
+        if not series:
+            return img
+
+        t_end = max(data[-1, 0] for _, data in series)
+        t_start = t_end - span
+        values = np.concatenate([data[data[:, 0] >= t_start, 1] for _, data in series])
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return img
+        d_min, d_max = float(values.min()), float(values.max())
+        if d_max - d_min < 0.1:
+            d_min, d_max = d_min - 0.05, d_max + 0.05
+
+        plot_w = width - left - right
+        plot_h = height - top - bottom
+        cv2.putText(img, f"{d_max:.2f}m", (2, top + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (80, 80, 80), 1)
+        cv2.putText(img, f"{d_min:.2f}m", (2, height - bottom), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (80, 80, 80), 1)
+        cv2.putText(img, f"-{span:.0f}s", (left, height - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (80, 80, 80), 1)
+
+        for target, data in series:
+            data = data[(data[:, 0] >= t_start) & ~np.isnan(data[:, 1])]
+            if len(data) == 0:
+                continue
+            px = left + (data[:, 0] - t_start) / span * plot_w
+            py = top + (d_max - data[:, 1]) / (d_max - d_min) * plot_h
+            pts = np.column_stack([px, py]).astype(np.int32).reshape(-1, 1, 2)
+            cv2.polylines(img, [pts], False, target.color, 1, cv2.LINE_AA)
+            label = f"T{target.target_id} {data[-1, 1]:.2f}m"
+            cv2.putText(img, label, (int(pts[-1, 0, 0]) - 70, max(int(pts[-1, 0, 1]) - 4, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, target.color, 1, cv2.LINE_AA)
+        return img
@@ -0,0 +1,168 @@
+import multiprocessing as mp
+import time
+
+import cv2
+import numpy as np
+
+from stereo_core.camera_calibrator import CameraCalibrator
+from stereo_core.frame_ring import SharedFrameRing
+from stereo_core.stereo_vision_processor import StereoVisionProcessor
+
+"""进程分离模式：采集进程解码视频写入输入环形缓冲区，处理进程计算视差写入输出环形缓冲区
+
+界面进程只从共享内存读取结果，帧数据不经过pickle序列化。输出帧的标签为对应输入帧的序号，
+处理速度跟不上采集时，处理进程总是取最新的输入帧，旧帧被覆盖丢弃。
+"""
+
+FRAME_SHAPE = (480, 1280, 3)
+
+
+def _capture_loop(source, ring_descriptor, stop_event, realtime, loop):
+    """采集进程：读取左右并排视频帧，直接解码进共享内存槽位"""
+    ring = SharedFrameRing.attach(ring_descriptor)
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    interval = 1.0 / fps if realtime and fps and fps > 0 else 0.0
+    next_time = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            ret, frame = capture.read()
+            if not ret:
+                if not loop:
+                    break
+                capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            seq, views = ring.begin_write()
+            if frame.shape == FRAME_SHAPE:
+                views['frame'][...] = frame
+            else:
+                cv2.resize(frame, (FRAME_SHAPE[1], FRAME_SHAPE[0]), dst=views['frame'])
+            ring.commit(seq)
+            if interval:
+                # 按视频帧率节流，模拟实时相机
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.monotonic()
+    finally:
+        capture.release()
+        ring.close()
+
+
+def _processing_loop(input_descriptor, output_descriptor, calibration, matcher_params, stop_event):
+    """处理进程：取最新输入帧校正并计算视差，结果直接写入输出槽位"""
+    input_ring = SharedFrameRing.attach(input_descriptor)
+    output_ring = SharedFrameRing.attach(output_descriptor)
+    processor = StereoVisionProcessor()
+    for name, value in matcher_params.items():
+        setattr(processor, name, value)
+    processor.calibrator = CameraCalibrator.from_dict(calibration)
+    processor.init_stereo_matcher()
+    frame = np.empty(FRAME_SHAPE, dtype=np.uint8)
+    last_seq = 0
+    try:
+        while not stop_event.is_set():
+            seq = input_ring.wait_for_new(last_seq, timeout=0.1)
+            if seq is None or input_ring.read(seq, out={'frame': frame}) is None:
+                continue
+            last_seq = seq
+            _, img1_rectified, img2_rectified = processor.rectify_frame(frame)
+            out_seq, views = output_ring.begin_write()
+            views['left'][...] = img1_rectified
+            views['disparity'][...] = processor.compute_disparity(img1_rectified, img2_rectified)
+            output_ring.commit(out_seq, tag=seq)
+    finally:
+        input_ring.close()
+        output_ring.close()
+
+
+class ProcessSplitPipeline:
+    """采集、处理分别在独立进程中运行，结果通过共享内存环形缓冲区读取"""
+
+    def __init__(self, source, calibrator, matcher_params=None, slots=4, realtime=True, loop=True):
+        if not calibrator.is_calibrated:
+            raise RuntimeError("请先完成相机标定！")
+        width, height = calibrator.rectified_size
+        self.source = source
+        self.input_ring = SharedFrameRing.create({'frame': (FRAME_SHAPE, np.uint8)}, slots)
+        self.output_ring = SharedFrameRing.create({'left': ((height, width), np.uint8),
+                                                   'disparity': ((height, width), np.int16)}, slots)
+        # 界面读取结果用的两组可复用缓冲区，交替使用：上一次返回的结果在本次读取时不被覆盖
+        self._result_buffers = [{'left': np.empty((height, width), dtype=np.uint8),
+                                 'disparity': np.empty((height, width), dtype=np.int16)} for _ in range(2)]
+        self._result_index = 0
+        self._frame = np.empty(FRAME_SHAPE, dtype=np.uint8)
+        self.last_result_seq = 0
+
+        ctx = mp.get_context('spawn')
+        self._stop_event = ctx.Event()
+        self._processes = [
+            ctx.Process(target=_capture_loop,
+                        args=(source, self.input_ring.descriptor(), self._stop_event, realtime, loop),
+                        daemon=True),
+            ctx.Process(target=_processing_loop,
+                        args=(self.input_ring.descriptor(), self.output_ring.descriptor(),
+                              calibrator.to_dict(), matcher_params or {}, self._stop_event),
+                        daemon=True),
+        ]
+        for p in self._processes:
+            p.start()
+
+    def is_alive(self):
+        return all(p.is_alive() for p in self._processes)
+
+    def latest_result(self):
+        """读取最新的处理结果，没有新结果时返回None
+
+        返回 (结果序号, 输入帧序号, 校正左图, 视差)；数组为两组交替复用的缓冲区（只从共享内存复制一次），
+        在下一次调用后仍保持不变，再下一次调用时被覆盖，因此处理器可以直接保留本帧和上一帧的结果
+        """
+        seq = self.output_ring.latest_seq()
+        if seq <= self.last_result_seq:
+            return None
+        # 按成功读取的次数交替（不能按结果序号，跳过序号时两次读取会落在同一组缓冲区）
+        buffers = self._result_buffers[self._result_index]
+        result = self.output_ring.read(seq, out=buffers)
+        if result is None:
+            return None
+        self._result_index ^= 1
+        self.last_result_seq = seq
+        _, input_seq, _, _ = result
+        return seq, input_seq, buffers['left'], buffers['disparity']
+
+    def frame_view(self, input_seq):
+        """不复制地访问原始帧（共享内存中的视图），已被覆盖时返回None
+
+        视图随时可能被采集进程覆盖，使用完毕后应以 frame_is_current 确认期间未被覆盖
+        """
+        views = self.input_ring.view(input_seq)
+        return None if views is None else views['frame']
+
+    def frame_is_current(self, input_seq):
+        return self.input_ring.is_current(input_seq)
+
+    def frame(self, input_seq):
+        """读取指定序号的原始帧，已被覆盖时返回None（数组为复用缓冲区）"""
+        result = self.input_ring.read(input_seq, out={'frame': self._frame})
+        return None if result is None else self._frame
+
+    def stats(self):
+        """已采集帧数、已处理帧数和处理进程跳过的帧数"""
+        captured = self.input_ring.latest_seq()
+        processed = self.output_ring.latest_seq()
+        return {'captured': captured, 'processed': processed, 'skipped': max(captured - processed, 0)}
+
+    def stop(self, timeout=2.0):
+        """停止两个进程并释放共享内存"""
+        if self._processes is None:
+            return
+        self._stop_event.set()
+        for p in self._processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._processes = None
+        self.input_ring.close()
+        self.output_ring.close()
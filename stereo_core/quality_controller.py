@@ -0,0 +1,134 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+"""自适应质量控制：根据实测每帧耗时在若干质量等级间切换，使处理速度保持在延迟预算内"""
+
+
+class QualityLevel:
+    """一个质量等级：匹配分辨率比例、视差数（原分辨率单位）、块大小、SGBM模式和跳帧数"""
+
+    def __init__(self, scale, num_disparities, block_size, mode, skip):
+        self.scale = scale
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.mode = mode
+        self.skip = skip  # 每处理一帧后跳过的帧数
+
+    @property
+    def mode_name(self):
+        return {cv2.STEREO_SGBM_MODE_HH: "HH", cv2.STEREO_SGBM_MODE_SGBM: "SGBM",
+                cv2.STEREO_SGBM_MODE_SGBM_3WAY: "3WAY"}.get(self.mode, str(self.mode))
+
+    def describe(self):
+        return (f"分辨率{self.scale:.0%} 视差{self.num_disparities} 块{self.block_size} "
+                f"{self.mode_name} 跳帧{self.skip}")
+
+
+# 从高质量到低开销排列；视差数为原分辨率单位，缩小分辨率时匹配器按比例换算，可测距离范围不变
+DEFAULT_LEVELS = [
+    QualityLevel(1.0, 64, 3, cv2.STEREO_SGBM_MODE_HH, 0),
+    QualityLevel(1.0, 64, 5, cv2.STEREO_SGBM_MODE_SGBM, 0),
+    QualityLevel(1.0, 64, 5, cv2.STEREO_SGBM_MODE_SGBM_3WAY, 0),
+    QualityLevel(0.5, 64, 5, cv2.STEREO_SGBM_MODE_SGBM_3WAY, 0),
+    QualityLevel(0.5, 64, 5, cv2.STEREO_SGBM_MODE_SGBM_3WAY, 1),
+    QualityLevel(0.5, 64, 5, cv2.STEREO_SGBM_MODE_SGBM_3WAY, 2),
+]
+
+
+class QualityController:
+    """按最近若干帧耗时的中值调整质量等级
+
+    平均到每个输入帧的耗时超过预算时降一级；低于预算的upgrade_ratio倍、且目标等级上次实测的耗时
+    也在预算内时才升一级。每次切换后至少观察hold_frames帧，避免在两个等级之间来回振荡。
+    各等级的实测耗时超过cost_ttl帧后作废，负载下降后会重新尝试更高的质量等级
+    """
+
+    def __init__(self, processor, budget_ms=30.0, levels=None, window=15, hold_frames=30, upgrade_ratio=0.6,
+                 cost_ttl=300):
+        self.processor = processor
+        self.budget_ms = budget_ms
+        self.levels = levels or DEFAULT_LEVELS
+        self.window = window
+        self.hold_frames = hold_frames
+        self.upgrade_ratio = upgrade_ratio
+        self.cost_ttl = cost_ttl
+        self.level = 0
+        self._costs = deque(maxlen=window)
+        # 各等级最近一次实测的每帧耗时（ms）及记录时的帧计数
+        self.level_costs = {}
+        self._cost_frames = {}
+        self._frame_count = 0
+        self._frames_since_change = 0
+        self._skip_counter = 0
+        self.apply_level(0)
+
+    @property
+    def current(self):
+        return self.levels[self.level]
+
+    def apply_level(self, level):
+        """把等级参数应用到处理器"""
+        self.level = level
+        current = self.current
+        self.processor.process_scale = current.scale
+        self.processor.configure_matcher(current.num_disparities, current.block_size, current.mode)
+        self._costs.clear()
+        self._frames_since_change = 0
+        self._skip_counter = 0
+
+    def should_process(self):
+        """当前帧是否需要处理（按等级的跳帧数丢弃部分帧）"""
+        if self._skip_counter > 0:
+            self._skip_counter -= 1
+            return False
+        self._skip_counter = self.current.skip
+        return True
+
+    def begin(self):
+        return time.perf_counter()
+
+    def record(self, start):
+        """记录一帧处理的开始时刻（begin的返回值），必要时切换等级，返回是否切换"""
+        self._costs.append((time.perf_counter() - start) * 1000)
+        self._frames_since_change += 1
+        self._frame_count += 1
+        if len(self._costs) < self.window or self._frames_since_change < self.hold_frames:
+            return False
+
+        cost = float(np.median(self._costs))
+        self.level_costs[self.level] = cost
+        self._cost_frames[self.level] = self._frame_count
+        # 跳帧时一次处理的耗时分摊到多个输入帧
+        per_frame = cost / (self.current.skip + 1)
+        if per_frame > self.budget_ms and self.level < len(self.levels) - 1:
+            self.apply_level(self.level + 1)
+            return True
+        if per_frame < self.budget_ms * self.upgrade_ratio and self.level > 0:
+            target = self.level - 1
+            known = self.level_costs.get(target)
+            if known is not None and self._frame_count - self._cost_frames[target] > self.cost_ttl:
+                # 记录已过期（当时的负载可能已不存在），重新实测
+                del self.level_costs[target]
+                known = None
+            if known is None or known / (self.levels[target].skip + 1) <= self.budget_ms:
+                self.apply_level(target)
+                return True
+        return False
+
+    def reset(self):
+        """恢复最高质量等级并清除耗时记录"""
+        self.level_costs = {}
+        self._cost_frames = {}
+        self.apply_level(0)
+
+    def describe(self):
+        cost = self.level_costs.get(self.level)
+        text = f"质量等级 {self.level + 1}/{len(self.levels)}: {self.current.describe()}"
+        if self._costs:
+            text += f"，耗时 {float(np.median(self._costs)):.0f} ms"
+        elif cost is not None:
+            text += f"，耗时 {cost:.0f} ms"
+        return text + f"（预算 {self.budget_ms:.0f} ms）"
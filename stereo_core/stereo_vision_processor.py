@@ -0,0 +1,931 @@
+import copy
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from stereo_core.camera_calibrator import CameraCalibrator, report_progress
+from stereo_core.obstacle_zones import ObstacleZone, measure_zones
+from stereo_core.depth_engine import DepthEngine
+from stereo_core.chessboard import detect_chessboard, square_size_px
+from Utils.vision_utils import VisionUtils
+from Utils.view_selector import ViewSelector
+
+# process_frame 可按需生成的结果：灰度图、深度伪彩色图、毫米深度图、原始视差
+OUTPUT_GRAY = 'gray'
+OUTPUT_DEPTH_IMAGE = 'depth_image'
+OUTPUT_DEPTH = 'depth'
+OUTPUT_DISPARITY = 'disparity'
+ALL_OUTPUTS = frozenset({OUTPUT_GRAY, OUTPUT_DEPTH_IMAGE, OUTPUT_DEPTH, OUTPUT_DISPARITY})
+# 需要立体匹配才能得到的结果
+DISPARITY_OUTPUTS = frozenset({OUTPUT_DEPTH_IMAGE, OUTPUT_DEPTH, OUTPUT_DISPARITY})
+
+
+class RectificationState:
+    """一组标定参数对应的预计算状态：左右校正映射表、立体匹配器及创建匹配器时的参数"""
+
+    def __init__(self, maps, stereo, params):
+        self.maps = maps
+        self.stereo = stereo
+        self.params = params
+
+
+"""功能处理"""
+class StereoVisionProcessor:
+    def __init__(self):
+        self.calibrator = CameraCalibrator()
+        self.utils = VisionUtils()
+        self.stereo = None
+        # 视差搜索范围（稠密与稀疏匹配共用，原分辨率单位；process_scale小于1时匹配器按比例换算）
+        self.min_disparity = 1
+        self.num_disparities = 64
+        self.block_size = 3
+        self.matcher_mode = cv2.STEREO_SGBM_MODE_HH
+        # 工作深度范围 (近, 远)，单位米；设置后视差搜索范围由标定参数推算，标定变化时自动重新计算
+        self.depth_range = None
+        self._depth_range_key = None
+        self._fixed_disparity = None
+        # 匹配分辨率比例，小于1时在缩小的校正图像上计算视差再放大回原尺寸
+        self.process_scale = 1.0
+        # 稀疏测距参数
+        self.sparse_max_features = 200
+        self.sparse_patch_radius = 3
+        self.sparse_uniqueness = 0.15
+        # FAST的最低阈值；角点远多于需要时阈值自动提高，只保留响应最强的角点本就用不到弱角点
+        self.sparse_fast_threshold = 20
+        self._fast = cv2.FastFeatureDetector_create(threshold=self.sparse_fast_threshold, nonmaxSuppression=True)
+        # 按标定版本缓存的校正状态（LRU）
+        self._state_cache = OrderedDict()
+        self.state_cache_size = 4
+        # 感兴趣区域 (x, y, w, h)，为None时处理整帧
+        self.roi = None
+        self.roi_padding = 8
+        # 只处理校正后的有效区域（左右有效像素区域对应的有效视差区域），黑边不做校正和匹配
+        self.crop_to_valid = True
+        # 只按有效区域裁剪时，实际计算的面积减少不到该比例则整帧处理（省去映射表切片和结果贴回整帧的开销）
+        self.min_crop_saving = 0.05
+        self._map_slices = None
+        self._map_slices_key = None
+        # 最近一帧的校正左图和原始视差（整帧坐标），供跟踪等功能复用
+        self.last_rectified_left = None
+        self.last_disparity = None
+        # 最近一帧的uint16毫米深度图（0为无效），以及按标定和最小视差缓存的深度查找表
+        self.last_depth = None
+        # 最近一帧各阶段耗时（毫秒）：校正、匹配、结果生成
+        self.last_timings = {}
+        self._depth_engine = None
+        self._depth_engine_key = None
+        # 最近一次视图筛选标定的统计报告
+        self.selection_report = None
+        # 障碍区域及最近一帧的报警状态变化 [(区域, 'enter'/'leave')]
+        self.zones = []
+        self.zone_events = []
+
+    def calibrate_cameras(self, left_image_dir, right_image_dir, chessboard_size=(9, 6), square_size=25.0,
+                          incremental=False, max_views=None, compare_full=False, progress_callback=None):
+        """执行完整的相机标定流程，成功后立即应用
+
+        incremental为True时在已有视图和内参基础上增量标定；
+        max_views限制参与求解的视图数，超出时按位姿和覆盖多样性挑选子集，结果统计见 selection_report
+        """
+        calibrator = self.new_calibration_target(incremental)
+        ret, report = self.run_calibration(calibrator, left_image_dir, right_image_dir, chessboard_size,
+                                           square_size, incremental, max_views, compare_full, progress_callback)
+        self.apply_calibration(calibrator, report)
+        return ret
+
+    def new_calibration_target(self, incremental=False):
+        """创建标定求解用的标定器：增量标定时复制当前标定器（含已保留的视图），否则新建"""
+        if incremental:
+            return copy.deepcopy(self.calibrator)
+        calibrator = CameraCalibrator()
+        calibrator.size = self.calibrator.size
+        calibrator.rectify_alpha = self.calibrator.rectify_alpha
+        calibrator.new_size = self.calibrator.new_size
+        return calibrator
+
+    def apply_calibration(self, calibrator, selection_report=None):
+        """切换到新的标定结果（一次引用替换，正在使用的标定器不会被修改）"""
+        self.calibrator = calibrator
+        self.selection_report = selection_report
+
+    def run_calibration(self, calibrator, left_image_dir, right_image_dir, chessboard_size=(9, 6),
+                        square_size=25.0, incremental=False, max_views=None, compare_full=False,
+                        progress_callback=None):
+        """在给定的标定器上执行标定流程，不影响处理器当前使用的标定器，可在后台线程中调用
+
+        progress_callback(阶段, 当前, 总数) 用于报告进度，回调中抛出 CalibrationCancelled 即可中止；
+        返回 (RMS误差, 视图筛选报告或None)
+        """
+        objp = self.utils.prepare_chessboard_points(chessboard_size, square_size)
+        objpoints = []
+        left_imgpoints = []
+        right_imgpoints = []
+
+        pairs, left_only, right_only = self.utils.pair_image_paths(left_image_dir, right_image_dir)
+        if left_only or right_only:
+            print(f"未配对的帧号: 仅左图 {left_only}, 仅右图 {right_only}")
+        if len(pairs) < 4:
+            raise RuntimeError(f"需要至少4对图像，当前按帧号配对成功: {len(pairs)}对")
+
+        report_progress(progress_callback, "检测角点", 0, len(pairs))
+        # 上一次检测到的方格边长，用于直接选择粗检测的金字塔层
+        square_px = None
+        for i, (_, left_path, right_path, gray_left, gray_right) in enumerate(self.utils.iter_gray_pairs(pairs)):
+            if gray_left is None or gray_right is None:
+                report_progress(progress_callback, "检测角点", i + 1, len(pairs))
+                continue
+
+            # 由粗到精查找棋盘格角点（已做亚像素精化），右图只在左图检测到时才检测
+            corners_left, method_left = detect_chessboard(gray_left, chessboard_size, square_px=square_px)
+            corners_right, method_right = (detect_chessboard(gray_right, chessboard_size, square_px=square_px)
+                                           if corners_left is not None else (None, None))
+            if corners_left is not None:
+                square_px = square_size_px(corners_left, chessboard_size)
+
+            print(f"左图像 {left_path}: 角点检测结果 {method_left or False}")
+            print(f"右图像 {right_path}: 角点检测结果 {method_right or False}")
+
+            if corners_left is not None and corners_right is not None:
+                objpoints.append(objp)
+                left_imgpoints.append(corners_left)
+                right_imgpoints.append(corners_right)
+            report_progress(progress_callback, "检测角点", i + 1, len(pairs))
+
+        print(f"找到的有效图像对数: {len(objpoints)}")
+        return self._solve_views(calibrator, objpoints, left_imgpoints, right_imgpoints, max_views,
+                                 incremental, compare_full, progress_callback)
+
+    def calibrate_from_video(self, video_path, chessboard_size=(9, 6), square_size=25.0, incremental=False,
+                             max_views=None, compare_full=False, progress_callback=None, **collector_options):
+        """从左右并排的标定视频直接标定，成功后立即应用"""
+        calibrator = self.new_calibration_target(incremental)
+        ret, report = self.run_video_calibration(calibrator, video_path, chessboard_size, square_size,
+                                                 incremental, max_views, compare_full, progress_callback,
+                                                 **collector_options)
+        self.apply_calibration(calibrator, report)
+        return ret
+
+    def run_video_calibration(self, calibrator, video_path, chessboard_size=(9, 6), square_size=25.0,
+                              incremental=False, max_views=None, compare_full=False, progress_callback=None,
+                              **collector_options):
+        """在给定的标定器上用标定视频求解，可在后台线程中调用
+
+        视频帧经快速预筛、去模糊和去重复位姿后才做亚像素精化（见 VideoViewCollector），
+        返回 (RMS误差, 报告)，报告的 'video' 项为视频筛选统计
+        """
+        from stereo_core.video_calibration import VideoViewCollector
+        collector = VideoViewCollector(chessboard_size, calibrator.size, **collector_options)
+        left_imgpoints, right_imgpoints, stats = collector.collect(video_path, progress_callback)
+        if len(left_imgpoints) < 4:
+            raise RuntimeError(f"视频中可用的标定视图不足4个，当前: {len(left_imgpoints)}")
+        objp = self.utils.prepare_chessboard_points(chessboard_size, square_size)
+        ret, report = self._solve_views(calibrator, [objp] * len(left_imgpoints), left_imgpoints,
+                                        right_imgpoints, max_views, incremental, compare_full, progress_callback)
+        report = dict(report or {})
+        report['video'] = stats
+        return ret, report
+
+    def _solve_views(self, calibrator, objpoints, left_imgpoints, right_imgpoints, max_views, incremental,
+                     compare_full, progress_callback=None):
+        """视图数超过max_views时只用筛选出的子集求解，否则用全部视图求解"""
+        if max_views and len(objpoints) > max_views:
+            return self._calibrate_selected_views(calibrator, objpoints, left_imgpoints, right_imgpoints,
+                                                  max_views, incremental, compare_full, progress_callback)
+        ret = calibrator.calibrate(objpoints, left_imgpoints, right_imgpoints, incremental=incremental,
+                                   progress_callback=progress_callback)
+        return ret, None
+
+    def _calibrate_selected_views(self, calibrator, objpoints, left_imgpoints, right_imgpoints, max_views,
+                                  incremental, compare_full, progress_callback=None):
+        """只用筛选出的视图子集求解，并报告在全部视图上的精度；compare_full时实测全部视图求解耗时作对比"""
+        report_progress(progress_callback, "筛选视图")
+        selector = ViewSelector(calibrator.size)
+        indices = selector.select(objpoints, left_imgpoints, right_imgpoints, max_views)
+        print(f"视图筛选: 从 {len(objpoints)} 个视图中选出 {len(indices)} 个")
+
+        start = time.perf_counter()
+        ret = calibrator.calibrate([objpoints[i] for i in indices],
+                                   [left_imgpoints[i] for i in indices],
+                                   [right_imgpoints[i] for i in indices],
+                                   incremental=incremental, progress_callback=progress_callback)
+        solve_time = time.perf_counter() - start
+
+        report_progress(progress_callback, "评估全部视图")
+        report = {
+            'total_views': len(objpoints),
+            'selected_views': len(indices),
+            'solve_time': solve_time,
+            'subset_rms': ret,
+            # 子集标定结果在全部视图（含未参与求解的视图）上的重投影误差
+            'all_views_error': self._evaluate_all_views(calibrator, objpoints, left_imgpoints, right_imgpoints),
+        }
+        if compare_full:
+            report_progress(progress_callback, "全部视图对比标定")
+            full = CameraCalibrator()
+            full.size = calibrator.size
+            start = time.perf_counter()
+            report['full_rms'] = full.calibrate(objpoints, left_imgpoints, right_imgpoints,
+                                                progress_callback=progress_callback)
+            report['full_solve_time'] = time.perf_counter() - start
+            report['full_all_views_error'] = self._evaluate_all_views(full, objpoints, left_imgpoints, right_imgpoints)
+        else:
+            # 未实测时只给出按视图数平方外推的估计值，不作为节省的时间报告
+            report['full_solve_time_estimate'] = solve_time * (len(objpoints) / len(indices)) ** 2
+        return ret, report
+
+    @staticmethod
+    def _evaluate_all_views(calibrator, objpoints, left_imgpoints, right_imgpoints):
+        """标定结果在给定视图上的左右相机RMS重投影误差"""
+        left = calibrator.evaluate_views(objpoints, left_imgpoints,
+                                         calibrator.left_camera_matrix, calibrator.left_distortion)
+        right = calibrator.evaluate_views(objpoints, right_imgpoints,
+                                          calibrator.right_camera_matrix, calibrator.right_distortion)
+        return float(np.sqrt(np.mean(left ** 2))), float(np.sqrt(np.mean(right ** 2)))
+
+    # 在 stereo_vision_processor.py 中检查是否正确初始化了 stereo 匹配器
+    def init_stereo_matcher(self):
+        """使当前标定参数对应的立体匹配器就绪（视差参数变化后重建该组标定的匹配器）"""
+        state = self.get_rectification_state()
+        params = self.matcher_params()
+        if state.params != params:
+            state.stereo = self.create_stereo_matcher(params)
+            state.params = params
+        self.stereo = state.stereo
+
+    def set_depth_range(self, near, far):
+        """设置工作深度范围（米），视差搜索范围随之收紧；传入None恢复固定的视差搜索范围"""
+        if near is None or far is None:
+            if self._fixed_disparity is not None:
+                self.min_disparity, self.num_disparities = self._fixed_disparity
+            self.depth_range = self._depth_range_key = self._fixed_disparity = None
+            self.stereo = None
+            return
+        if not 0 < near < far:
+            raise ValueError("深度范围无效：需要 0 < 近距离 < 远距离")
+        if self._fixed_disparity is None:
+            self._fixed_disparity = (self.min_disparity, self.num_disparities)
+        self.depth_range = (float(near), float(far))
+        self._depth_range_key = None
+        self.stereo = None
+
+    @staticmethod
+    def disparity_range_for_depth(calibrator, near, far):
+        """深度范围 [near, far]（米）对应的 (最小视差, 视差数)
+
+        校正后 Z = Q[2,3] / (Q[3,2]·d + Q[3,3])，其中 Q[2,3] 为焦距（P1[0,0]），Q[3,2] = -1/Tx 由基线决定，
+        Q[3,3] 为左右主点差；反解 d = (Q[2,3]/Z - Q[3,3]) / Q[3,2]。最小视差至少为1（视差0对应无穷远），
+        视差数按SGBM要求取16的倍数且不超过图像宽度
+        """
+        Q = calibrator.Q
+        disparities = [(Q[2, 3] / (z * 1000) - Q[3, 3]) / Q[3, 2] for z in (near, far)]
+        low, high = min(disparities), max(disparities)
+        min_disparity = max(1, int(np.floor(low)))
+        num_disparities = max(16, int(np.ceil((high - min_disparity + 1) / 16.0)) * 16)
+        width = calibrator.rectified_size[0]
+        num_disparities = min(num_disparities, max(16, (width - min_disparity) // 16 * 16))
+        return min_disparity, num_disparities
+
+    def update_disparity_range(self):
+        """设置了工作深度范围时，在标定或深度范围变化后重新计算视差搜索范围"""
+        if self.depth_range is None or not self.calibrator.is_calibrated:
+            return
+        key = (self.calibrator.version, self.depth_range)
+        if self._depth_range_key == key:
+            return
+        self.min_disparity, self.num_disparities = self.disparity_range_for_depth(self.calibrator,
+                                                                                  *self.depth_range)
+        self._depth_range_key = key
+        print(f"工作深度 {self.depth_range[0]:g}-{self.depth_range[1]:g} 米: "
+              f"视差范围 {self.min_disparity}-{self.min_disparity + self.num_disparities - 1}")
+
+    def matcher_params(self):
+        """匹配器参数 (minDisparity, numDisparities, blockSize, mode)
+
+        min_disparity/num_disparities 为原分辨率单位，process_scale小于1时按匹配分辨率换算，
+        换算后的搜索范围覆盖原范围（视差数向上取整到16的倍数）
+        """
+        self.update_disparity_range()
+        min_disparity, num_disparities = self.min_disparity, self.num_disparities
+        if self.process_scale < 1.0:
+            scale = self.process_scale
+            high = (self.min_disparity + self.num_disparities) * scale
+            min_disparity = int(np.floor(self.min_disparity * scale))
+            if self.min_disparity > 0:
+                min_disparity = max(1, min_disparity)
+            num_disparities = max(16, int(np.ceil((high - min_disparity) / 16.0)) * 16)
+        return min_disparity, num_disparities, self.block_size, self.matcher_mode
+
+    def create_stereo_matcher(self, params=None):
+        """按视差参数（默认为当前参数）创建新的SGBM匹配器"""
+        min_disparity, num_disparities, block_size, mode = params or self.matcher_params()
+        return cv2.StereoSGBM_create(
+            minDisparity=min_disparity,
+            numDisparities=num_disparities,
+            blockSize=block_size,
+            P1=8 * 3 * block_size ** 2,
+            P2=32 * 3 * block_size ** 2,
+            disp12MaxDiff=-1,
+            preFilterCap=1,
+            uniquenessRatio=10,
+            speckleWindowSize=100,
+            speckleRange=100,
+            mode=mode)
+
+    def configure_matcher(self, num_disparities=None, block_size=None, mode=None):
+        """修改视差计算参数，各组校正状态中的匹配器在下次使用时按新参数重建
+
+        num_disparities为原分辨率单位；设置了工作深度范围时视差数由深度范围决定，num_disparities被忽略
+        """
+        if num_disparities is not None and self.depth_range is None:
+            self.num_disparities = num_disparities
+        if block_size is not None:
+            self.block_size = block_size
+        if mode is not None:
+            self.matcher_mode = mode
+        self.stereo = None
+
+    def compute_disparity(self, img_left, img_right):
+        """计算原始视差（×16）；process_scale小于1时缩小匹配，结果换算回原分辨率的视差"""
+        if self.process_scale >= 1.0:
+            return self.stereo.compute(img_left, img_right)
+        scale = self.process_scale
+        small_left = cv2.resize(img_left, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small_right = cv2.resize(img_right, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small = self.stereo.compute(small_left, small_right)
+        invalid_value = (self.min_disparity - 1) * 16
+        small_min = self.stereo.getMinDisparity()
+        small = np.where(small < small_min * 16, invalid_value, small / scale).astype(np.int16)
+        height, width = img_left.shape[:2]
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+
+    def get_rectification_state(self, calibrator=None):
+        """获取标定参数对应的校正状态（映射表和匹配器）
+
+        最近使用的若干组标定的状态保存在LRU缓存中，切换回这些标定时无需重建映射表
+        """
+        calibrator = calibrator or self.calibrator
+        key = calibrator.version
+        state = self._state_cache.get(key)
+        if state is None:
+            params = self.matcher_params()
+            state = RectificationState(self._build_rectify_maps(calibrator), self.create_stereo_matcher(params),
+                                       params)
+            self._state_cache[key] = state
+            while len(self._state_cache) > self.state_cache_size:
+                self._state_cache.popitem(last=False)
+        else:
+            self._state_cache.move_to_end(key)
+        return state
+
+    def prepare_calibration(self, calibrator):
+        """预先为标定参数构建校正状态并放入缓存（不改变当前使用的标定）"""
+        if calibrator.is_calibrated:
+            self.get_rectification_state(calibrator)
+            # 预热不应把当前标定挤到LRU的最旧位置
+            if self.calibrator.version in self._state_cache:
+                self._state_cache.move_to_end(self.calibrator.version)
+
+    def install_rectify_maps(self, calibrator, maps):
+        """使用外部提供的校正映射表（例如共享内存中的只读映射表），不再为该标定重新计算"""
+        params = self.matcher_params()
+        self._state_cache[calibrator.version] = RectificationState(maps, self.create_stereo_matcher(params), params)
+        self._state_cache.move_to_end(calibrator.version)
+        while len(self._state_cache) > self.state_cache_size:
+            self._state_cache.popitem(last=False)
+
+    @staticmethod
+    def _build_rectify_maps(calibrator):
+        """计算左右相机的校正映射表（输出为校正后尺寸）"""
+        size = calibrator.rectified_size
+        left_map = cv2.initUndistortRectifyMap(
+            calibrator.left_camera_matrix,
+            calibrator.left_distortion,
+            calibrator.R1,
+            calibrator.P1,
+            size,
+            cv2.CV_16SC2
+        )
+        right_map = cv2.initUndistortRectifyMap(
+            calibrator.right_camera_matrix,
+            calibrator.right_distortion,
+            calibrator.R2,
+            calibrator.P2,
+            size,
+            cv2.CV_16SC2
+        )
+        return left_map, right_map
+
+    def get_rectify_maps(self):
+        """获取当前标定的校正映射表（缓存，避免每帧重新计算）"""
+        return self.get_rectification_state().maps
+
+    def set_roi(self, roi):
+        """设置感兴趣区域 (x, y, w, h)，传入None恢复整帧处理"""
+        if roi is None:
+            self.roi = None
+            return
+        width, height = self.calibrator.rectified_size
+        x, y, w, h = (int(v) for v in roi)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            raise ValueError("ROI区域过小或不在图像范围内")
+        self.roi = (x0, y0, x1 - x0, y1 - y0)
+
+    def in_roi(self, x, y):
+        """判断像素是否位于计算深度的区域内（ROI与校正有效区域的交集，都未限制时整帧都会被计算）"""
+        region = self.get_processing_region()
+        if region is None:
+            return True
+        rx, ry, rw, rh = region
+        return rx <= x < rx + rw and ry <= y < ry + rh
+
+    @staticmethod
+    def _rect_border(rect, samples):
+        """矩形 (x, y, w, h) 边界上的采样点 (N, 2)，按顺时针排列"""
+        x, y, w, h = rect
+        t = np.linspace(0.0, 1.0, samples, endpoint=False)
+        x1, y1 = x + w - 1, y + h - 1
+        return np.concatenate([
+            np.stack([x + t * (x1 - x), np.full_like(t, y)], axis=1),
+            np.stack([np.full_like(t, x1), y + t * (y1 - y)], axis=1),
+            np.stack([x1 - t * (x1 - x), np.full_like(t, y1)], axis=1),
+            np.stack([np.full_like(t, x), y1 - t * (y1 - y)], axis=1),
+        ]).astype(np.float32)
+
+    def rect_from_original(self, rect, samples=16):
+        """原始左图上的矩形 (x, y, w, h) -> 校正后坐标中覆盖其边界的外接矩形
+
+        畸变和校正旋转会使矩形边界弯曲，这里对边界采样后经undistortPoints(R1, P1)映射，结果限制在校正后图像内；
+        未标定时原样返回
+        """
+        calibrator = self.calibrator
+        if not calibrator.is_calibrated:
+            return tuple(int(v) for v in rect)
+        points = cv2.undistortPoints(self._rect_border(rect, samples).reshape(-1, 1, 2),
+                                     calibrator.left_camera_matrix, calibrator.left_distortion,
+                                     R=calibrator.R1, P=calibrator.P1).reshape(-1, 2)
+        width, height = calibrator.rectified_size
+        x0, y0 = np.maximum(np.floor(points.min(axis=0)).astype(int), 0)
+        x1 = min(int(np.ceil(points[:, 0].max())), width - 1)
+        y1 = min(int(np.ceil(points[:, 1].max())), height - 1)
+        return int(x0), int(y0), max(0, x1 - int(x0) + 1), max(0, y1 - int(y0) + 1)
+
+    def rect_outline_in_original(self, rect, samples=16):
+        """校正后坐标中的矩形在原始左图上的轮廓（int32折线点），用于在原始视频上绘制
+
+        直接查左图校正映射表（映射表给出每个校正后像素对应的原始像素）；未标定时即为矩形四角
+        """
+        points = self._rect_border(rect, samples)
+        if self.calibrator.is_calibrated:
+            map1 = self.get_rectify_maps()[0][0]
+            height, width = map1.shape[:2]
+            xs = np.clip(np.rint(points[:, 0]).astype(int), 0, width - 1)
+            ys = np.clip(np.rint(points[:, 1]).astype(int), 0, height - 1)
+            points = map1[ys, xs]
+        return np.asarray(points, dtype=np.int32).reshape(-1, 1, 2)
+
+    def get_valid_region(self, need_disparity=True):
+        """校正后的有效区域 (x, y, w, h)
+
+        需要视差时为左右有效像素区域按视差搜索范围求出的有效视差区域（getValidDisparityROI），
+        否则为左图的有效像素区域；标定器没有有效区域信息时返回None
+        """
+        calibrator = self.calibrator
+        if calibrator.valid_roi1 is None or calibrator.valid_roi2 is None:
+            return None
+        if not need_disparity:
+            return tuple(calibrator.valid_roi1)
+        return tuple(int(v) for v in cv2.getValidDisparityROI(
+            calibrator.valid_roi1, calibrator.valid_roi2, self.min_disparity, self.num_disparities,
+            self.block_size))
+
+    def get_processing_region(self, need_disparity=True):
+        """实际需要计算的区域 (x, y, w, h)：ROI与有效区域的交集，等于整帧时返回None
+
+        没有设置ROI、有效区域只裁掉很少像素（计算面积减少不到min_crop_saving）时也返回None
+        """
+        width, height = self.calibrator.rectified_size
+        x0, y0, x1, y1 = 0, 0, width, height
+        rects = [self.roi]
+        if self.crop_to_valid:
+            rects.append(self.get_valid_region(need_disparity))
+        for rect in rects:
+            if rect is None or rect[2] <= 0 or rect[3] <= 0:
+                continue
+            rx, ry, rw, rh = rect
+            x0, y0 = max(x0, rx), max(y0, ry)
+            x1, y1 = min(x1, rx + rw), min(y1, ry + rh)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            # 交集为空（例如ROI全部落在无效区域）时只按ROI计算
+            return self.roi
+        if (x0, y0, x1, y1) == (0, 0, width, height):
+            return None
+        rect = (x0, y0, x1 - x0, y1 - y0)
+        if self.roi is None:
+            # 需要视差时计算区域还包括左侧的搜索余量
+            cx0, cy0, cx1, cy1 = self.get_compute_region(rect) if need_disparity else (x0, y0, x1, y1)
+            if (cx1 - cx0) * (cy1 - cy0) > (1.0 - self.min_crop_saving) * width * height:
+                return None
+        return rect
+
+    def get_compute_region(self, rect=None):
+        """返回需要校正和匹配的区域 (x0, y0, x1, y1)：计算区域加上视差搜索余量和聚合边界
+
+        rect为None时使用ROI
+        """
+        width, height = self.calibrator.rectified_size
+        rect = self.roi if rect is None else rect
+        if rect is None:
+            return 0, 0, width, height
+        rx, ry, rw, rh = rect
+        pad = self.roi_padding + self.block_size // 2
+        # 左图x处的像素需要在右图 [x-maxD, x] 内搜索，因此左侧额外保留整个视差搜索范围
+        margin = self.min_disparity + self.num_disparities + pad
+        return (max(0, rx - margin), max(0, ry - pad),
+                min(width, rx + rw + pad), min(height, ry + rh + pad))
+
+    def get_map_slices(self, region):
+        """获取指定区域的校正映射表切片（按标定版本和区域缓存）
+
+        切片是完整映射表的视图，不复制数据（cv2.remap可直接使用非连续的映射表），
+        映射表位于共享内存中时各路处理仍只共享一份
+        """
+        key = (self.calibrator.version, region)
+        if self._map_slices is None or self._map_slices_key != key:
+            left_map, right_map = self.get_rectify_maps()
+            x0, y0, x1, y1 = region
+            self._map_slices = tuple(
+                tuple(m[y0:y1, x0:x1] for m in maps)
+                for maps in (left_map, right_map))
+            self._map_slices_key = key
+        return self._map_slices
+
+    @staticmethod
+    def split_frame(frame):
+        """左右并排的帧 -> (左图, 右图)，两者都是输入帧（必要时先缩放到1280x480）的视图"""
+        # 验证输入帧
+        if frame is None or frame.size == 0:
+            raise ValueError("输入帧无效")
+        if frame.shape[0] != 480 or frame.shape[1] != 1280:
+            frame = cv2.resize(frame, (1280, 480))
+        return frame[0:480, 0:640], frame[0:480, 640:1280]
+
+    def rectify_frame(self, frame, region=None, right=True):
+        """分割左右图像并做灰度化和立体校正
+
+        region 为 (x0, y0, x1, y1) 时只重映射该区域，返回的校正图像即为该区域；
+        right为False时只校正左图，返回的右图为None
+        """
+        frame1, frame2 = self.split_frame(frame)
+        img1_rectified, img2_rectified = self.rectify_pair(frame1, frame2, region, right)
+        return frame1, img1_rectified, img2_rectified
+
+    def rectify_pair(self, frame1, frame2, region=None, right=True):
+        """分别给出的左、右图像做灰度化和立体校正，返回 (校正左图, 校正右图)
+
+        图像尺寸与标定尺寸(640x480)相同时不做任何复制或缩放；region和right的含义同 rectify_frame
+        """
+        if not self.calibrator.is_calibrated:
+            raise RuntimeError("请先完成相机标定！")
+        if region is None:
+            left_map, right_map = self.get_rectify_maps()
+        else:
+            left_map, right_map = self.get_map_slices(region)
+
+        # 转换为灰度图并校正
+        img1_rectified = cv2.remap(self._gray(frame1), left_map[0], left_map[1], cv2.INTER_LINEAR)
+        if not right:
+            return img1_rectified, None
+        img2_rectified = cv2.remap(self._gray(frame2), right_map[0], right_map[1], cv2.INTER_LINEAR)
+        return img1_rectified, img2_rectified
+
+    @staticmethod
+    def _gray(image):
+        """单路图像 -> 640x480灰度图（已是灰度图时不转换）"""
+        if image is None or image.size == 0:
+            raise ValueError("输入帧无效")
+        if image.shape[0] != 480 or image.shape[1] != 640:
+            image = cv2.resize(image, (640, 480))
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    def get_depth_engine(self):
+        """当前标定和最小视差对应的视差->深度查找表（参数不变时复用）"""
+        key = (self.calibrator.version, self.min_disparity)
+        if self._depth_engine_key != key:
+            self._depth_engine = DepthEngine(self.calibrator.Q, self.min_disparity)
+            self._depth_engine_key = key
+        return self._depth_engine
+
+    def depth_point(self, x, y, depth_map=None):
+        """深度图中像素(x, y)的三维坐标（mm），无效时返回None"""
+        depth_map = self.last_depth if depth_map is None else depth_map
+        return self.get_depth_engine().point_at(depth_map, x, y)
+
+    def process_frame(self, frame, outputs=None, out=None):
+        """处理左右并排的视频帧，返回 (左图, 灰度图, 深度伪彩色图, uint16毫米深度图)，见 process_pair"""
+        if not self.calibrator.is_calibrated:
+            raise RuntimeError("请先完成相机标定！")
+        frame1, frame2 = self.split_frame(frame)
+        return self.process_pair(frame1, frame2, outputs, out)
+
+    def process_pair(self, frame1, frame2, outputs=None, out=None):
+        """处理分别给出的左、右图像（例如左右相机各自录制的文件），返回 (左图, 灰度图, 深度伪彩色图, uint16毫米深度图)
+
+        outputs为需要的结果集合（OUTPUT_* 常量），未请求的结果不计算、返回None，默认全部计算；
+        只需要灰度图时不做右图校正和立体匹配，此时 last_disparity 为None。
+        深度图中0表示无有效视差；设置了ROI或校正后有黑边时只校正和匹配ROI与有效区域的交集所需的区域，
+        区域外深度为0，伪彩色图中以暗灰色标记为未计算。需要三维坐标时用 depth_point 按像素计算。
+        out为整帧结果的可复用缓冲区（见 outputs_from_disparity），各阶段耗时记录在 last_timings 中
+        """
+        outputs = ALL_OUTPUTS if outputs is None else frozenset(outputs)
+        self.init_stereo_matcher()
+        self.last_timings = {}
+
+        try:
+            need_disparity = bool(outputs & DISPARITY_OUTPUTS)
+            region = self.get_processing_region(need_disparity)
+            if region is not None:
+                return self._process_region(frame1, frame2, region, outputs, out)
+            start = time.perf_counter()
+            img1_rectified, img2_rectified = self.rectify_pair(frame1, frame2, right=need_disparity)
+            rectified = time.perf_counter()
+            self.last_timings['rectify'] = (rectified - start) * 1000
+            if not need_disparity:
+                self.last_rectified_left = img1_rectified
+                self.last_disparity = self.last_depth = None
+                self.zone_events = []
+                gray_img = cv2.cvtColor(img1_rectified, cv2.COLOR_GRAY2BGR,
+                                        dst=None if out is None else out.get(OUTPUT_GRAY))
+                self.last_timings['outputs'] = (time.perf_counter() - rectified) * 1000
+                return frame1, gray_img, None, None
+
+            # 计算视差
+            disparity = self.compute_disparity(img1_rectified, img2_rectified)
+            matched = time.perf_counter()
+            self.last_timings['match'] = (matched - rectified) * 1000
+            gray_img, depth_img, depth_map = self.outputs_from_disparity(img1_rectified, disparity, outputs, out)
+            self.last_timings['outputs'] = (time.perf_counter() - matched) * 1000
+            return frame1, gray_img, depth_img, depth_map
+        except Exception as e:
+            print(f"处理帧时出错: {str(e)}")
+            raise
+
+    def outputs_from_disparity(self, img1_rectified, disparity, outputs=None, out=None):
+        """由整帧校正左图和原始视差生成灰度图、深度伪彩色图和uint16毫米深度图（只生成outputs中请求的）
+
+        out为 {OUTPUT_*: 预分配数组} 时结果直接写入这些缓冲区，不再每帧分配新数组
+        """
+        outputs = ALL_OUTPUTS if outputs is None else outputs
+        out = out or {}
+        self.last_rectified_left = img1_rectified
+        self.last_disparity = disparity
+        self.update_zones(disparity)
+
+        # 查表得到深度（Z），X/Y在需要时再按像素计算
+        depth_map = None
+        if OUTPUT_DEPTH in outputs:
+            depth_map = self.get_depth_engine().depth_map(
+                disparity, out=self._out_buffer(out, OUTPUT_DEPTH, disparity.shape, np.uint16))
+        self.last_depth = depth_map
+
+        # 生成灰度图和深度图
+        gray_img = depth_img = None
+        if OUTPUT_GRAY in outputs:
+            gray_img = cv2.cvtColor(img1_rectified, cv2.COLOR_GRAY2BGR, dst=out.get(OUTPUT_GRAY))
+        if OUTPUT_DEPTH_IMAGE in outputs:
+            depth_img = cv2.normalize(disparity, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+            depth_img = cv2.applyColorMap(depth_img, cv2.COLORMAP_JET, dst=out.get(OUTPUT_DEPTH_IMAGE))
+        return gray_img, depth_img, depth_map
+
+    def add_zone(self, rect, threshold, name=None, hysteresis=0.1):
+        """添加障碍区域，threshold和hysteresis单位为米"""
+        zone = ObstacleZone(name or f"Z{len(self.zones) + 1}", rect, threshold, hysteresis)
+        self.zones.append(zone)
+        return zone
+
+    def clear_zones(self):
+        self.zones = []
+        self.zone_events = []
+
+    def update_zones(self, disparity):
+        """统计各障碍区域的最近深度并更新报警状态，状态变化记录在 zone_events 中"""
+        self.zone_events = []
+        if not self.zones:
+            return
+        measure_zones(self.zones, disparity, self.calibrator.Q, self.min_disparity)
+        for zone in self.zones:
+            event = zone.update_state()
+            if event is not None:
+                self.zone_events.append((zone, event))
+
+    @staticmethod
+    def _out_buffer(out, key, shape, dtype):
+        """out中形状和类型匹配的可复用数组，没有时新分配"""
+        buffer = None if out is None else out.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _process_region(self, frame1, frame2, rect, outputs=ALL_OUTPUTS, out=None):
+        """只在计算区域rect（含搜索余量）上校正和匹配，结果贴回整帧坐标
+
+        rect为ROI与校正有效区域的交集；设置了ROI时在结果图上画出区域框
+        """
+        region = self.get_compute_region(rect)
+        x0, y0 = region[0], region[1]
+        rx, ry, rw, rh = rect
+        need_disparity = bool(outputs & DISPARITY_OUTPUTS)
+        start = time.perf_counter()
+        img1_rectified, img2_rectified = self.rectify_pair(frame1, frame2, region, right=need_disparity)
+        rectified = time.perf_counter()
+        self.last_timings['rectify'] = (rectified - start) * 1000
+
+        # 区域外标记为未计算：视差和深度为0
+        width, height = self.calibrator.rectified_size
+        left_full = np.full((height, width), 40, dtype=np.uint8)
+        left_full[ry:ry + rh, rx:rx + rw] = img1_rectified[ry - y0:ry - y0 + rh, rx - x0:rx - x0 + rw]
+        self.last_rectified_left = left_full
+        gray_img = depth_img = depth_map = None
+        if OUTPUT_GRAY in outputs:
+            gray_img = cv2.cvtColor(left_full, cv2.COLOR_GRAY2BGR,
+                                    dst=self._out_buffer(out, OUTPUT_GRAY, (height, width, 3), np.uint8))
+            if self.roi is not None:
+                cv2.rectangle(gray_img, (rx, ry), (rx + rw - 1, ry + rh - 1), (255, 255, 255), 1)
+        if not need_disparity:
+            self.last_disparity = self.last_depth = None
+            self.zone_events = []
+            return frame1, gray_img, None, None
+
+        disparity = self.compute_disparity(img1_rectified, img2_rectified)
+        matched = time.perf_counter()
+        self.last_timings['match'] = (matched - rectified) * 1000
+        roi_disparity = disparity[ry - y0:ry - y0 + rh, rx - x0:rx - x0 + rw]
+        disparity_full = np.zeros((height, width), dtype=disparity.dtype)
+        disparity_full[ry:ry + rh, rx:rx + rw] = roi_disparity
+        self.last_disparity = disparity_full
+        self.update_zones(disparity_full)
+        if OUTPUT_DEPTH in outputs:
+            depth_map = self.get_depth_engine().depth_map(
+                disparity_full, out=self._out_buffer(out, OUTPUT_DEPTH, (height, width), np.uint16))
+        self.last_depth = depth_map
+
+        if OUTPUT_DEPTH_IMAGE in outputs:
+            depth_img = self._out_buffer(out, OUTPUT_DEPTH_IMAGE, (height, width, 3), np.uint8)
+            depth_img[...] = 40
+            roi_depth = cv2.normalize(roi_disparity, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+            depth_img[ry:ry + rh, rx:rx + rw] = cv2.applyColorMap(roi_depth, cv2.COLORMAP_JET)
+            if self.roi is not None:
+                cv2.rectangle(depth_img, (rx, ry), (rx + rw - 1, ry + rh - 1), (255, 255, 255), 1)
+        self.last_timings['outputs'] = (time.perf_counter() - matched) * 1000
+        return frame1, gray_img, depth_img, depth_map
+
+    def process_stream(self, source, outputs=None, **kwargs):
+        """逐帧处理视频源的生成器，参数见 stereo_core.stream.process_stream"""
+        from stereo_core.stream import process_stream
+        return process_stream(self, source, outputs, **kwargs)
+
+    def process_frame_sparse(self, frame):
+        """稀疏测距模式：只对左图特征点沿同一极线匹配并三角化，不计算稠密视差
+
+        设置了ROI或校正后有黑边时只校正计算区域（含视差搜索余量），只在ROI与有效区域的交集内检测特征点；
+        返回 (左原图, 校正灰度图, 特征点像素坐标 Nx2, 三维坐标 Nx3，单位mm)
+        """
+        try:
+            rect = self.get_processing_region()
+            if rect is None:
+                frame1, img1_rectified, img2_rectified = self.rectify_frame(frame)
+                pixels, disparities = self.match_sparse_features(img1_rectified, img2_rectified)
+                left_full = img1_rectified
+            else:
+                x0, y0, x1, y1 = self.get_compute_region(rect)
+                rx, ry, rw, rh = rect
+                frame1, img1_rectified, img2_rectified = self.rectify_frame(frame, (x0, y0, x1, y1))
+                pixels, disparities = self.match_sparse_features(img1_rectified, img2_rectified,
+                                                                 (rx - x0, ry - y0, rw, rh))
+                pixels += (x0, y0)
+                # 区域外标记为未计算
+                width, height = self.calibrator.rectified_size
+                left_full = np.full((height, width), 40, dtype=np.uint8)
+                left_full[ry:ry + rh, rx:rx + rw] = img1_rectified[ry - y0:ry - y0 + rh, rx - x0:rx - x0 + rw]
+            points = self.disparity_to_points(pixels[:, 0], pixels[:, 1], disparities)
+            self.last_rectified_left = left_full
+            self.last_disparity = None
+            gray_img = cv2.cvtColor(left_full, cv2.COLOR_GRAY2BGR)
+            return frame1, gray_img, pixels, points
+        except Exception as e:
+            print(f"稀疏测距时出错: {str(e)}")
+            raise
+
+    def match_sparse_features(self, img_left, img_right, rect=None):
+        """在校正后的左图检测FAST角点，并在右图同一行上做块匹配
+
+        rect为 (x, y, w, h) 时只在该范围内检测角点（右图搜索仍可使用范围左侧的像素）；
+        返回有效匹配的像素坐标 (Nx2, int) 和亚像素视差 (N,)
+        """
+        h = self.sparse_patch_radius
+        k = 2 * h + 1
+        min_d = self.min_disparity
+        max_d = self.min_disparity + self.num_disparities - 1
+        height, width = img_left.shape[:2]
+        empty = np.empty((0, 2), dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        # 只在匹配窗口和整个视差搜索范围都在图像内的范围检测角点
+        x0, y0, x1, y1 = max_d + h, h, width - h, height - h
+        if rect is not None:
+            x0, y0 = max(x0, rect[0]), max(y0, rect[1])
+            x1, y1 = min(x1, rect[0] + rect[2]), min(y1, rect[1] + rect[3])
+        if x1 - x0 < k or y1 - y0 < k:
+            return empty
+        keypoints = self._fast.detect(img_left[y0:y1, x0:x1], None)
+        # 角点数远超需要时提高阈值（下一帧生效），不足需要的两倍时逐步降回最低阈值
+        threshold = self._fast.getThreshold()
+        if len(keypoints) > 8 * self.sparse_max_features:
+            self._fast.setThreshold(threshold + 5)
+        elif len(keypoints) < 2 * self.sparse_max_features and threshold > self.sparse_fast_threshold:
+            self._fast.setThreshold(max(self.sparse_fast_threshold, threshold - 5))
+        if not keypoints:
+            return empty
+        pts = cv2.KeyPoint_convert(keypoints)
+        responses = np.fromiter((kp.response for kp in keypoints), dtype=np.float32, count=len(keypoints))
+        order = np.argsort(-responses)[:self.sparse_max_features]
+        xs = np.clip(np.round(pts[order, 0]).astype(np.int64) + x0, x0, x1 - 1)
+        ys = np.clip(np.round(pts[order, 1]).astype(np.int64) + y0, y0, y1 - 1)
+
+        # 所有特征点、所有视差的SSD一次算出，不逐点循环：从右图滑动窗口视图上取出 (N, D, k²) 的窗口，
+        # SSD = Σ右窗口² - 2·Σ左窗口×右窗口 + Σ左窗口²，互相关项为与左窗口 (N, k²) 的批量矩阵乘
+        disps = np.arange(min_d, max_d + 1)
+        n = len(xs)
+        windows = np.lib.stride_tricks.sliding_window_view(img_right, (k, k))
+        strips = windows[(ys - h)[:, None], xs[:, None] - disps[None, :] - h]
+        strips = strips.reshape(n, len(disps), k * k).astype(np.float32)
+        patches = np.lib.stride_tricks.sliding_window_view(img_left, (k, k))[ys - h, xs - h]
+        patches = patches.reshape(n, k * k).astype(np.float32)
+        cost = (np.einsum('ndk,ndk->nd', strips, strips) - 2 * np.matmul(strips, patches[:, :, None])[:, :, 0]
+                + (patches * patches).sum(axis=1)[:, None])
+
+        # 唯一性检验：最优代价须明显小于最优位置邻域之外的次优代价
+        n = len(xs)
+        best = np.argmin(cost, axis=1)
+        best_cost = cost[np.arange(n), best]
+        masked = cost.copy()
+        for shift in (-1, 0, 1):
+            masked[np.arange(n), np.clip(best + shift, 0, len(disps) - 1)] = np.inf
+        second_cost = masked.min(axis=1)
+        valid = best_cost * (1 + self.sparse_uniqueness) < second_cost
+        # 搜索范围端点处的匹配无法做亚像素拟合，视为不可靠
+        valid &= (best > 0) & (best < len(disps) - 1)
+
+        idx = np.nonzero(valid)[0]
+        b = best[idx]
+        c0 = cost[idx, b - 1].astype(np.float64)
+        c1 = cost[idx, b].astype(np.float64)
+        c2 = cost[idx, b + 1].astype(np.float64)
+        denom = c0 - 2 * c1 + c2
+        offset = np.where(denom > 0, (c0 - c2) / (2 * np.maximum(denom, 1e-9)), 0.0)
+        disparities = disps[b] + offset
+
+        pixels = np.column_stack([xs[idx], ys[idx]])
+        return pixels, disparities
+
+    def disparity_to_points(self, xs, ys, disparities):
+        """用Q矩阵把像素坐标和视差（像素单位）三角化为三维点，单位与标定一致（mm）"""
+        xs = np.asarray(xs, dtype=np.float64)
+        homog = np.column_stack([xs, np.asarray(ys, dtype=np.float64),
+                                 np.asarray(disparities, dtype=np.float64),
+                                 np.ones_like(xs)]) @ self.calibrator.Q.T
+        return homog[:, :3] / homog[:, 3:4]
+
+    # 在StereoVisionProcessor类中添加点云生成方法
+    def generate_point_cloud(self, depth_map):
+        """生成点云可视化图像"""
+        # 只对5米以内的有效像素计算三维坐标
+        points = self.get_depth_engine().valid_points(depth_map, max_depth=5000)
+
+        if len(points) == 0:
+            return np.zeros((480, 640, 3), dtype=np.uint8)
+
+        # 归一化坐标用于可视化
+        z = points[:, 2]
+        # 深度量化为整毫米后可能全部相同，避免除以0
+        z = (z - z.min()) / max(z.max() - z.min(), 1.0) * 255
+        colors = cv2.applyColorMap(z.astype(np.uint8), cv2.COLORMAP_JET)
+
+        # 创建点云图像
+        point_cloud_img = np.zeros((480, 640, 3), dtype=np.uint8)
+
+        # 随机采样部分点显示（避免过于密集）
+        if len(points) > 10000:
+            indices = np.random.choice(len(points), 10000, replace=False)
+            points = points[indices]
+            colors = colors[indices]
+
+        # 将3D点投影到2D图像
+        x = ((points[:, 0] - points[:, 0].min()) / (points[:, 0].max() - points[:, 0].min()) * 639).astype(int)
+        y = ((points[:, 1] - points[:, 1].min()) / (points[:, 1].max() - points[:, 1].min()) * 479).astype(int)
+
+        # 绘制点
+        for i in range(len(points)):
+            cv2.circle(point_cloud_img, (x[i], y[i]), 1, tuple(map(int, colors[i][0])), -1)
+
+        return point_cloud_img
\ No newline at end of file
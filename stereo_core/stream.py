@@ -0,0 +1,399 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from stereo_core.stereo_vision_processor import (ALL_OUTPUTS, OUTPUT_DEPTH, OUTPUT_DEPTH_IMAGE,
+                                                 OUTPUT_DISPARITY, OUTPUT_GRAY)
+
+"""生成器形式的逐帧处理接口，不依赖Qt
+
+    for result in processor.process_stream("video.avi", outputs={OUTPUT_DEPTH}):
+        print(result.index, result.timestamp, result.depth[240, 320], result.timings)
+
+解码在后台线程中进行，最多预读lookahead帧；解码缓冲区和结果缓冲区循环复用，
+结果对象中的图像是这些缓冲区的视图，只在之后ring次迭代内有效，需要长期保存时请copy()。
+提前break、调用close()或设置cancel_event都会停止解码线程并释放视频源。
+
+左右相机分别录制为两个文件时用 DualVideoSource：两路各自在线程中解码，按时间戳或帧号配对，
+图像对直接交给 process_pair 处理
+"""
+
+_END = object()
+
+
+class FrameResult:
+    """一帧的处理结果
+
+    index: 从0开始的帧序号；timestamp: 视频中的时间（秒，取自CAP_PROP_POS_MSEC，摄像头为读取时刻）；
+    frame: 原始左图；gray/depth_image/depth/disparity: 同 process_frame，未请求的为None；
+    timings: 各阶段耗时（毫秒）：wait（等待解码）、rectify、match、outputs、total
+    """
+
+    __slots__ = ('index', 'timestamp', 'frame', 'gray', 'depth_image', 'depth', 'disparity', 'timings')
+
+    def __init__(self, index, timestamp, frame, gray, depth_image, depth, disparity, timings):
+        self.index = index
+        self.timestamp = timestamp
+        self.frame = frame
+        self.gray = gray
+        self.depth_image = depth_image
+        self.depth = depth
+        self.disparity = disparity
+        self.timings = timings
+
+    def __repr__(self):
+        return f"FrameResult(index={self.index}, timestamp={self.timestamp:.3f})"
+
+
+class _Slot:
+    """结果缓冲区的一格：各输出的可复用数组和所用的解码缓冲区"""
+
+    __slots__ = ('out', 'buffer')
+
+    def __init__(self):
+        self.out = {}
+        self.buffer = None
+
+
+def open_source(source):
+    """视频文件路径、摄像头编号或已打开的 cv2.VideoCapture -> (capture, 是否由本模块负责释放)"""
+    if isinstance(source, cv2.VideoCapture):
+        return source, False
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise RuntimeError(f"无法打开视频源: {source}")
+    return capture, True
+
+
+class _Decoder(threading.Thread):
+    """后台解码线程：从空闲缓冲区队列取出缓冲区，解码后放入就绪队列（最多lookahead帧）"""
+
+    def __init__(self, capture, lookahead, buffers, loop=False, is_file=True):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(None)  # 首次read时按视频尺寸分配，之后复用
+        self.ready = queue.Queue(maxsize=max(1, int(lookahead)))
+        self.stop = threading.Event()
+        self.loop = loop
+        self.is_file = is_file
+        self.decode_time = 0.0
+
+    def _put(self, item):
+        # 带超时地放入，停止时不会阻塞在已满的队列上
+        while not self.stop.is_set():
+            try:
+                self.ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        index = 0
+        started = time.time()
+        try:
+            while not self.stop.is_set():
+                try:
+                    buffer = self.free.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                start = time.perf_counter()
+                ret, frame = self.capture.read(buffer)
+                if not ret and self.loop and index > 0:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = self.capture.read(buffer)
+                if not ret:
+                    self._put(_END)
+                    return
+                self.decode_time += time.perf_counter() - start
+                msec = self.capture.get(cv2.CAP_PROP_POS_MSEC) if self.is_file else 0.0
+                timestamp = msec / 1000 if self.is_file else time.time() - started
+                # 尺寸与缓冲区不同时read会分配新数组，之后复用新数组
+                if not self._put((index, timestamp, frame)):
+                    return
+                index += 1
+        except Exception as e:
+            # 解码异常交给消费者线程抛出
+            self._put(e)
+
+    def get(self):
+        """下一帧 (帧号, 时间戳, 图像)，视频结束时返回None，解码线程中的异常在此抛出"""
+        item = self.ready.get()
+        if item is _END:
+            # 保留结束标记，重复调用时仍返回None
+            self.ready.put(_END)
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def recycle(self, buffer):
+        """把用完的图像缓冲区还给解码线程"""
+        if buffer is not None:
+            self.free.put(buffer)
+
+    def shutdown(self):
+        """停止解码线程并等待其退出"""
+        self.stop.set()
+        # 清空就绪队列，解码线程不会阻塞在put上
+        while self.is_alive():
+            try:
+                self.ready.get_nowait()
+            except queue.Empty:
+                pass
+            self.join(timeout=0.1)
+
+
+class StereoPair:
+    """同步后的一对左右图像
+
+    index: 配对序号；timestamp: 左图的时间（秒）；left_index/right_index: 各自文件中的帧号；
+    offset_ms: 右图与左图的时间差（毫秒，已扣除time_offset_ms）
+    """
+
+    __slots__ = ('index', 'timestamp', 'left', 'right', 'left_index', 'right_index', 'offset_ms')
+
+    def __init__(self, index, timestamp, left, right, left_index, right_index, offset_ms):
+        self.index = index
+        self.timestamp = timestamp
+        self.left = left
+        self.right = right
+        self.left_index = left_index
+        self.right_index = right_index
+        self.offset_ms = offset_ms
+
+    def __repr__(self):
+        return (f"StereoPair(index={self.index}, left={self.left_index}, right={self.right_index}, "
+                f"offset={self.offset_ms:.1f}ms)")
+
+
+class DualVideoSource:
+    """左右相机分别录制的两个视频文件：两个线程并行解码，按时间戳或帧号配对
+
+    sync: 'timestamp' 按CAP_PROP_POS_MSEC配对，时间差超过tolerance_ms（默认半个帧间隔）的帧
+    视为没有对应帧而丢弃；'index' 按帧号配对（右图帧号 = 左图帧号 + index_offset）。
+    time_offset_ms 为右相机相对左相机的固定时钟偏差。统计信息在 stats 中：
+    pairs/dropped_left/dropped_right、offset_ms（最近一对的时间差）、max_offset_ms、
+    mean_offset_ms 和 drift_ms（最近一对与第一对的时间差之差，即录制过程中的时钟漂移）。
+    迭代得到的图像对只在下一次迭代前有效；用 next_pair 取图像对时需自行 recycle
+    """
+
+    def __init__(self, left_path, right_path, sync='timestamp', tolerance_ms=None, time_offset_ms=0.0,
+                 index_offset=0, lookahead=4):
+        if sync not in ('timestamp', 'index'):
+            raise ValueError(f"不支持的同步方式: {sync}")
+        self.sync = sync
+        self.time_offset_ms = time_offset_ms
+        self.index_offset = index_offset
+        self.lookahead = max(1, int(lookahead))
+        self.paths = (left_path, right_path)
+        self._decoders = None
+        self._heads = [None, None]
+        self._first_offset = None
+        self._offset_sum = 0.0
+        self.stats = {'pairs': 0, 'dropped_left': 0, 'dropped_right': 0, 'offset_ms': 0.0,
+                      'max_offset_ms': 0.0, 'mean_offset_ms': 0.0, 'drift_ms': 0.0, 'decode_time': 0.0}
+        self.captures = []
+        for path in self.paths:
+            capture = cv2.VideoCapture(path)
+            if not capture.isOpened():
+                self.release()
+                raise RuntimeError(f"无法打开视频文件: {path}")
+            self.captures.append(capture)
+        if tolerance_ms is None:
+            fps = max(capture.get(cv2.CAP_PROP_FPS) for capture in self.captures)
+            tolerance_ms = 500.0 / fps if fps > 0 else 20.0
+        self.tolerance_ms = tolerance_ms
+
+    def start(self, buffers=None):
+        """启动两个解码线程（首次调用 next_pair 时自动启动）；buffers为每路的图像缓冲区数"""
+        if self._decoders is None:
+            buffers = buffers or self.lookahead + 2
+            self._decoders = [_Decoder(capture, self.lookahead, buffers) for capture in self.captures]
+            for decoder in self._decoders:
+                decoder.start()
+
+    def _head(self, side):
+        if self._heads[side] is None:
+            self._heads[side] = self._decoders[side].get()
+        return self._heads[side]
+
+    def _drop(self, side):
+        self._decoders[side].recycle(self._heads[side][2])
+        self._heads[side] = None
+        self.stats['dropped_left' if side == 0 else 'dropped_right'] += 1
+
+    def next_pair(self):
+        """下一对同步的图像，任一文件结束时返回None
+
+        图像位于解码线程的缓冲区中，用完后必须调用 recycle(pair) 归还，否则缓冲区耗尽后解码线程停止、
+        本方法一直阻塞；直接迭代本对象时自动归还
+        """
+        self.start()
+        while True:
+            left, right = self._head(0), self._head(1)
+            if left is None or right is None:
+                return None
+            if self.sync == 'index':
+                offset = float(right[0] - self.index_offset - left[0])
+                tolerance = 0.0
+            else:
+                offset = (right[1] - left[1]) * 1000 - self.time_offset_ms
+                tolerance = self.tolerance_ms
+            if abs(offset) <= tolerance:
+                break
+            # 较早的一帧在另一路中没有对应帧
+            self._drop(1 if offset < 0 else 0)
+
+        self._heads = [None, None]
+        stats = self.stats
+        if self.sync == 'timestamp' and self._first_offset is None:
+            self._first_offset = offset
+        if self.sync == 'timestamp':
+            stats['drift_ms'] = offset - self._first_offset
+        self._offset_sum += offset
+        stats['pairs'] += 1
+        stats['offset_ms'] = offset
+        stats['max_offset_ms'] = max(stats['max_offset_ms'], abs(offset))
+        stats['mean_offset_ms'] = self._offset_sum / stats['pairs']
+        return StereoPair(stats['pairs'] - 1, left[1], left[2], right[2], left[0], right[0], offset)
+
+    def recycle(self, pair):
+        """处理完的图像对还给解码线程复用（解码线程已停止时忽略）"""
+        if self._decoders is None:
+            return
+        self._decoders[0].recycle(pair.left)
+        self._decoders[1].recycle(pair.right)
+
+    def __iter__(self):
+        """逐对迭代；每对图像只在下一次迭代前有效，之后其缓冲区被归还复用，需要保留时请copy()"""
+        pair = None
+        try:
+            while True:
+                if pair is not None:
+                    self.recycle(pair)
+                pair = self.next_pair()
+                if pair is None:
+                    return
+                yield pair
+        finally:
+            if pair is not None:
+                self.recycle(pair)
+
+    def stop(self):
+        """停止两个解码线程，已解码未配对的帧被丢弃；再次调用 next_pair 时从当前位置继续解码"""
+        if self._decoders is not None:
+            for decoder in self._decoders:
+                decoder.shutdown()
+            self.stats['decode_time'] += sum(decoder.decode_time for decoder in self._decoders)
+            self._decoders = None
+        self._heads = [None, None]
+
+    def release(self):
+        """停止解码线程并关闭两个视频文件"""
+        self.stop()
+        for capture in self.captures:
+            capture.release()
+        self.captures = []
+
+    def describe(self):
+        stats = self.stats
+        text = (f"配对 {stats['pairs']}，丢弃 左{stats['dropped_left']}/右{stats['dropped_right']}，"
+                f"最大时间差 {stats['max_offset_ms']:.1f} ms")
+        if self.sync == 'timestamp':
+            text += f"，漂移 {stats['drift_ms']:.1f} ms"
+        return text
+
+
+def process_stream(processor, source, outputs=None, lookahead=4, ring=2, max_frames=None, loop=False,
+                   cancel_event=None, skip_errors=False):
+    """逐帧处理视频源，生成 FrameResult
+
+    source为左右并排的视频文件路径、摄像头编号、cv2.VideoCapture，或 DualVideoSource（左右分别录制的两个文件，
+    图像对直接交给 process_pair，不拼接也不缩放）；
+    lookahead: 后台最多预读的帧数；ring: 结果缓冲区的份数，结果中的数组在之后ring次迭代内有效；
+    loop: 视频文件结束后从头循环（DualVideoSource不支持）；cancel_event: threading.Event，被设置后在下一帧前停止；
+    skip_errors: 单帧处理出错时打印并跳过，否则抛出异常。迭代结束后 processor.stream_stats 为统计信息
+    """
+    outputs = ALL_OUTPUTS if outputs is None else frozenset(outputs)
+    ring = max(1, int(ring))
+    paired = isinstance(source, DualVideoSource)
+    if paired:
+        # 双文件源由调用者负责release，结束时只停止解码线程
+        source.lookahead = max(1, int(lookahead))
+        source.start(buffers=source.lookahead + ring + 1)
+        decoder = None
+    else:
+        capture, owned = open_source(source)
+        decoder = _Decoder(capture, lookahead, max(1, int(lookahead)) + ring, loop, isinstance(source, str))
+
+    slots = [_Slot() for _ in range(ring)]
+    stats = {'frames': 0, 'errors': 0, 'decode_time': 0.0, 'wait_time': 0.0, 'elapsed': 0.0}
+    if paired:
+        stats['sync'] = source.stats
+    processor.stream_stats = stats
+    start = time.perf_counter()
+    if decoder is not None:
+        decoder.start()
+    try:
+        count = 0
+        while max_frames is None or count < max_frames:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            wait_start = time.perf_counter()
+            if paired:
+                item = source.next_pair()
+            else:
+                item = decoder.get()
+            waited = (time.perf_counter() - wait_start) * 1000
+            stats['wait_time'] += waited / 1000
+            if item is None:
+                break
+            count += 1
+
+            # 复用这一格时，它上次使用的解码缓冲区可以还给解码线程
+            index = item.index if paired else item[0]
+            slot = slots[count % ring]
+            if slot.buffer is not None and paired:
+                source.recycle(slot.buffer)
+            elif slot.buffer is not None:
+                decoder.recycle(slot.buffer[2])
+            slot.buffer = item
+
+            process_start = time.perf_counter()
+            try:
+                if paired:
+                    result = processor.process_pair(item.left, item.right, outputs, slot.out)
+                else:
+                    result = processor.process_frame(item[2], outputs, slot.out)
+            except Exception as e:
+                if not skip_errors:
+                    raise
+                stats['errors'] += 1
+                print(f"第 {index} 帧处理失败: {e}")
+                continue
+            frame1, gray, depth_image, depth = result
+            for key, array in ((OUTPUT_GRAY, gray), (OUTPUT_DEPTH_IMAGE, depth_image), (OUTPUT_DEPTH, depth)):
+                if array is not None:
+                    slot.out[key] = array
+            timings = dict(processor.last_timings)
+            timings['wait'] = waited
+            timings['total'] = (time.perf_counter() - process_start) * 1000 + waited
+            disparity = processor.last_disparity if OUTPUT_DISPARITY in outputs else None
+            timestamp = item.timestamp if paired else item[1]
+            stats['frames'] += 1
+            yield FrameResult(index, timestamp, frame1, gray, depth_image, depth, disparity, timings)
+    finally:
+        if paired:
+            source.stop()
+            stats['decode_time'] = source.stats['decode_time']
+        else:
+            decoder.shutdown()
+            if owned:
+                capture.release()
+            stats['decode_time'] = decoder.decode_time
+        stats['elapsed'] = time.perf_counter() - start
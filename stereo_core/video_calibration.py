@@ -0,0 +1,200 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from stereo_core.camera_calibrator import report_progress
+from stereo_core.chessboard import find_coarse, refine_corners, orient_corners, square_size_px
+
+"""从左右并排的标定视频中筛选标定视图
+
+解码后的帧先在缩小的图像上用 CALIB_CB_FAST_CHECK 快速检测棋盘格（线程池并行），
+连续相近位姿的帧只保留最清晰的一帧，模糊帧和与已选视图重复的位姿被丢弃，
+只对最终保留的帧在原分辨率上做亚像素角点精化
+"""
+
+def split_gray(frame, size):
+    """左右并排的彩色帧 -> 左、右灰度图（按标定尺寸）"""
+    width, height = size
+    if frame.shape[0] != height or frame.shape[1] != width * 2:
+        frame = cv2.resize(frame, (width * 2, height))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return gray[:, :width], gray[:, width:]
+
+
+def board_sharpness(gray, corners):
+    """棋盘格外接矩形内拉普拉斯响应的方差，运动模糊时明显下降"""
+    x, y, w, h = cv2.boundingRect(corners.reshape(-1, 1, 2).astype(np.float32))
+    patch = gray[max(y, 0):y + h, max(x, 0):x + w]
+    if patch.size == 0:
+        return 0.0
+    return float(cv2.Laplacian(patch, cv2.CV_16S).var())
+
+
+def pose_distance(corners_a, corners_b):
+    """两组角点的平均位移（像素）；检测结果的角点顺序可能整体反向，取两种顺序中的较小值"""
+    a = corners_a.reshape(-1, 2)
+    b = corners_b.reshape(-1, 2)
+    forward = np.linalg.norm(a - b, axis=1).mean()
+    backward = np.linalg.norm(a - b[::-1], axis=1).mean()
+    return float(min(forward, backward))
+
+
+class _Candidate:
+    """预筛通过的一帧：原分辨率灰度图、放大回原尺寸的粗角点和清晰度"""
+
+    __slots__ = ('index', 'gray_left', 'gray_right', 'left', 'right', 'sharpness')
+
+    def __init__(self, index, gray_left, gray_right, left, right, sharpness):
+        self.index = index
+        self.gray_left = gray_left
+        self.gray_right = gray_right
+        self.left = left
+        self.right = right
+        self.sharpness = sharpness
+
+
+class VideoViewCollector:
+    """从标定视频中收集左右角点
+
+    prescreen_scale: 预筛时的缩放比例，为None时自动选择：按最近检测到的棋盘格中最小的方格边长，
+    缩小到方格约为min_square_px像素（方格太小时FAST_CHECK会漏检）；frame_step: 每隔几帧取一帧；
+    min_motion: 与已选视图的角点平均位移小于该值（原分辨率像素）视为重复位姿；
+    blur_ratio: 清晰度低于已见候选帧中值的该比例时视为模糊帧
+    """
+
+    def __init__(self, chessboard_size, size=(640, 480), prescreen_scale=None, frame_step=1,
+                 min_motion=15.0, blur_ratio=0.5, workers=4, prefetch=16, min_square_px=16.0, min_scale=0.25):
+        self.chessboard_size = tuple(chessboard_size)
+        self.size = tuple(size)
+        self.prescreen_scale = prescreen_scale
+        self.min_square_px = min_square_px
+        self.min_scale = min_scale
+        # 自动缩放：最近若干个候选帧中的方格边长
+        self._recent_squares = deque(maxlen=30)
+        self.frame_step = max(1, int(frame_step))
+        self.min_motion = min_motion
+        self.blur_ratio = blur_ratio
+        self.workers = workers
+        self.prefetch = prefetch
+
+    def current_scale(self):
+        """下一帧预筛使用的缩放比例"""
+        if self.prescreen_scale is not None:
+            return self.prescreen_scale
+        if not self._recent_squares:
+            return 1.0
+        return float(np.clip(self.min_square_px / min(self._recent_squares), self.min_scale, 1.0))
+
+    def prescreen(self, index, gray_left, gray_right, scale):
+        """缩小图像上快速检测左右棋盘格，两侧都检测到时返回候选帧，否则返回None"""
+        corners = []
+        for gray in (gray_left, gray_right):
+            found = find_coarse(gray, self.chessboard_size, scale)
+            if found is None:
+                return None
+            corners.append(orient_corners(found))
+        sharpness = min(board_sharpness(gray_left, corners[0]), board_sharpness(gray_right, corners[1]))
+        return _Candidate(index, gray_left, gray_right, corners[0], corners[1], sharpness)
+
+    def refine(self, candidate):
+        """在原分辨率上精化粗角点，完成后释放候选帧的图像"""
+        result = (refine_corners(candidate.gray_left, candidate.left, self.chessboard_size),
+                  refine_corners(candidate.gray_right, candidate.right, self.chessboard_size))
+        candidate.gray_left = candidate.gray_right = None
+        return result
+
+    def _frames(self, capture):
+        """按frame_step读取视频帧，跳过的帧只grab不解码"""
+        index = 0
+        while True:
+            for _ in range(self.frame_step - 1):
+                if not capture.grab():
+                    return
+                index += 1
+            ret, frame = capture.read()
+            if not ret:
+                return
+            yield index, frame
+            index += 1
+
+    def collect(self, video_path, progress_callback=None):
+        """读取整个视频，返回 (左角点列表, 右角点列表, 统计报告)"""
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise RuntimeError(f"无法打开标定视频: {video_path}")
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        start = time.perf_counter()
+        stats = {'frames': 0, 'detected': 0, 'blurred': 0, 'duplicates': 0}
+        accepted = []
+        refining = []
+        sharpness_seen = []
+        # 当前一组连续相近位姿的候选帧：组内第一帧的角点（判断是否同组）和组内最清晰的一帧
+        anchor = group = None
+
+        def close_group(best):
+            if best is None:
+                return
+            if best.sharpness < self.blur_ratio * np.median(sharpness_seen):
+                stats['blurred'] += 1
+            elif any(pose_distance(best.left, kept.left) < self.min_motion for kept in accepted):
+                stats['duplicates'] += 1
+            else:
+                accepted.append(best)
+                refining.append(pool.submit(self.refine, best))
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            report_progress(progress_callback, "筛选视频帧", 0, total)
+            frames = self._frames(capture)
+            finished = False
+            while pending or not finished:
+                # 解码在当前线程，检测在线程池中进行，同时在途的帧数不超过prefetch
+                while not finished and len(pending) < self.prefetch:
+                    item = next(frames, None)
+                    if item is None:
+                        finished = True
+                        break
+                    index, frame = item
+                    stats['frames'] += 1
+                    gray_left, gray_right = split_gray(frame, self.size)
+                    pending.append((index, pool.submit(self.prescreen, index, gray_left.copy(), gray_right.copy(),
+                                                       self.current_scale())))
+                if not pending:
+                    break
+                index, future = pending.popleft()
+                candidate = future.result()
+                report_progress(progress_callback, "筛选视频帧", index + 1, total)
+                if candidate is None:
+                    continue
+                stats['detected'] += 1
+                sharpness_seen.append(candidate.sharpness)
+                self._recent_squares.append(min(square_size_px(candidate.left, self.chessboard_size),
+                                                square_size_px(candidate.right, self.chessboard_size)))
+                if anchor is not None and pose_distance(candidate.left, anchor) < self.min_motion:
+                    # 与当前组位姿相近，只保留更清晰的一帧
+                    if candidate.sharpness > group.sharpness:
+                        group = candidate
+                else:
+                    close_group(group)
+                    anchor, group = candidate.left, candidate
+            close_group(group)
+
+            report_progress(progress_callback, "精化角点")
+            refined = [future.result() for future in refining]
+        finally:
+            for future in [f for _, f in pending] + refining:
+                future.cancel()
+            pool.shutdown(wait=True)
+            capture.release()
+
+        stats['accepted'] = len(refined)
+        stats['frame_indices'] = [c.index for c in accepted]
+        stats['elapsed'] = time.perf_counter() - start
+        print(f"标定视频筛选: 读取 {stats['frames']} 帧，检测到棋盘格 {stats['detected']} 帧，"
+              f"模糊 {stats['blurred']}，重复位姿 {stats['duplicates']}，保留 {stats['accepted']} 帧，"
+              f"耗时 {stats['elapsed']:.1f}s")
+        return [r[0] for r in refined], [r[1] for r in refined], stats